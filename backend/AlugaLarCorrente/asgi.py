@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'AlugaLarCorrente.settings')
+# Leituras de imóveis com as views assíncronas (imoveis/api_async.py)
+os.environ.setdefault('IMOVEIS_API_ASSINCRONA', '1')
 
 application = get_asgi_application()
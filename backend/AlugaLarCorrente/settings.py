@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -49,6 +50,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'imoveis.instrumentacao.InstrumentacaoMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -91,6 +93,48 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/6.0/topics/cache/
+# Com mais de um processo servindo a API, use um cache compartilhado
+# (Redis, Memcached ou arquivo) para que a invalidação valha para todos.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Respostas da API em cache (ver IMOVEIS_CACHE_RESPOSTAS_ALIAS). Com mais
+    # de um processo use um backend compartilhado, por exemplo:
+    #   'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+    #   'LOCATION': BASE_DIR / 'cache' / 'respostas',
+    # ou Redis (pacote redis):
+    #   'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+    #   'LOCATION': 'redis://127.0.0.1:6379/1',
+    'respostas': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'respostas',
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+}
+
+# Sessões (admin e SessionAuthentication da API) lidas do cache; o banco só
+# é consultado na falta
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+
+# O primeiro hasher grava as senhas novas (e confere as pbkdf2_sha256 de
+# qualquer custo); os demais só conferem senhas antigas, que são regravadas
+# com o primeiro no próximo login
+PASSWORD_HASHERS = [
+    'imoveis.senhas.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+
+AUTHENTICATION_BACKENDS = ['imoveis.autenticacao.BackendSenha']
+
+
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
 
@@ -137,16 +181,37 @@ MEDIA_ROOT = BASE_DIR / 'media'
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.SessionAuthentication',
-        'rest_framework.authentication.TokenAuthentication',
+        'imoveis.autenticacao.TokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
     ],
+    # orjson, com saída idêntica à do JSONRenderer padrão (imoveis/renderizadores.py)
+    'DEFAULT_RENDERER_CLASSES': [
+        'imoveis.renderizadores.JSONRapidoRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'imoveis.renderizadores.JSONRapidoParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 12,
+    # Balde de fichas por IP/usuário (imoveis/limites.py); "N/periodo" = até
+    # N requests de uma vez, reabastecidos ao longo do período
+    'DEFAULT_THROTTLE_CLASSES': [
+        'imoveis.limites.LimiteAnonimo',
+        'imoveis.limites.LimiteUsuario',
+    ],
+    'DEFAULT_THROTTLE_RATES': {
+        'anonimo': '300/min',
+        'usuario': '1000/min',
+        'login': '10/min',
+    },
 }
 
 # CORS Configuration
@@ -158,3 +223,88 @@ CORS_ALLOWED_ORIGINS = [
 ]
 
 CORS_ALLOW_CREDENTIALS = True
+
+# Contador de visualizações
+# Intervalo (segundos) entre gravações em lote; 0 grava cada acesso na hora.
+# Use IMOVEIS_VISUALIZACOES_BUFFER = 'cache' com um cache compartilhado
+# (arquivo/Redis) quando houver mais de um processo servindo a API; só
+# então `python manage.py flush_visualizacoes` enxerga o que está pendente.
+IMOVEIS_VISUALIZACOES_INTERVALO = 5
+IMOVEIS_VISUALIZACOES_BUFFER = 'memoria'
+
+# Busca textual (?search=)
+# None escolhe o padrão do banco: índice FTS5 no SQLite, LIKE nos demais.
+# Também aceita um caminho como 'imoveis.busca.BackendLike'.
+IMOVEIS_BUSCA_BACKEND = None
+
+# Fila de tarefas em segundo plano (imoveis/tarefas.py)
+# As tarefas são executadas por `python manage.py processar_tarefas`.
+# True executa cada tarefa na hora, dentro do próprio request (sem worker).
+IMOVEIS_TAREFAS_SINCRONAS = False
+# Espera (segundos) antes da 1ª nova tentativa; dobra a cada falha
+IMOVEIS_TAREFAS_ESPERA_BASE = 5
+# Tarefas em execução há mais que isso voltam para a fila
+IMOVEIS_TAREFAS_TIMEOUT = 600
+
+# Cache de respostas de list/retrieve/destaques (imoveis/cache_respostas.py)
+# Invalidado pelos signals de Imovel e ImagemImovel; o timeout limita o
+# atraso de campos que mudam sem signals, como visualizacoes na listagem.
+IMOVEIS_CACHE_RESPOSTAS_ALIAS = 'respostas'
+IMOVEIS_CACHE_RESPOSTAS_TIMEOUT = 300
+
+# Instrumentação por request (imoveis/instrumentacao.py)
+# Server-Timing em todas as respostas e métricas em /api/_metrics.
+IMOVEIS_INSTRUMENTACAO = True
+IMOVEIS_SERVER_TIMING = True
+# Consultas idênticas repetidas a partir deste número são avisadas como N+1
+IMOVEIS_N_MAIS_1_LIMITE = 10
+# IPs liberados para ler /api/_metrics sem login (além de usuários staff).
+# Atrás de proxy reverso, configure REST_FRAMEWORK['NUM_PROXIES']: sem ele
+# requests com X-Forwarded-For não passam por esta lista.
+IMOVEIS_METRICAS_IPS = ['127.0.0.1']
+# Alternativa à lista: o coletor manda "Authorization: Bearer <token>"
+IMOVEIS_METRICAS_TOKEN = os.environ.get('IMOVEIS_METRICAS_TOKEN', '')
+
+# Exportação CSV/JSON Lines (imoveis/exportacao.py): linhas lidas do banco por lote
+IMOVEIS_EXPORTACAO_LOTE = 2000
+
+# Importação em lote (imoveis/importacao.py)
+IMOVEIS_IMPORTACAO_LOTE = 500
+IMOVEIS_IMPORTACAO_MAX_LINHAS = 10_000
+# Tamanho máximo (bytes) de cada foto dentro do zip
+IMOVEIS_IMPORTACAO_MAX_IMAGEM = 10 * 1024 * 1024
+
+# Sincronização incremental (/api/imoveis/sincronizar/): só entram mudanças
+# com mais de N segundos, para o cursor não pular transações ainda abertas
+IMOVEIS_SINCRONIZACAO_ATRASO = 2
+# Dias que os registros de exclusão ficam guardados (`python manage.py
+# limpar_remocoes` apaga os mais antigos). Cliente que não sincroniza há
+# mais tempo que isso recebe 410 e recomeça do zero.
+IMOVEIS_SINCRONIZACAO_RETENCAO = 30
+
+# Cache dos tokens da API (imoveis/autenticacao.py): LRU por processo.
+# TTL 0 desliga o cache.
+IMOVEIS_TOKEN_CACHE_TAMANHO = 10_000
+IMOVEIS_TOKEN_CACHE_TTL = 300
+# Onde ficam as marcas de logout/usuário alterado lidas pelos outros
+# processos (use um alias compartilhado com mais de um processo; None desliga)
+IMOVEIS_TOKEN_CACHE_ALIAS = 'default'
+
+# Senhas (imoveis/senhas.py). Iterações do PBKDF2-SHA256 (None = o padrão do
+# Django): subir o número não invalida senhas, cada uma é regravada com o
+# custo novo no próximo login; hashes mais fortes que isso não são regravados.
+IMOVEIS_SENHA_ITERACOES = None
+# Hashes calculados ao mesmo tempo (None = número de CPUs) e quantos
+# segundos um login ou cadastro da API espera por uma vaga antes de receber 503
+IMOVEIS_SENHA_CONCORRENCIA = None
+IMOVEIS_SENHA_ESPERA = 5
+
+# Limite de requisições (imoveis/limites.py). 'memoria' vale por processo;
+# com vários processos na mesma máquina use 'sqlite' (arquivo compartilhado)
+IMOVEIS_LIMITES_ATIVOS = True
+IMOVEIS_LIMITES_ARMAZENAMENTO = 'memoria'
+IMOVEIS_LIMITES_ARQUIVO = BASE_DIR / 'limites.sqlite3'
+
+# Leituras de imóveis em views assíncronas (imoveis/api_async.py). O asgi.py
+# liga por padrão; sob WSGI as views síncronas de sempre são mais baratas
+IMOVEIS_API_ASSINCRONA = os.environ.get('IMOVEIS_API_ASSINCRONA', '0') == '1'
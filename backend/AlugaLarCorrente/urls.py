@@ -18,7 +18,7 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
-from imoveis.views import redirect_to_react
+from imoveis.views import redirect_to_react, servir_media
 
 urlpatterns = [
     # Redirecionar root para React
@@ -33,4 +33,4 @@ urlpatterns = [
 
 # Configuração para servir arquivos de media durante o desenvolvimento
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    urlpatterns += static(settings.MEDIA_URL, view=servir_media, document_root=settings.MEDIA_ROOT)
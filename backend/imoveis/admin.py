@@ -1,6 +1,10 @@
 from django.contrib import admin
+from django.utils import timezone
 from django.utils.html import format_html
-from .models import Imovel, ImagemImovel, Perfil
+from .models import Imovel, ImagemImovel, Perfil, Tarefa
+from .cache_respostas import invalidar_respostas
+from .estatisticas import invalidar_estatisticas
+from .exportacao import resposta_exportacao
 
 
 class ImagemImovelInline(admin.TabularInline):
@@ -25,6 +29,24 @@ class ImagemImovelAdmin(admin.ModelAdmin):
     list_filter = ['imovel']
 
 
+@admin.register(Tarefa)
+class TarefaAdmin(admin.ModelAdmin):
+    """Acompanhamento da fila de tarefas em segundo plano"""
+    list_display = ['nome', 'referencia', 'status', 'tentativas', 'executar_apos', 'atualizado_em']
+    list_filter = ['status', 'nome']
+    search_fields = ['referencia']
+    readonly_fields = ['criado_em', 'atualizado_em']
+    actions = ['reprocessar']
+    
+    @admin.action(description='🔁 Reprocessar tarefas selecionadas')
+    def reprocessar(self, request, queryset):
+        """Devolve as tarefas à fila, zerando as tentativas"""
+        updated = queryset.exclude(status='executando').update(
+            status='pendente', tentativas=0, executar_apos=timezone.now()
+        )
+        self.message_user(request, f'{updated} tarefa(s) devolvida(s) à fila.')
+
+
 @admin.register(Imovel)
 class ImovelAdmin(admin.ModelAdmin):
     """
@@ -100,7 +122,7 @@ class ImovelAdmin(admin.ModelAdmin):
     list_per_page = 20
     
     # Ações em massa
-    actions = ['ativar_imoveis', 'desativar_imoveis']
+    actions = ['ativar_imoveis', 'desativar_imoveis', 'exportar_csv', 'exportar_jsonl']
     
     # Métodos personalizados para exibição
     
@@ -143,7 +165,7 @@ class ImovelAdmin(admin.ModelAdmin):
         if obj.telefone_contato:
             return format_html(
                 '<a href="{}" target="_blank" style="background-color: #25D366; color: white; padding: 8px 15px; text-decoration: none; border-radius: 5px; display: inline-block;">📱 Abrir WhatsApp</a>',
-                obj.get_whatsapp_link()
+                obj.whatsapp_link_atual
             )
         return "Sem telefone cadastrado"
     
@@ -152,11 +174,26 @@ class ImovelAdmin(admin.ModelAdmin):
     @admin.action(description='✅ Ativar imóveis selecionados')
     def ativar_imoveis(self, request, queryset):
         """Ativa os imóveis selecionados"""
-        updated = queryset.update(ativo=True)
+        # update() não dispara signals nem o auto_now (usado pela sincronização)
+        updated = queryset.update(ativo=True, atualizado_em=timezone.now())
+        invalidar_estatisticas()
+        invalidar_respostas()
         self.message_user(request, f'{updated} imóvel(is) ativado(s) com sucesso!')
     
     @admin.action(description='❌ Desativar imóveis selecionados')
     def desativar_imoveis(self, request, queryset):
         """Desativa os imóveis selecionados"""
-        updated = queryset.update(ativo=False)
+        updated = queryset.update(ativo=False, atualizado_em=timezone.now())
+        invalidar_estatisticas()
+        invalidar_respostas()
         self.message_user(request, f'{updated} imóvel(is) desativado(s) com sucesso!')
+    
+    @admin.action(description='📄 Exportar selecionados (CSV)')
+    def exportar_csv(self, request, queryset):
+        """Baixa os imóveis selecionados em CSV (streaming)"""
+        return resposta_exportacao(queryset, 'csv')
+    
+    @admin.action(description='📄 Exportar selecionados (JSON Lines)')
+    def exportar_jsonl(self, request, queryset):
+        """Baixa os imóveis selecionados em JSON Lines (streaming)"""
+        return resposta_exportacao(queryset, 'jsonl')
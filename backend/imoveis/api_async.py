@@ -0,0 +1,202 @@
+"""
+Leituras públicas de imóveis em views assíncronas, para rodar sob ASGI.
+
+Listagem, detalhe, destaques e estatísticas respondem o mesmo que o
+``ImovelViewSet`` (mesmos filtros, campos, cache de respostas, ETag/304 e
+contador de visualizações), mas com o ORM assíncrono: enquanto uma consulta
+roda ou um cliente lento recebe a resposta, o event loop atende outros
+requests, em vez de cada request ocupar uma thread do servidor do começo ao
+fim.
+
+O ``ImovelViewSet`` continua sendo a referência: a view assíncrona monta
+uma instância dele para a ação e usa seu queryset, filtros, serializers,
+autenticação, permissões e limites de requisição. Requests anônimos passam
+por autenticação e limites sem sair do event loop; com credenciais (token
+ou sessão, que podem consultar o banco) essa etapa roda numa thread.
+
+Ficam com a view síncrona, chamada numa thread: escritas, paginação por
+cursor, API navegável (text/html) e pk que não é número.
+
+As rotas entram na frente das do router em imoveis/api_urls.py quando
+``IMOVEIS_API_ASSINCRONA`` está ligado, o que o asgi.py faz por padrão.
+Sob WSGI o Django rodaria cada view assíncrona num event loop próprio, só
+custo a mais, então lá as rotas continuam as do router.
+"""
+from asgiref.sync import markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.http import HttpResponse
+from django.shortcuts import aget_object_or_404
+from django.urls import re_path
+from rest_framework.exceptions import NotAcceptable
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from .api_views import (
+    completar_resposta, exibir_visualizacoes, passos_visualizacao, resposta_condicional,
+    visualizacoes_gravadas,
+)
+from .cache_respostas import aobter_resposta, aobter_validadores
+from .condicional import acalcular_validadores
+from .estatisticas import aobter_estatisticas
+from .instrumentacao import cronometrar
+from .visualizacoes import contador as contador_visualizacoes
+
+
+METODOS_LEITURA = ('GET', 'HEAD')
+
+
+async def _responder(request, endpoint, queryset, gerar, **extras):
+    """ImovelViewSet._responder com validadores e cache assíncronos"""
+    validadores = await aobter_validadores(
+        request, endpoint, lambda: acalcular_validadores(queryset, request), **extras
+    )
+    resposta = resposta_condicional(request, endpoint, validadores)
+    if resposta is None:
+        resposta = completar_resposta(await aobter_resposta(request, endpoint, gerar, **extras),
+                                      endpoint, validadores)
+    return resposta
+
+
+async def listar(viewset, request):
+    queryset = viewset.filter_queryset(viewset.get_queryset())
+
+    async def gerar():
+        pagina = await viewset.paginator.apaginar(queryset, request, viewset)
+        serializer = viewset.get_serializer(pagina, many=True)
+        return viewset.paginator.get_paginated_response(serializer.data)
+    return await _responder(request, 'list', queryset, gerar)
+
+
+async def detalhar(viewset, request):
+    pk = int(viewset.kwargs['pk'])
+
+    async def gerar():
+        # Como o get_object do DRF: filtros da listagem valem no detalhe
+        imovel = await aget_object_or_404(viewset.filter_queryset(viewset.get_queryset()), pk=pk)
+        viewset.check_object_permissions(request, imovel)
+        return Response(viewset.get_serializer(imovel).data)
+
+    resposta = await _responder(
+        request, 'retrieve', viewset.get_queryset().filter(pk=pk), gerar, pk=viewset.kwargs['pk'],
+    )
+    # Daqui em diante, o mesmo que ImovelViewSet.retrieve
+    registrar, ler_gravadas = passos_visualizacao(resposta)
+    if registrar:
+        gravadas = (await visualizacoes_gravadas(pk).afirst() or 0) if ler_gravadas else None
+        exibir_visualizacoes(resposta, await contador_visualizacoes.aregistrar(pk), gravadas)
+    return resposta
+
+
+async def destaques(viewset, request):
+    async def gerar():
+        imoveis = [imovel async for imovel in viewset.get_queryset()[:6]]
+        return Response(viewset.get_serializer(imoveis, many=True).data)
+    return await _responder(request, 'destaques', viewset.get_queryset(), gerar)
+
+
+async def estatisticas(viewset, request):
+    dados, acerto = await aobter_estatisticas()
+    return Response(dados, headers={'X-Cache': 'HIT' if acerto else 'MISS'})
+
+
+def _tem_credenciais(request):
+    return 'HTTP_AUTHORIZATION' in request.META or settings.SESSION_COOKIE_NAME in request.COOKIES
+
+
+def _sem_template(resposta):
+    """
+    HttpResponse com o conteúdo já renderizado: o handler do Django passaria
+    uma Response do DRF (que tem render()) por uma thread só para renderizar.
+    """
+    final = HttpResponse(resposta.content, status=resposta.status_code)
+    for nome, valor in resposta.items():
+        final[nome] = valor
+    return final
+
+
+class VisaoAssincrona:
+    """
+    View assíncrona de uma rota do ``ImovelViewSet``. ``sincrona`` é a view
+    do router para a mesma rota (mesmas ações e initkwargs), usada para
+    montar o viewset e para os casos que ficam na versão síncrona.
+    """
+
+    def __init__(self, sincrona, implementacao):
+        self.sincrona = sincrona
+        self.implementacao = implementacao
+        self.acao = sincrona.actions['get']
+        self.delegar = sync_to_async(sincrona)
+        # Como o csrf_exempt das views do DRF (a sessão é checada pelo próprio DRF)
+        self.csrf_exempt = True
+        markcoroutinefunction(self)
+
+    def _viewset(self, request, kwargs):
+        # O que a view do ViewSetMixin.as_view faz antes do dispatch
+        viewset = self.sincrona.cls(**self.sincrona.initkwargs)
+        viewset.action_map = {'head': self.acao, **self.sincrona.actions}
+        for metodo, acao in viewset.action_map.items():
+            setattr(viewset, metodo, getattr(viewset, acao))
+        viewset.request = request
+        viewset.args = ()
+        viewset.kwargs = kwargs
+        # As rotas assíncronas não têm sufixo de formato (.json)
+        viewset.format_kwarg = None
+        return viewset
+
+    def _assincrona(self, viewset, request):
+        """A view assíncrona sabe responder? (negociação de conteúdo sem efeitos)"""
+        if request.method not in METODOS_LEITURA:
+            return False
+        try:
+            renderer, _ = viewset.perform_content_negotiation(request)
+        except NotAcceptable:
+            return False
+        if not isinstance(renderer, JSONRenderer):
+            return False
+        return not (self.acao == 'list' and viewset.paginator.usa_cursor(request))
+
+    async def __call__(self, request, **kwargs):
+        viewset = self._viewset(request, kwargs)
+        drf_request = viewset.initialize_request(request, **kwargs)
+        if not self._assincrona(viewset, drf_request):
+            return await self.delegar(request, **kwargs)
+
+        viewset.request = drf_request
+        viewset.headers = viewset.default_response_headers
+        try:
+            if _tem_credenciais(request):
+                await sync_to_async(viewset.initial)(drf_request, **kwargs)
+            else:
+                viewset.initial(drf_request, **kwargs)
+            resposta = await self.implementacao(viewset, drf_request)
+        except Exception as exc:
+            resposta = viewset.handle_exception(exc)
+
+        resposta = viewset.finalize_response(drf_request, resposta, **kwargs)
+        if not isinstance(resposta, Response):
+            return resposta
+        with cronometrar('renderizacao'):
+            resposta.render()
+        return _sem_template(resposta)
+
+
+def rotas(router, prefixo='imoveis'):
+    """
+    Rotas assíncronas para pôr antes de ``router.urls``, com os mesmos nomes
+    (reverse() e as métricas por rota não mudam).
+    """
+    sincronas = {padrao.name: padrao.callback for padrao in router.urls}
+    return [
+        re_path(rf'^{prefixo}/$', VisaoAssincrona(sincronas['imovel-list'], listar),
+                name='imovel-list'),
+        re_path(rf'^{prefixo}/destaques/$',
+                VisaoAssincrona(sincronas['imovel-destaques'], destaques),
+                name='imovel-destaques'),
+        re_path(rf'^{prefixo}/estatisticas/$',
+                VisaoAssincrona(sincronas['imovel-estatisticas'], estatisticas),
+                name='imovel-estatisticas'),
+        # Só pk numérico: o resto cai na rota do router e responde 404 como sempre
+        re_path(rf'^{prefixo}/(?P<pk>[0-9]+)/$',
+                VisaoAssincrona(sincronas['imovel-detail'], detalhar),
+                name='imovel-detail'),
+    ]
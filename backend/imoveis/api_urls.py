@@ -1,14 +1,21 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from . import api_async
+from .views import exportar_metricas
 from .api_views import (
-    ImovelViewSet, MeuPerfilView, RegisterView,
+    ImovelViewSet, MeuPerfilView, RegisterView, TarefaViewSet,
     login_view, logout_view, me_view
 )
 
 router = DefaultRouter()
 router.register(r'imoveis', ImovelViewSet, basename='imovel')
+router.register(r'tarefas', TarefaViewSet, basename='tarefa')
 
 urlpatterns = [
+    # Leituras de imóveis assíncronas (ASGI), na frente das do router
+    *(api_async.rotas(router) if settings.IMOVEIS_API_ASSINCRONA else []),
+
     # Rotas do router
     path('', include(router.urls)),
     
@@ -20,4 +27,7 @@ urlpatterns = [
     
     # Perfil
     path('perfil/', MeuPerfilView.as_view(), name='api-perfil'),
+    
+    # Métricas (Prometheus)
+    path('_metrics', exportar_metricas, name='api-metricas'),
 ]
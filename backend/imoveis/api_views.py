@@ -1,18 +1,88 @@
 from rest_framework import viewsets, status, generics
-from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.decorators import action, api_view, permission_classes, throttle_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework.filters import SearchFilter, OrderingFilter
+from rest_framework.filters import OrderingFilter
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import MultiPartParser
 from django.contrib.auth.models import User
 from rest_framework.authtoken.models import Token
 
-from .models import Imovel, ImagemImovel, Perfil
+from .models import Imovel, ImagemImovel, ImovelRemovido, Perfil, Tarefa
 from .serializers import (
     ImovelListSerializer, ImovelDetailSerializer, ImovelCreateUpdateSerializer,
-    ImagemImovelSerializer, UserSerializer, RegisterSerializer
+    ImagemImovelSerializer, UserSerializer, RegisterSerializer, TarefaSerializer
 )
 from .filters import ImovelFilter
+from .pagination import ImovelPagination
+from .busca import BuscaFilter
+from .cache_respostas import obter_resposta, obter_validadores
+from .condicional import aplicar_validadores, calcular_validadores, resposta_nao_modificada
+from .estatisticas import obter_estatisticas
+from .exportacao import FORMATOS, resposta_exportacao
+from .importacao import ErroImportacao, Importador, formato_do_arquivo
+from .limites import LimiteLogin
+from .otimizacao import moldar_queryset
+from .senhas import HashOcupado, recusar_se_ocupado
+from . import sincronizacao
+from .visualizacoes import contador as contador_visualizacoes
+
+
+# Passos das leituras com ETag/304 e contador de visualizações, comuns ao
+# ImovelViewSet e às views assíncronas (api_async.py): cada lado só faz as
+# consultas, do seu jeito, entre um passo e outro.
+
+def resposta_condicional(request, endpoint, validadores):
+    """304 se o cliente já tem a versão atual; None se é para gerar a resposta"""
+    etag, modificado, total = validadores
+    if endpoint == 'retrieve' and not total:
+        # Deixa o próprio retrieve responder 404
+        return None
+    return resposta_nao_modificada(request, endpoint, etag, modificado)
+
+
+def completar_resposta(resposta, endpoint, validadores):
+    """Põe ETag/Last-Modified na resposta gerada"""
+    etag, modificado, total = validadores
+    if resposta.status_code == 200 and (endpoint != 'retrieve' or total):
+        aplicar_validadores(resposta, etag, modificado)
+    return resposta
+
+
+def passos_visualizacao(resposta):
+    """Depois do retrieve: (registra a visita?, lê o total gravado no banco?)"""
+    if resposta.status_code == 304:
+        # O cliente já tem o detalhe, mas a visita conta do mesmo jeito
+        return True, False
+    if resposta.status_code != 200:
+        return False, False
+    # Em cache o total está velho: o contador muda sem signals (flush em lote)
+    return True, 'visualizacoes' in resposta.data and resposta['X-Cache'] == 'HIT'
+
+
+def visualizacoes_gravadas(pk):
+    return Imovel.objects.filter(pk=pk).values_list('visualizacoes', flat=True)
+
+
+def somar_visualizacoes(item, pendentes, gravadas=None):
+    """
+    Imóvel serializado com as visitas ainda no buffer (gravadas no banco em
+    lote) somadas. Pedido com ?fields=/?omit= sem o contador fica como está.
+    """
+    if 'visualizacoes' not in item:
+        return item
+    item = dict(item)
+    if gravadas is not None:
+        item['visualizacoes'] = gravadas
+    item['visualizacoes'] += pendentes
+    return item
+
+
+def exibir_visualizacoes(resposta, pendentes, gravadas=None):
+    """somar_visualizacoes no detalhe"""
+    if resposta.status_code == 200:
+        resposta.data = somar_visualizacoes(resposta.data, pendentes, gravadas)
 
 
 class ImovelViewSet(viewsets.ModelViewSet):
@@ -20,14 +90,63 @@ class ImovelViewSet(viewsets.ModelViewSet):
     ViewSet para CRUD de Imóveis
     """
     queryset = Imovel.objects.filter(ativo=True).select_related('dono').prefetch_related('imagens')
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
+    filter_backends = [DjangoFilterBackend, OrderingFilter, BuscaFilter]
     filterset_class = ImovelFilter
     search_fields = ['titulo', 'descricao', 'bairro']
     ordering_fields = ['preco', 'criado_em', 'visualizacoes']
     ordering = ['-criado_em']
+    pagination_class = ImovelPagination
+    
+    # Ações só de leitura: o queryset é moldado pelo serializer em uso
+    acoes_leitura = ('list', 'retrieve', 'destaques', 'meus_imoveis', 'lote', 'sincronizar')
+    # Máximo de imóveis por /api/imoveis/lote/?ids=
+    max_ids_lote = 100
+    # Itens por fonte em /api/imoveis/sincronizar/ (padrão e máximo de ?limite=)
+    limite_sincronizacao = 200
+    max_limite_sincronizacao = 1000
+    
+    def get_queryset(self):
+        if self.action in self.acoes_leitura:
+            return moldar_queryset(
+                Imovel.objects.filter(ativo=True), self.get_serializer_class(),
+                # A paginação por cursor lê o campo de ordenação do último item
+                extras=self.ordering_fields,
+                campos=self.campos_solicitados(),
+            )
+        return super().get_queryset()
+    
+    def get_serializer(self, *args, **kwargs):
+        if self.action in self.acoes_leitura:
+            kwargs.setdefault('campos', self.campos_solicitados())
+        return super().get_serializer(*args, **kwargs)
+    
+    def campos_solicitados(self):
+        """
+        Campos pedidos com ?fields=id,titulo,preco ou ?omit=descricao,imagens
+        (None = todos). Nomes desconhecidos respondem 400.
+        """
+        if not hasattr(self, '_campos'):
+            self._campos = None
+            fields = self.request.query_params.get('fields')
+            omit = self.request.query_params.get('omit')
+            if fields is not None or omit is not None:
+                disponiveis = list(self.get_serializer_class()().fields)
+                self._campos = set(disponiveis)
+                for parametro, valor in (('fields', fields), ('omit', omit)):
+                    if valor is None:
+                        continue
+                    nomes = {nome.strip() for nome in valor.split(',') if nome.strip()}
+                    desconhecidos = nomes - self._campos
+                    if desconhecidos:
+                        raise ValidationError({parametro: [
+                            f'Campo(s) desconhecido(s): {", ".join(sorted(desconhecidos))}. '
+                            f'Disponíveis: {", ".join(disponiveis)}.'
+                        ]})
+                    self._campos = self._campos & nomes if parametro == 'fields' else self._campos - nomes
+        return self._campos
     
     def get_serializer_class(self):
-        if self.action == 'list':
+        if self.action in ('list', 'destaques', 'meus_imoveis'):
             return ImovelListSerializer
         elif self.action in ['create', 'update', 'partial_update']:
             return ImovelCreateUpdateSerializer
@@ -36,26 +155,97 @@ class ImovelViewSet(viewsets.ModelViewSet):
     def get_permissions(self):
         if self.action in ['create', 'update', 'partial_update', 'destroy']:
             return [IsAuthenticated()]
-        return [AllowAny()]
+        # Ações extras usam o permission_classes do @action
+        return super().get_permissions()
     
     def perform_create(self, serializer):
         serializer.save(dono=self.request.user)
     
+    def _responder(self, request, endpoint, queryset, gerar, **extras):
+        """
+        Responde 304 se o cliente já tem a versão atual (ETag/Last-Modified);
+        senão usa o cache de respostas.
+        """
+        validadores = obter_validadores(
+            request, endpoint, lambda: calcular_validadores(queryset, request), **extras
+        )
+        resposta = resposta_condicional(request, endpoint, validadores)
+        if resposta is None:
+            resposta = completar_resposta(obter_resposta(request, endpoint, gerar, **extras),
+                                          endpoint, validadores)
+        return resposta
+    
+    def list(self, request, *args, **kwargs):
+        if self.paginator.usa_cursor(request):
+            return obter_resposta(request, 'list', lambda: super(ImovelViewSet, self).list(request, *args, **kwargs))
+        return self._responder(
+            request, 'list', self.filter_queryset(self.get_queryset()),
+            lambda: super(ImovelViewSet, self).list(request, *args, **kwargs),
+        )
+    
     def retrieve(self, request, *args, **kwargs):
-        instance = self.get_object()
-        # Incrementa visualizações
-        instance.visualizacoes += 1
-        instance.save(update_fields=['visualizacoes'])
-        serializer = self.get_serializer(instance)
-        return Response(serializer.data)
+        try:
+            pk = int(kwargs['pk'])
+        except ValueError:
+            # pk que não é número: o get_object do DRF responde 404
+            return super().retrieve(request, *args, **kwargs)
+        
+        resposta = self._responder(
+            request, 'retrieve', self.get_queryset().filter(pk=pk),
+            lambda: super(ImovelViewSet, self).retrieve(request, *args, **kwargs),
+            pk=kwargs['pk'],
+        )
+        registrar, ler_gravadas = passos_visualizacao(resposta)
+        if registrar:
+            gravadas = (visualizacoes_gravadas(pk).first() or 0) if ler_gravadas else None
+            exibir_visualizacoes(resposta, contador_visualizacoes.registrar(pk), gravadas)
+        return resposta
     
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
     def meus_imoveis(self, request):
         """Retorna apenas os imóveis do usuário logado"""
-        imoveis = self.queryset.filter(dono=request.user)
-        serializer = ImovelListSerializer(imoveis, many=True)
+        imoveis = self.get_queryset().filter(dono=request.user)
+        serializer = self.get_serializer(imoveis, many=True)
         return Response(serializer.data)
     
+    @action(detail=False, methods=['get'], url_path='meus_imoveis/exportar',
+            permission_classes=[IsAuthenticated])
+    def exportar(self, request):
+        """
+        Baixa todos os imóveis do usuário logado (ativos ou não) em
+        ?formato=csv (padrão) ou ?formato=jsonl, em streaming
+        """
+        formato = request.query_params.get('formato', 'csv')
+        if formato not in FORMATOS:
+            return Response(
+                {'formato': [f'Use um destes: {", ".join(FORMATOS)}.']},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return resposta_exportacao(Imovel.objects.filter(dono=request.user), formato, nome='meus-imoveis')
+    
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated],
+            parser_classes=[MultiPartParser])
+    def importar(self, request):
+        """
+        Cadastra vários imóveis de uma vez (multipart): ``arquivo`` em CSV ou
+        JSON Lines, ``imagens`` com o zip das fotos citadas e ``simular=1``
+        para só validar. Responde o resultado de cada linha.
+        """
+        arquivo = request.FILES.get('arquivo')
+        if arquivo is None:
+            return Response(
+                {'arquivo': ['Envie o CSV ou JSON Lines com os imóveis.']},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        formato = request.data.get('formato') or formato_do_arquivo(arquivo.name)
+        simular = str(request.data.get('simular', '')).lower() in ('1', 'true', 'sim')
+        try:
+            importador = Importador(request.user, request.FILES.get('imagens'), simular=simular)
+            relatorio = importador.importar(arquivo, formato)
+        except ErroImportacao as erro:
+            return Response({'error': str(erro)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(relatorio, status=status.HTTP_201_CREATED if relatorio['criados'] else status.HTTP_200_OK)
+    
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
     def toggle_ativo(self, request, pk=None):
         """Ativa/desativa um imóvel"""
@@ -76,25 +266,143 @@ class ImovelViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def destaques(self, request):
         """Retorna imóveis em destaque (os 6 mais recentes)"""
-        imoveis = self.queryset[:6]
-        serializer = ImovelListSerializer(imoveis, many=True)
-        return Response(serializer.data)
+        def gerar():
+            imoveis = self.get_queryset()[:6]
+            serializer = self.get_serializer(imoveis, many=True)
+            return Response(serializer.data)
+        return self._responder(request, 'destaques', self.get_queryset(), gerar)
     
     @action(detail=False, methods=['get'])
-    def estatisticas(self, request):
-        """Retorna estatísticas gerais"""
-        total = Imovel.objects.count()
-        ativos = Imovel.objects.filter(ativo=True).count()
-        por_tipo = {}
+    def lote(self, request):
+        """
+        Vários imóveis (com o mesmo conteúdo do detalhe) em poucas consultas,
+        na ordem pedida: ?ids=3,1,2. Ids inexistentes ou inativos ficam de
+        fora. Conta uma visualização de cada um, a não ser com ?contar=0.
+        """
+        ids = self._ids_lote(request)
+        queryset = self.get_queryset().filter(pk__in=ids)
+        
+        def gerar():
+            posicao = {pk: indice for indice, pk in enumerate(ids)}
+            imoveis = sorted(queryset, key=lambda imovel: posicao[imovel.pk])
+            return Response(self.get_serializer(imoveis, many=True).data)
         
-        for tipo_code, tipo_nome in Imovel.TIPO_CHOICES:
-            por_tipo[tipo_nome] = Imovel.objects.filter(tipo=tipo_code, ativo=True).count()
+        resposta = self._responder(request, 'lote', queryset, gerar)
+        if resposta.status_code not in (200, 304):
+            return resposta
         
+        # Como no retrieve: o contador muda sem signals, então o valor vem
+        # do banco (uma consulta para todos) mais o que está no buffer
+        atuais = dict(Imovel.objects.filter(ativo=True, pk__in=ids).values_list('pk', 'visualizacoes'))
+        encontrados = [pk for pk in ids if pk in atuais]
+        if request.query_params.get('contar') in ('0', 'false', 'nao'):
+            pendentes = {pk: contador_visualizacoes.pendentes(pk) for pk in encontrados}
+        else:
+            pendentes = {pk: contador_visualizacoes.registrar(pk) for pk in encontrados}
+        
+        if resposta.status_code == 200:
+            itens = resposta.data
+            if itens and 'id' not in itens[0] and len(itens) != len(encontrados):
+                # ?fields= sem id e a resposta (do cache) já não bate com o
+                # banco: sem o id não há como casar cada item com o seu pk
+                itens = gerar().data
+            pks = [item['id'] for item in itens] if itens and 'id' in itens[0] else encontrados
+            # Item que saiu do banco depois de gerada a resposta mantém o valor dela
+            resposta.data = [
+                somar_visualizacoes(item, pendentes.get(pk, 0), atuais.get(pk))
+                for pk, item in zip(pks, itens)
+            ]
+        return resposta
+    
+    def _ids_lote(self, request):
+        """Ids de ?ids=, sem repetição e na ordem pedida"""
+        try:
+            ids = [int(parte) for parte in request.query_params.get('ids', '').split(',') if parte.strip()]
+        except ValueError:
+            raise ValidationError({'ids': ['Use números separados por vírgula, ex.: ?ids=3,1,2.']})
+        ids = list(dict.fromkeys(ids))
+        if not ids:
+            raise ValidationError({'ids': ['Informe ao menos um id, ex.: ?ids=3,1,2.']})
+        if len(ids) > self.max_ids_lote:
+            raise ValidationError({'ids': [f'No máximo {self.max_ids_lote} imóveis por vez.']})
+        return ids
+    
+    @action(detail=False, methods=['get'])
+    def sincronizar(self, request):
+        """
+        O que mudou desde o cursor ?desde= (o ``proximo`` da resposta
+        anterior; sem ele, o catálogo inteiro): ``alterados`` (criados ou
+        alterados, com o conteúdo do detalhe), ``desativados`` e
+        ``removidos`` (ids). Com ``mais`` verdadeiro, há mais a buscar
+        com o novo cursor. Aceita ?limite= e ?fields=/?omit=. Cursor mais
+        antigo que IMOVEIS_SINCRONIZACAO_RETENCAO: 410, e o cliente
+        recomeça sem ?desde=.
+        """
+        desde = request.query_params.get('desde')
+        posicoes = sincronizacao.ler_cursor(desde)
+        if desde and sincronizacao.expirado(posicoes):
+            return Response({
+                'detail': 'Cursor expirado: sincronize de novo sem ?desde=.',
+                'ressincronizar': True,
+            }, status=status.HTTP_410_GONE)
+        limite = self._limite_sincronizacao(request)
+        visivel = sincronizacao.limite_visivel()
+        
+        queryset = moldar_queryset(
+            Imovel.objects.all(), self.get_serializer_class(),
+            # ativo separa alterados de desativados; atualizado_em vai para o cursor
+            extras=['ativo', 'atualizado_em'],
+            campos=self.campos_solicitados(),
+        )
+        imoveis, posicoes['imoveis'], mais_imoveis = sincronizacao.pagina(
+            queryset, 'atualizado_em', posicoes['imoveis'], limite)
+        removidos, posicoes['removidos'], mais_removidos = sincronizacao.pagina(
+            ImovelRemovido.objects.all(), 'removido_em', posicoes['removidos'], limite)
+        
+        mais = mais_imoveis or mais_removidos
+        if not mais or not posicoes['visto_ate']:
+            # No meio das páginas o cliente ainda não está em dia
+            posicoes['visto_ate'] = visivel
+        
+        ativos = [imovel for imovel in imoveis if imovel.ativo]
         return Response({
-            'total': total,
-            'ativos': ativos,
-            'por_tipo': por_tipo
+            'alterados': self.get_serializer(ativos, many=True).data,
+            'desativados': [imovel.pk for imovel in imoveis if not imovel.ativo],
+            'removidos': [removido.imovel_id for removido in removidos],
+            'proximo': sincronizacao.gravar_cursor(posicoes),
+            'mais': mais,
         })
+    
+    def _limite_sincronizacao(self, request):
+        try:
+            limite = int(request.query_params.get('limite', self.limite_sincronizacao))
+        except ValueError:
+            raise ValidationError({'limite': ['Informe um número inteiro.']})
+        return max(1, min(limite, self.max_limite_sincronizacao))
+    
+    @action(detail=False, methods=['get'])
+    def estatisticas(self, request):
+        """Retorna estatísticas gerais (em cache até o próximo imóvel alterado)"""
+        dados, acerto = obter_estatisticas()
+        return Response(dados, headers={'X-Cache': 'HIT' if acerto else 'MISS'})
+
+
+class TarefaViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Acompanhamento das tarefas em segundo plano do usuário logado
+    (ex.: geração das variantes das fotos enviadas).
+    Aceita ?referencia=imovel:12 e ?status=pendente.
+    """
+    serializer_class = TarefaSerializer
+    permission_classes = [IsAuthenticated]
+    
+    def get_queryset(self):
+        queryset = Tarefa.objects.filter(dono=self.request.user).order_by('-criado_em')
+        for campo in ('referencia', 'status'):
+            valor = self.request.query_params.get(campo)
+            if valor:
+                queryset = queryset.filter(**{campo: valor})
+        return queryset
 
 
 class MeuPerfilView(generics.RetrieveUpdateAPIView):
@@ -111,23 +419,36 @@ class RegisterView(generics.CreateAPIView):
     queryset = User.objects.all()
     serializer_class = RegisterSerializer
     permission_classes = [AllowAny]
+    throttle_classes = [LimiteLogin]
     
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        user = serializer.save()
-        
-        # Criar token para o usuário
-        token, created = Token.objects.get_or_create(user=user)
+        try:
+            # Usuário, perfil e token numa transação (RegisterSerializer.create)
+            with recusar_se_ocupado():
+                user = serializer.save()
+        except HashOcupado:
+            return resposta_hash_ocupado()
         
         return Response({
             'user': UserSerializer(user).data,
-            'token': token.key
+            'token': user.auth_token.key
         }, status=status.HTTP_201_CREATED)
 
 
+def resposta_hash_ocupado():
+    """503 quando todas as vagas de hash de senha estão ocupadas (ver imoveis/senhas.py)"""
+    return Response(
+        {'error': 'Muitos acessos ao mesmo tempo. Tente novamente em instantes.'},
+        status=status.HTTP_503_SERVICE_UNAVAILABLE,
+        headers={'Retry-After': '1'},
+    )
+
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes([LimiteLogin])
 def login_view(request):
     """View personalizada para login"""
     from django.contrib.auth import authenticate
@@ -135,10 +456,18 @@ def login_view(request):
     username = request.data.get('username')
     password = request.data.get('password')
     
-    user = authenticate(username=username, password=password)
+    try:
+        with recusar_se_ocupado():
+            user = authenticate(username=username, password=password)
+    except HashOcupado:
+        return resposta_hash_ocupado()
     
     if user:
-        token, created = Token.objects.get_or_create(user=user)
+        # O BackendSenha já trouxe o token junto com o usuário
+        try:
+            token = user.auth_token
+        except Token.DoesNotExist:
+            token, created = Token.objects.get_or_create(user=user)
         return Response({
             'token': token.key,
             'user': UserSerializer(user).data
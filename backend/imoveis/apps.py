@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class ImoveisConfig(AppConfig):
     name = 'imoveis'
+
+    def ready(self):
+        from . import instrumentacao, signals  # noqa: F401
@@ -0,0 +1,209 @@
+"""
+Autenticação da API: login por senha e token.
+
+Os tokens já validados ficam num LRU em memória do processo, com TTL
+(``IMOVEIS_TOKEN_CACHE_TAMANHO`` e ``IMOVEIS_TOKEN_CACHE_TTL``), e os
+requests autenticados seguintes não consultam ``authtoken_token`` nem
+``auth_user``. O logout (token excluído) e qualquer alteração do usuário ou
+do perfil (ex.: ``is_active=False``) tiram as entradas do LRU na hora pelos
+signals (imoveis/signals.py).
+
+Com mais de um processo, o signal só roda no processo que fez a alteração;
+os outros ficam sabendo por uma marca de revogação gravada no alias de
+``CACHES`` ``IMOVEIS_TOKEN_CACHE_ALIAS`` (uma leitura de cache por acerto,
+no lugar da consulta ao banco). Para valer entre processos, o alias precisa
+ser compartilhado (arquivo ou Redis); ``None`` dispensa a marca.
+
+Alterações feitas com ``QuerySet.update()`` não disparam signals: depois
+delas, chame ``invalidar_usuario``.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.utils.translation import gettext_lazy as _
+from rest_framework import authentication, exceptions
+
+from . import metricas
+
+
+class CacheTokens:
+    """LRU com TTL de token -> (usuário, token), seguro entre threads"""
+
+    def __init__(self, tamanho, ttl):
+        self.tamanho = tamanho
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entradas = OrderedDict()  # chave -> (usuário, token, lido_em)
+
+    def obter(self, chave):
+        """(usuário, token, lido_em) ou None se ausente/expirado"""
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is None:
+                return None
+            if time.time() - entrada[2] >= self.ttl:
+                del self._entradas[chave]
+                return None
+            self._entradas.move_to_end(chave)
+            return entrada
+
+    def guardar(self, chave, usuario, token, lido_em):
+        """``lido_em``: quando a leitura no banco começou (vale para o TTL e a revogação)"""
+        with self._lock:
+            self._entradas[chave] = (usuario, token, lido_em)
+            self._entradas.move_to_end(chave)
+            while len(self._entradas) > self.tamanho:
+                self._entradas.popitem(last=False)
+
+    def remover(self, chave):
+        with self._lock:
+            self._entradas.pop(chave, None)
+
+    def remover_usuario(self, usuario_id):
+        with self._lock:
+            for chave in [chave for chave, entrada in self._entradas.items()
+                          if entrada[0].pk == usuario_id]:
+                del self._entradas[chave]
+
+    def limpar(self):
+        with self._lock:
+            self._entradas.clear()
+
+    def __len__(self):
+        return len(self._entradas)
+
+
+cache_tokens = CacheTokens(
+    getattr(settings, 'IMOVEIS_TOKEN_CACHE_TAMANHO', 10_000),
+    getattr(settings, 'IMOVEIS_TOKEN_CACHE_TTL', 300),
+)
+
+
+def _cache_revogacao():
+    alias = getattr(settings, 'IMOVEIS_TOKEN_CACHE_ALIAS', 'default')
+    return caches[alias] if alias else None
+
+
+def _marca_token(chave):
+    return f'imoveis:token:revogado:{chave}'
+
+
+def _marca_usuario(usuario_id):
+    return f'imoveis:token:usuario:{usuario_id}'
+
+
+def _revogado(chave, usuario_id, lido_em):
+    """Algum processo invalidou o token ou o usuário depois da leitura guardada?"""
+    compartilhado = _cache_revogacao()
+    if compartilhado is None:
+        return False
+    marcas = compartilhado.get_many([_marca_token(chave), _marca_usuario(usuario_id)])
+    return any(marca >= lido_em for marca in marcas.values())
+
+
+def _marcar(marca):
+    compartilhado = _cache_revogacao()
+    if compartilhado is not None:
+        compartilhado.set(marca, time.time(), cache_tokens.ttl)
+
+
+def invalidar_token(chave):
+    """Tira o token do cache (logout, token excluído)"""
+    cache_tokens.remover(chave)
+    _marcar(_marca_token(chave))
+
+
+def invalidar_usuario(usuario_id):
+    """Tira do cache os tokens do usuário (desativado, dados ou perfil alterados)"""
+    cache_tokens.remover_usuario(usuario_id)
+    _marcar(_marca_usuario(usuario_id))
+
+
+def _copiar(usuario):
+    """
+    Cópia do usuário em cache (e do perfil) para o request: views como
+    /api/auth/perfil/ alteram ``request.user``, e o objeto guardado é
+    compartilhado entre requests e threads.
+    """
+    copia = copy.copy(usuario)
+    perfil = usuario._state.fields_cache.get('perfil')
+    if perfil is not None:
+        perfil = copy.copy(perfil)
+        perfil._state.fields_cache['user'] = copia
+        copia._state.fields_cache['perfil'] = perfil
+    return copia
+
+
+def taxa_acerto():
+    """Fração das autenticações por token respondidas pelo cache"""
+    acertos = metricas.obter('token_cache', resultado='hit')
+    total = acertos + metricas.obter('token_cache', resultado='miss')
+    return acertos / total if total else 0.0
+
+
+class TokenAuthentication(authentication.TokenAuthentication):
+    """
+    Token do DRF trazendo o perfil junto com o usuário: UserSerializer
+    (auth/me, perfil) lê ``user.perfil``, que assim vem no mesmo JOIN em vez
+    de uma consulta a mais por request. O resultado fica em ``cache_tokens``.
+    """
+
+    def authenticate_credentials(self, key):
+        if cache_tokens.ttl > 0:
+            entrada = cache_tokens.obter(key)
+            if entrada is not None:
+                usuario, token, lido_em = entrada
+                if not _revogado(key, usuario.pk, lido_em):
+                    metricas.incrementar('token_cache', resultado='hit')
+                    # A consulta token + usuário + perfil que deixou de ser feita
+                    metricas.incrementar('token_cache_consultas_evitadas')
+                    return (_copiar(usuario), token)
+                cache_tokens.remover(key)
+            metricas.incrementar('token_cache', resultado='miss')
+
+        lido_em = time.time()
+        model = self.get_model()
+        try:
+            token = model.objects.select_related('user__perfil').get(key=key)
+        except model.DoesNotExist:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+
+        if cache_tokens.ttl > 0:
+            cache_tokens.guardar(key, token.user, token, lido_em)
+            return (_copiar(token.user), token)
+        return (token.user, token)
+
+
+class BackendSenha(ModelBackend):
+    """
+    ModelBackend que já traz perfil e token na consulta do usuário: o login
+    responde com ``UserSerializer`` (lê o perfil) e o token, sem uma
+    consulta para cada.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(User.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = User._default_manager.select_related('perfil', 'auth_token').get(
+                **{User.USERNAME_FIELD: username}
+            )
+        except User.DoesNotExist:
+            # Como no ModelBackend: calcula um hash mesmo assim, para o tempo
+            # de resposta não revelar se o usuário existe
+            User().set_password(password)
+            return None
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
@@ -0,0 +1,154 @@
+"""
+Utilitários compartilhados pelos comandos de benchmark.
+
+Os benchmarks rodam em um banco temporário (o mesmo mecanismo usado pelos
+testes), então nunca tocam no banco de desenvolvimento.
+"""
+import logging
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from django.db import connection, connections
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+
+@contextmanager
+def banco_temporario(verbosity=0):
+    """
+    Cria um banco de testes descartável e o remove ao final.
+
+    No SQLite o banco é criado em arquivo, e não em memória compartilhada,
+    para que escritas concorrentes esperem o lock como em produção em vez
+    de falharem com "database table is locked".
+    """
+    nome_original = connection.settings_dict['NAME']
+    configuracao_teste = connection.settings_dict.setdefault('TEST', {})
+    nome_teste_original = configuracao_teste.get('NAME')
+    pasta = None
+    if connection.vendor == 'sqlite':
+        pasta = tempfile.mkdtemp(prefix='benchmark-')
+        configuracao_teste['NAME'] = os.path.join(pasta, 'benchmark.sqlite3')
+
+    # Erros 500 são contabilizados pelo benchmark; o traceback só polui a saída
+    logger = logging.getLogger('django.request')
+    nivel_original = logger.level
+    logger.setLevel(logging.CRITICAL)
+
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=verbosity, autoclobber=True)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(nome_original, verbosity)
+        teardown_test_environment()
+        configuracao_teste['NAME'] = nome_teste_original
+        logger.setLevel(nivel_original)
+        if pasta:
+            shutil.rmtree(pasta, ignore_errors=True)
+
+
+def percentil(valores, p):
+    """Percentil por interpolação linear (p entre 0 e 100)"""
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    posicao = (len(ordenados) - 1) * p / 100
+    inferior = int(posicao)
+    superior = min(inferior + 1, len(ordenados) - 1)
+    return ordenados[inferior] + (ordenados[superior] - ordenados[inferior]) * (posicao - inferior)
+
+
+def resumir(latencias, duracao, erros=0):
+    """Resumo padrão de uma rodada: latências em ms e vazão em req/s"""
+    ms = [latencia * 1000 for latencia in latencias]
+    return {
+        'requisicoes': len(latencias),
+        'erros': erros,
+        'duracao_s': round(duracao, 4),
+        'vazao_rps': round(len(latencias) / duracao, 1) if duracao else 0.0,
+        'media_ms': round(statistics.fmean(ms), 3) if ms else 0.0,
+        'p50_ms': round(percentil(ms, 50), 3),
+        'p95_ms': round(percentil(ms, 95), 3),
+        'p99_ms': round(percentil(ms, 99), 3),
+    }
+
+
+def executar_concorrente(funcao, total, concorrencia):
+    """
+    Executa ``funcao(i)`` ``total`` vezes distribuídas em ``concorrencia``
+    threads. Retorna (latências em segundos, quantidade de erros, duração).
+
+    ``funcao`` deve retornar True em caso de sucesso.
+    """
+    latencias = []
+    erros = 0
+    lock = threading.Lock()
+
+    def tarefa(i):
+        nonlocal erros
+        inicio = time.perf_counter()
+        try:
+            ok = funcao(i)
+        except Exception:
+            ok = False
+        decorrido = time.perf_counter() - inicio
+        with lock:
+            if ok:
+                latencias.append(decorrido)
+            else:
+                erros += 1
+
+    def trabalhador(indices):
+        try:
+            for i in indices:
+                tarefa(i)
+        finally:
+            connections.close_all()
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concorrencia) as executor:
+        for t in range(concorrencia):
+            executor.submit(trabalhador, range(t, total, concorrencia))
+    duracao = time.perf_counter() - inicio
+    return latencias, erros, duracao
+
+
+TITULOS = [
+    'Casa espaçosa', 'Kitnet mobiliada', 'Apartamento novo', 'Quarto individual',
+    'Casa com quintal', 'Apartamento térreo', 'Kitnet perto da praça', 'Casa reformada',
+]
+TRECHOS = [
+    'cozinha americana', 'dois quartos', 'suíte com varanda', 'garagem coberta',
+    'área de serviço', 'próximo ao mercado', 'rua calma', 'água e luz inclusas',
+    'piso em cerâmica', 'portão eletrônico', 'quintal amplo', 'sala conjugada',
+]
+
+
+def criar_imoveis_sinteticos(quantidade, dono, semente=42, lote=5000):
+    """Cria imóveis variados com bulk_create (sem disparar signals)"""
+    from .models import Imovel
+
+    sorteio = random.Random(semente)
+    bairros = [codigo for codigo, _ in Imovel.BAIRROS_CHOICES]
+    tipos = [codigo for codigo, _ in Imovel.TIPO_CHOICES]
+    for inicio in range(0, quantidade, lote):
+        Imovel.objects.bulk_create([
+            Imovel(
+                titulo=f'{sorteio.choice(TITULOS)} {i}',
+                descricao=', '.join(sorteio.sample(TRECHOS, 4)).capitalize() + '.',
+                preco=sorteio.randrange(300, 3000, 50),
+                bairro=sorteio.choice(bairros),
+                tipo=sorteio.choice(tipos),
+                dono=dono,
+                telefone_contato='(77) 99999-0000',
+                foto_principal='imoveis/benchmark.jpg',
+            )
+            for i in range(inicio, min(inicio + lote, quantidade))
+        ])
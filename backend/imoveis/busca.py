@@ -0,0 +1,171 @@
+"""
+Busca textual de imóveis.
+
+O parâmetro ``?search=`` da listagem passa por um backend de busca
+configurável em ``IMOVEIS_BUSCA_BACKEND``. No SQLite o padrão é um índice
+FTS5 (tabela virtual ``imoveis_busca``) mantido em sincronia pelos signals
+de ``Imovel``, que ignora acentos ("vermelhao" encontra "Vermelhão"),
+aceita prefixos ("cozinha" encontra "cozinhas") e ordena por relevância.
+Nos demais bancos é usado o LIKE tradicional.
+"""
+import re
+import unicodedata
+from functools import reduce
+from operator import and_, or_
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import BooleanField, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+from rest_framework.filters import SearchFilter
+from rest_framework.settings import api_settings
+
+
+def remover_acentos(texto):
+    decomposto = unicodedata.normalize('NFKD', texto)
+    return ''.join(c for c in decomposto if not unicodedata.combining(c))
+
+
+def tokenizar(texto):
+    """Quebra o texto em termos minúsculos e sem acento"""
+    return re.findall(r'\w+', remover_acentos(texto).lower())
+
+
+class BackendBusca:
+    """
+    Interface dos backends de busca.
+
+    ``filtrar`` deve devolver o queryset restrito aos imóveis que casam com
+    o termo, anotado com ``relevancia`` (quanto menor, mais relevante).
+    """
+
+    def filtrar(self, queryset, termo, campos):
+        raise NotImplementedError
+
+    def indexar(self, imoveis):
+        """Atualiza o índice para os imóveis informados"""
+
+    def remover(self, ids):
+        """Remove os ids informados do índice"""
+
+    def reindexar(self):
+        """Reconstrói o índice inteiro a partir da tabela de imóveis"""
+
+
+class BackendLike(BackendBusca):
+    """Busca com LIKE '%termo%' nos campos de ``search_fields`` da view"""
+
+    def filtrar(self, queryset, termo, campos):
+        termos = tokenizar(termo)
+        if not termos or not campos:
+            return queryset
+
+        condicoes = [
+            reduce(or_, (Q(**{f'{campo}__icontains': t}) for campo in campos))
+            for t in termos
+        ]
+        return queryset.filter(reduce(and_, condicoes)).annotate(relevancia=Value(0.0))
+
+
+class BackendFTS5(BackendBusca):
+    """Índice de texto completo do SQLite (FTS5)"""
+    TABELA = 'imoveis_busca'
+    # Pesos do bm25 por coluna: título, descrição, bairro
+    PESOS = (10.0, 1.0, 5.0)
+
+    def montar_consulta(self, termo):
+        """Converte o texto digitado em consulta FTS5: todos os termos, por prefixo"""
+        return ' '.join(f'"{t}"*' for t in tokenizar(termo))
+
+    def filtrar(self, queryset, termo, campos):
+        consulta = self.montar_consulta(termo)
+        if not consulta:
+            return queryset
+
+        # O JOIN com a tabela virtual (via IndiceBusca) deixa o SQLite partir
+        # do MATCH e calcular o bm25 uma única vez por resultado
+        pesos = ', '.join(str(peso) for peso in self.PESOS)
+        return queryset.filter(indice_busca__isnull=False).filter(
+            RawSQL(f'{self.TABELA} MATCH %s', [consulta], output_field=BooleanField())
+        ).annotate(
+            relevancia=RawSQL(f'bm25({self.TABELA}, {pesos})', [], output_field=FloatField())
+        )
+
+    def _linha(self, imovel):
+        return (imovel.pk, imovel.titulo, imovel.descricao, imovel.get_bairro_display())
+
+    def indexar(self, imoveis):
+        linhas = [self._linha(imovel) for imovel in imoveis]
+        if not linhas:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'DELETE FROM {self.TABELA} WHERE rowid = %s', [(linha[0],) for linha in linhas]
+            )
+            cursor.executemany(
+                f'INSERT INTO {self.TABELA} (rowid, titulo, descricao, bairro) '
+                f'VALUES (%s, %s, %s, %s)',
+                linhas,
+            )
+
+    def remover(self, ids):
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'DELETE FROM {self.TABELA} WHERE rowid = %s', [(pk,) for pk in ids]
+            )
+
+    def reindexar(self):
+        from .models import Imovel
+
+        # O nome do bairro é resolvido no próprio SQL para não trazer as linhas ao Python
+        casos = ' '.join(
+            "WHEN '{}' THEN '{}'".format(codigo, nome.replace("'", "''"))
+            for codigo, nome in Imovel.BAIRROS_CHOICES
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.TABELA}')
+            cursor.execute(
+                f'INSERT INTO {self.TABELA} (rowid, titulo, descricao, bairro) '
+                f'SELECT id, titulo, descricao, CASE bairro {casos} ELSE bairro END '
+                f'FROM {Imovel._meta.db_table}'
+            )
+
+
+_backend = None
+
+
+def obter_backend():
+    """Instancia (uma vez) o backend configurado ou o padrão do banco em uso"""
+    global _backend
+    if _backend is None:
+        caminho = getattr(settings, 'IMOVEIS_BUSCA_BACKEND', None)
+        if caminho:
+            _backend = import_string(caminho)()
+        elif connection.vendor == 'sqlite':
+            _backend = BackendFTS5()
+        else:
+            _backend = BackendLike()
+    return _backend
+
+
+class BuscaFilter(SearchFilter):
+    """
+    Substitui o SearchFilter do DRF delegando a busca ao backend configurado.
+
+    Sem ``?ordering=`` explícito os resultados vêm ordenados por relevância;
+    por isso deve ficar depois do OrderingFilter em ``filter_backends``.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        termo = request.query_params.get(self.search_param, '').strip()
+        if not termo:
+            return queryset
+
+        campos = self.get_search_fields(view, request) or []
+        queryset = obter_backend().filtrar(queryset, termo, campos)
+
+        if 'relevancia' in queryset.query.annotations and \
+                api_settings.ORDERING_PARAM not in request.query_params:
+            queryset = queryset.order_by('relevancia', *getattr(view, 'ordering', []))
+        return queryset
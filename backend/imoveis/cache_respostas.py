@@ -0,0 +1,150 @@
+"""
+Cache de respostas dos endpoints públicos de imóveis.
+
+``list``, ``retrieve`` e ``destaques`` guardam o corpo já serializado da
+resposta, com chave formada pelo endpoint, pelos parâmetros da URL
+normalizados (filtros, busca, ordenação, página) e por uma versão global.
+Qualquer escrita em Imovel ou ImagemImovel incrementa a versão (ver
+imoveis/signals.py), o que invalida de uma vez todas as entradas antigas;
+elas expiram sozinhas pelo timeout.
+
+O armazenamento é um alias de ``CACHES`` (``IMOVEIS_CACHE_RESPOSTAS_ALIAS``),
+então vale qualquer backend do Django: memória local, arquivo ou Redis.
+
+As versões ``a*`` servem às views assíncronas (imoveis/api_async.py). O
+cache é lido com a API síncrona mesmo ali: os ``aget``/``aset`` do Django
+só embrulham a síncrona numa thread, o que custa mais que a leitura.
+"""
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.response import Response
+
+from . import metricas
+
+
+CHAVE_VERSAO = 'imoveis:respostas:versao'
+
+
+def _cache():
+    return caches[getattr(settings, 'IMOVEIS_CACHE_RESPOSTAS_ALIAS', 'default')]
+
+
+def _timeout():
+    return getattr(settings, 'IMOVEIS_CACHE_RESPOSTAS_TIMEOUT', 300)
+
+
+def versao_atual():
+    versao = _cache().get(CHAVE_VERSAO)
+    if versao is None:
+        # Começa do relógio: se a chave for descartada pelo cache, a nova
+        # versão nunca coincide com a de respostas antigas ainda guardadas
+        _cache().add(CHAVE_VERSAO, int(time.time() * 1000), None)
+        versao = _cache().get(CHAVE_VERSAO)
+    return versao
+
+
+def invalidar_respostas():
+    """Invalida todas as respostas em cache"""
+    try:
+        _cache().incr(CHAVE_VERSAO)
+    except ValueError:
+        versao_atual()
+
+
+def normalizar_parametros(query_params):
+    """Parâmetros em ordem fixa e sem valores vazios (?a=1&b= == ?b=&a=1)"""
+    return sorted(
+        (chave, sorted(valor for valor in valores if valor != ''))
+        for chave, valores in query_params.lists()
+        if any(valor != '' for valor in valores)
+    )
+
+
+def chave_resposta(request, endpoint, **extras):
+    # O host entra na chave porque links de paginação e fotos são absolutos
+    partes = [
+        request.get_host(),
+        getattr(request, 'accepted_media_type', ''),
+        normalizar_parametros(request.query_params),
+        sorted(extras.items()),
+    ]
+    resumo = hashlib.md5(json.dumps(partes, default=str).encode()).hexdigest()
+    return f'imoveis:resposta:{endpoint}:{versao_atual()}:{resumo}'
+
+
+def obter_validadores(request, endpoint, calcular, **extras):
+    """
+    ETag e Last-Modified da resposta, guardados junto com ela: em um acerto
+    o request condicional é respondido sem consultar o banco.
+    """
+    chave = chave_resposta(request, endpoint, **extras) + ':validadores'
+    validadores = _cache().get(chave)
+    if validadores is None:
+        validadores = calcular()
+        _cache().set(chave, validadores, _timeout())
+    return validadores
+
+
+async def aobter_validadores(request, endpoint, calcular, **extras):
+    """obter_validadores com ``calcular`` assíncrono"""
+    chave = chave_resposta(request, endpoint, **extras) + ':validadores'
+    validadores = _cache().get(chave)
+    if validadores is None:
+        validadores = await calcular()
+        _cache().set(chave, validadores, _timeout())
+    return validadores
+
+
+def obter_resposta(request, endpoint, gerar, **extras):
+    """
+    Devolve a resposta guardada para este request ou chama ``gerar()`` e
+    guarda o resultado. Só respostas 200 são guardadas. O cabeçalho
+    ``X-Cache`` indica HIT ou MISS.
+    """
+    chave = chave_resposta(request, endpoint, **extras)
+    dados = _cache().get(chave)
+    if dados is not None:
+        metricas.incrementar('respostas_cache', endpoint=endpoint, resultado='hit')
+        return Response(dados, headers={'X-Cache': 'HIT'})
+
+    metricas.incrementar('respostas_cache', endpoint=endpoint, resultado='miss')
+    resposta = gerar()
+    if resposta.status_code == 200:
+        _cache().set(chave, resposta.data, _timeout())
+    resposta['X-Cache'] = 'MISS'
+    return resposta
+
+
+async def aobter_resposta(request, endpoint, gerar, **extras):
+    """obter_resposta com ``gerar`` assíncrono"""
+    chave = chave_resposta(request, endpoint, **extras)
+    dados = _cache().get(chave)
+    if dados is not None:
+        metricas.incrementar('respostas_cache', endpoint=endpoint, resultado='hit')
+        return Response(dados, headers={'X-Cache': 'HIT'})
+
+    metricas.incrementar('respostas_cache', endpoint=endpoint, resultado='miss')
+    resposta = await gerar()
+    if resposta.status_code == 200:
+        _cache().set(chave, resposta.data, _timeout())
+    resposta['X-Cache'] = 'MISS'
+    return resposta
+
+
+def taxa_acerto(endpoint=None):
+    """Fração de acertos do cache de respostas (de um endpoint ou de todos)"""
+    acertos = faltas = 0
+    for (nome, rotulos), total in metricas.coletar().items():
+        rotulos = dict(rotulos)
+        if nome != 'respostas_cache' or (endpoint and rotulos.get('endpoint') != endpoint):
+            continue
+        if rotulos.get('resultado') == 'hit':
+            acertos += total
+        else:
+            faltas += total
+    consultas = acertos + faltas
+    return acertos / consultas if consultas else 0.0
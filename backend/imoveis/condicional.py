@@ -0,0 +1,69 @@
+"""
+GET condicional (ETag / Last-Modified) nos endpoints de imóveis.
+
+Os validadores saem de um único agregado sobre o queryset já filtrado,
+max(atualizado_em) e count(*), sem serializar nada, combinados com os
+parâmetros da URL. Mudanças nas imagens e nas variantes também tocam o
+``atualizado_em`` do imóvel (ver imoveis/signals.py), e uma exclusão muda a
+contagem. Se o cliente mandar If-None-Match/If-Modified-Since ainda
+válidos, a resposta é um 304 sem corpo.
+
+Na paginação por cursor o agregado seria um COUNT(*) que essa paginação
+existe para evitar; ali as respostas saem sem validadores.
+
+O ETag é fraco (W/): o contador de visualizações muda sem alterar
+``atualizado_em`` e não é considerado uma mudança do conteúdo.
+"""
+import hashlib
+import json
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from . import metricas
+from .cache_respostas import normalizar_parametros
+
+
+def calcular_validadores(queryset, request):
+    """(etag, last_modified em segundos epoch, total de linhas) do queryset"""
+    agregado = queryset.order_by().aggregate(ultima=Max('atualizado_em'), total=Count('id'))
+    return _validadores(agregado, request)
+
+
+async def acalcular_validadores(queryset, request):
+    """calcular_validadores com o ORM assíncrono"""
+    agregado = await queryset.order_by().aaggregate(ultima=Max('atualizado_em'), total=Count('id'))
+    return _validadores(agregado, request)
+
+
+def _validadores(agregado, request):
+    ultima = agregado['ultima']
+    partes = [
+        ultima.isoformat() if ultima else None,
+        agregado['total'],
+        normalizar_parametros(request.query_params),
+        getattr(request, 'accepted_media_type', ''),
+    ]
+    resumo = hashlib.md5(json.dumps(partes, default=str).encode()).hexdigest()
+    return f'W/"{resumo}"', int(ultima.timestamp()) if ultima else None, agregado['total']
+
+
+def resposta_nao_modificada(request, endpoint, etag, last_modified):
+    """HttpResponseNotModified se o cliente já tem essa versão, senão None"""
+    resposta = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if resposta is not None:
+        metricas.incrementar('respostas_condicionais', endpoint=endpoint, resultado='304')
+        aplicar_validadores(resposta, etag, last_modified)
+        return resposta
+    metricas.incrementar('respostas_condicionais', endpoint=endpoint, resultado='200')
+    return None
+
+
+def aplicar_validadores(resposta, etag, last_modified):
+    resposta['ETag'] = etag
+    if last_modified:
+        resposta['Last-Modified'] = http_date(last_modified)
+    # Sem isso o navegador pode reaproveitar a cópia local sem revalidar
+    resposta['Cache-Control'] = 'no-cache'
+    return resposta
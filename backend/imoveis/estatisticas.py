@@ -0,0 +1,145 @@
+"""
+Estatísticas gerais do catálogo.
+
+Tudo é calculado a partir de um único agregado agrupado por
+(ativo, tipo, bairro), mais uma consulta para a mediana de preço, e o
+resultado fica em cache até que algum imóvel seja salvo ou excluído
+(ver imoveis/signals.py).
+"""
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import Count, Min, Max, Sum
+
+from . import metricas
+from .models import Imovel
+
+
+CHAVE_CACHE = 'imoveis:estatisticas'
+# A invalidação é feita pelos signals; o timeout só limita dados órfãos
+TIMEOUT_CACHE = 60 * 60
+
+CENTAVOS = Decimal('0.01')
+
+
+def _formatar_preco(valor):
+    return str(valor.quantize(CENTAVOS)) if valor is not None else None
+
+
+def _grupos():
+    return (
+        Imovel.objects.order_by()
+        .values('ativo', 'tipo', 'bairro')
+        .annotate(
+            quantidade=Count('id'),
+            preco_min=Min('preco'),
+            preco_max=Max('preco'),
+            preco_soma=Sum('preco'),
+        )
+    )
+
+
+def _precos_do_meio(quantidade):
+    """Só as 1 ou 2 linhas do meio dos preços ativos, para a mediana (None sem imóveis)"""
+    if not quantidade:
+        return None
+    meio = (quantidade - 1) // 2
+    tamanho = 1 if quantidade % 2 else 2
+    return (
+        Imovel.objects.filter(ativo=True)
+        .order_by('preco')
+        .values_list('preco', flat=True)[meio:meio + tamanho]
+    )
+
+
+def _ativos(grupos):
+    return sum(grupo['quantidade'] for grupo in grupos if grupo['ativo'])
+
+
+def _montar(grupos, precos_do_meio):
+    nomes_tipo = dict(Imovel.TIPO_CHOICES)
+    nomes_bairro = dict(Imovel.BAIRROS_CHOICES)
+    por_tipo = {nome: 0 for nome in nomes_tipo.values()}
+    por_bairro = {nome: 0 for nome in nomes_bairro.values()}
+    total = ativos = 0
+    preco_min = preco_max = None
+    preco_soma = Decimal(0)
+
+    for grupo in grupos:
+        total += grupo['quantidade']
+        if not grupo['ativo']:
+            continue
+
+        ativos += grupo['quantidade']
+        tipo = nomes_tipo.get(grupo['tipo'], grupo['tipo'])
+        bairro = nomes_bairro.get(grupo['bairro'], grupo['bairro'])
+        por_tipo[tipo] = por_tipo.get(tipo, 0) + grupo['quantidade']
+        por_bairro[bairro] = por_bairro.get(bairro, 0) + grupo['quantidade']
+
+        preco_soma += grupo['preco_soma']
+        if preco_min is None or grupo['preco_min'] < preco_min:
+            preco_min = grupo['preco_min']
+        if preco_max is None or grupo['preco_max'] > preco_max:
+            preco_max = grupo['preco_max']
+
+    mediana = sum(precos_do_meio) / len(precos_do_meio) if precos_do_meio else None
+    return {
+        'total': total,
+        'ativos': ativos,
+        'por_tipo': por_tipo,
+        'por_bairro': por_bairro,
+        'preco': {
+            'minimo': _formatar_preco(preco_min),
+            'maximo': _formatar_preco(preco_max),
+            'media': _formatar_preco(preco_soma / ativos if ativos else None),
+            'mediana': _formatar_preco(mediana),
+        },
+    }
+
+
+def calcular_estatisticas():
+    """Calcula as estatísticas direto no banco (sem cache)"""
+    grupos = list(_grupos())
+    consulta = _precos_do_meio(_ativos(grupos))
+    return _montar(grupos, list(consulta) if consulta is not None else [])
+
+
+async def acalcular_estatisticas():
+    """calcular_estatisticas com o ORM assíncrono"""
+    grupos = [grupo async for grupo in _grupos()]
+    consulta = _precos_do_meio(_ativos(grupos))
+    return _montar(grupos, [preco async for preco in consulta] if consulta is not None else [])
+
+
+def obter_estatisticas():
+    """
+    Estatísticas do cache, recalculando em caso de miss.
+
+    Retorna (dados, acerto), onde acerto indica se vieram do cache.
+    """
+    dados = cache.get(CHAVE_CACHE)
+    if dados is not None:
+        metricas.incrementar('estatisticas_cache', resultado='hit')
+        return dados, True
+
+    metricas.incrementar('estatisticas_cache', resultado='miss')
+    dados = calcular_estatisticas()
+    cache.set(CHAVE_CACHE, dados, TIMEOUT_CACHE)
+    return dados, False
+
+
+async def aobter_estatisticas():
+    """obter_estatisticas com o ORM assíncrono"""
+    dados = cache.get(CHAVE_CACHE)
+    if dados is not None:
+        metricas.incrementar('estatisticas_cache', resultado='hit')
+        return dados, True
+
+    metricas.incrementar('estatisticas_cache', resultado='miss')
+    dados = await acalcular_estatisticas()
+    cache.set(CHAVE_CACHE, dados, TIMEOUT_CACHE)
+    return dados, False
+
+
+def invalidar_estatisticas():
+    cache.delete(CHAVE_CACHE)
@@ -0,0 +1,120 @@
+"""
+Exportação de imóveis em CSV e JSON Lines, em streaming.
+
+As linhas são lidas com ``.iterator(chunk_size=...)`` e escritas na resposta
+à medida que saem do banco, então a memória usada é a de um lote, seja qual
+for o tamanho do catálogo. Usada pela ação do admin e por
+``/api/imoveis/meus_imoveis/exportar/``.
+"""
+import csv
+
+import orjson
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from .models import Imovel
+
+
+# get_FOO_display() custa caro por linha; o dicionário das choices, não
+BAIRROS = dict(Imovel.BAIRROS_CHOICES)
+TIPOS = dict(Imovel.TIPO_CHOICES)
+
+# (coluna, função que extrai o valor já como texto/número do JSON)
+COLUNAS = [
+    ('id', lambda imovel: imovel.pk),
+    ('titulo', lambda imovel: imovel.titulo),
+    ('descricao', lambda imovel: imovel.descricao),
+    ('preco', lambda imovel: str(imovel.preco)),
+    ('bairro', lambda imovel: imovel.bairro),
+    ('bairro_display', lambda imovel: BAIRROS.get(imovel.bairro, imovel.bairro)),
+    ('tipo', lambda imovel: imovel.tipo),
+    ('tipo_display', lambda imovel: TIPOS.get(imovel.tipo, imovel.tipo)),
+    ('telefone_contato', lambda imovel: imovel.telefone_contato),
+    ('whatsapp_link', lambda imovel: imovel.whatsapp_link_atual),
+    ('foto_principal', lambda imovel: imovel.foto_principal.name or ''),
+    ('dono', lambda imovel: imovel.dono.username),
+    ('ativo', lambda imovel: imovel.ativo),
+    ('visualizacoes', lambda imovel: imovel.visualizacoes),
+    ('criado_em', lambda imovel: timezone.localtime(imovel.criado_em).isoformat()),
+    ('atualizado_em', lambda imovel: timezone.localtime(imovel.atualizado_em).isoformat()),
+]
+
+# Colunas do banco lidas pela exportação
+CAMPOS = [
+    'id', 'titulo', 'descricao', 'preco', 'bairro', 'tipo', 'telefone_contato', 'whatsapp_link',
+    'foto_principal', 'dono__username', 'ativo', 'visualizacoes', 'criado_em', 'atualizado_em',
+]
+
+FORMATOS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'jsonl': ('application/x-ndjson', 'jsonl'),
+}
+
+
+def _linhas(queryset):
+    lote = getattr(settings, 'IMOVEIS_EXPORTACAO_LOTE', 2000)
+    queryset = queryset.select_related('dono').only(*CAMPOS).order_by('pk')
+    for imovel in queryset.iterator(chunk_size=lote):
+        yield [(nome, extrair(imovel)) for nome, extrair in COLUNAS]
+
+
+class _Eco:
+    """Arquivo falso: o csv.writer devolve a linha escrita em vez de guardá-la"""
+    def write(self, valor):
+        return valor
+
+
+def _em_blocos(pedacos, tamanho=64 * 1024):
+    """Junta as linhas em blocos de ~64 KB (uma escrita no socket por bloco, e não por linha)"""
+    bloco, acumulado = [], 0
+    for pedaco in pedacos:
+        bloco.append(pedaco)
+        acumulado += len(pedaco)
+        if acumulado >= tamanho:
+            yield b''.join(bloco)
+            bloco, acumulado = [], 0
+    if bloco:
+        yield b''.join(bloco)
+
+
+# Início de célula que o Excel/LibreOffice interpreta como fórmula
+INICIO_FORMULA = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _celula(valor):
+    """Texto do dono (título, descrição...) que viraria fórmula ganha um ' na frente"""
+    if isinstance(valor, str) and valor.startswith(INICIO_FORMULA):
+        return "'" + valor
+    return valor
+
+
+def _csv(queryset):
+    escritor = csv.writer(_Eco())
+    # BOM: o Excel só reconhece UTF-8 (acentos) com ele
+    yield ('\ufeff' + escritor.writerow([nome for nome, _ in COLUNAS])).encode()
+    for linha in _linhas(queryset):
+        yield escritor.writerow([_celula(valor) for _, valor in linha]).encode()
+
+
+def _jsonl(queryset):
+    for linha in _linhas(queryset):
+        yield orjson.dumps(dict(linha)) + b'\n'
+
+
+def gerar_csv(queryset):
+    return _em_blocos(_csv(queryset))
+
+
+def gerar_jsonl(queryset):
+    return _em_blocos(_jsonl(queryset))
+
+
+def resposta_exportacao(queryset, formato, nome='imoveis'):
+    """StreamingHttpResponse com o download de ``queryset`` em ``formato`` ('csv' ou 'jsonl')"""
+    content_type, extensao = FORMATOS[formato]
+    conteudo = gerar_csv(queryset) if formato == 'csv' else gerar_jsonl(queryset)
+    resposta = StreamingHttpResponse(conteudo, content_type=content_type)
+    data = timezone.localdate().isoformat()
+    resposta['Content-Disposition'] = f'attachment; filename="{nome}-{data}.{extensao}"'
+    return resposta
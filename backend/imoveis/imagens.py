@@ -0,0 +1,162 @@
+"""
+Variantes redimensionadas das fotos dos imóveis.
+
+Para cada foto enviada (``Imovel.foto_principal`` e ``ImagemImovel.imagem``)
+são geradas versões menores em WebP e JPEG, sem metadados EXIF, gravadas
+ao lado do original em uma pasta ``variantes/``. O resultado fica no campo
+JSON ``variantes`` do próprio objeto:
+
+    {
+        "origem": "imoveis/casa.jpg",
+        "bytes_original": 4123456,
+        "card": {"largura": 480, "altura": 360,
+                 "webp": {"nome": "imoveis/variantes/casa_card.webp", "bytes": 21034},
+                 "jpeg": {"nome": "imoveis/variantes/casa_card.jpg", "bytes": 30112}},
+        ...
+    }
+"""
+import logging
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from . import metricas
+from .cache_respostas import invalidar_respostas
+from .models import Imovel
+
+
+logger = logging.getLogger(__name__)
+
+# Caixa máxima (largura, altura) de cada variante; a proporção é mantida
+VARIANTES = {
+    'card': (480, 360),
+    'galeria': (1024, 768),
+    'full': (1920, 1920),
+}
+
+FORMATOS = {
+    'webp': {'formato': 'WEBP', 'extensao': 'webp', 'opcoes': {'quality': 80, 'method': 4}},
+    'jpeg': {'formato': 'JPEG', 'extensao': 'jpg',
+             'opcoes': {'quality': 82, 'optimize': True, 'progressive': True}},
+}
+
+
+def _nome_variante(nome_original, variante, extensao):
+    pasta, arquivo = os.path.split(nome_original)
+    base = os.path.splitext(arquivo)[0]
+    return os.path.join(pasta, 'variantes', f'{base}_{variante}.{extensao}')
+
+
+def _preparar(arquivo):
+    """Abre a imagem, aplica a rotação do EXIF e converte para RGB"""
+    imagem = Image.open(arquivo)
+    imagem = ImageOps.exif_transpose(imagem)
+    if imagem.mode in ('RGBA', 'LA', 'P'):
+        # JPEG não tem transparência: compõe sobre fundo branco
+        imagem = imagem.convert('RGBA')
+        fundo = Image.new('RGB', imagem.size, (255, 255, 255))
+        fundo.paste(imagem, mask=imagem.getchannel('A'))
+        return fundo
+    return imagem.convert('RGB')
+
+
+def remover_variantes(variantes, storage=default_storage):
+    for variante in VARIANTES:
+        for formato in FORMATOS:
+            nome = variantes.get(variante, {}).get(formato, {}).get('nome')
+            if nome:
+                storage.delete(nome)
+
+
+def gerar_variantes(arquivo, storage=default_storage):
+    """
+    Gera as variantes de um FieldFile e devolve o dicionário descrito no
+    topo do módulo. Levanta OSError/UnidentifiedImageError se o arquivo
+    não puder ser lido como imagem.
+    """
+    if not arquivo or not arquivo.name:
+        return {}
+
+    with storage.open(arquivo.name, 'rb') as original:
+        imagem = _preparar(original)
+    bytes_original = storage.size(arquivo.name)
+
+    resultado = {'origem': arquivo.name, 'bytes_original': bytes_original}
+    for variante, caixa in VARIANTES.items():
+        redimensionada = imagem.copy()
+        redimensionada.thumbnail(caixa, Image.Resampling.LANCZOS)
+        dados = {'largura': redimensionada.width, 'altura': redimensionada.height}
+
+        for formato, config in FORMATOS.items():
+            buffer = BytesIO()
+            # Sem o parâmetro exif o Pillow não copia metadados para o arquivo novo
+            redimensionada.save(buffer, config['formato'], **config['opcoes'])
+            nome = storage.save(
+                _nome_variante(arquivo.name, variante, config['extensao']),
+                ContentFile(buffer.getvalue()),
+            )
+            tamanho = buffer.tell()
+            dados[formato] = {'nome': nome, 'bytes': tamanho}
+            metricas.incrementar('imagens_variantes_bytes', tamanho, variante=variante, formato=formato)
+
+        resultado[variante] = dados
+
+    metricas.incrementar('imagens_originais_bytes', bytes_original)
+    metricas.incrementar('imagens_processadas')
+    return resultado
+
+
+def variantes_desatualizadas(instancia, campo):
+    """Indica se o arquivo de ``instancia.<campo>`` ainda não tem variantes geradas"""
+    arquivo = getattr(instancia, campo)
+    return (arquivo.name or '') != (instancia.variantes or {}).get('origem', '')
+
+
+def atualizar_variantes(instancia, campo, repetir_transitorios=False):
+    """
+    Regenera as variantes de ``instancia.<campo>`` se o arquivo mudou desde a
+    última geração. Grava com update() para não disparar signals de novo.
+
+    Com ``repetir_transitorios=True`` erros de E/S (storage indisponível,
+    disco cheio) são propagados para a fila tentar de novo; arquivos que não
+    são imagem continuam sendo registrados como erro definitivo.
+    """
+    if not variantes_desatualizadas(instancia, campo):
+        return False
+
+    arquivo = getattr(instancia, campo)
+    atuais = instancia.variantes or {}
+
+    try:
+        novas = gerar_variantes(arquivo)
+    except (UnidentifiedImageError, Image.DecompressionBombError) as erro:
+        logger.warning('Não foi possível gerar variantes de %s: %s', arquivo.name, erro)
+        novas = {'origem': arquivo.name, 'erro': str(erro)}
+    except OSError as erro:
+        if repetir_transitorios:
+            raise
+        logger.warning('Não foi possível gerar variantes de %s: %s', arquivo.name, erro)
+        # Guarda a origem para não tentar de novo a cada save do mesmo arquivo
+        novas = {'origem': arquivo.name, 'erro': str(erro)}
+
+    # Só grava se o campo ainda tem o mesmo arquivo: se a foto foi trocada
+    # enquanto esta geração rodava, outra tarefa cuida do arquivo novo e
+    # estas variantes (do antigo) não podem sobrescrever as dela
+    gravadas = type(instancia).objects.filter(
+        pk=instancia.pk, **{campo: arquivo.name or ''}
+    ).update(variantes=novas)
+    if not gravadas:
+        remover_variantes(novas)
+        return False
+    remover_variantes(atuais)
+    instancia.variantes = novas
+    # As URLs das variantes aparecem nas respostas: invalida o cache e o ETag
+    Imovel.objects.filter(pk=getattr(instancia, 'imovel_id', instancia.pk)).update(
+        atualizado_em=timezone.now()
+    )
+    invalidar_respostas()
+    return True
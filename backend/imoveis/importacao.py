@@ -0,0 +1,248 @@
+"""
+Importação de imóveis em lote (CSV ou JSON Lines + zip de fotos).
+
+Cada linha é validada pelo ``ImovelImportacaoSerializer``; as válidas são
+gravadas com ``bulk_create`` em lotes, todas dentro de uma única transação,
+e as inválidas voltam no relatório com os erros de cada campo. As fotos
+(``foto_principal`` e ``imagens``) são nomes de arquivos dentro do zip.
+
+Colunas: titulo, descricao, preco, bairro, tipo, telefone_contato,
+foto_principal e, opcionais, ativo e imagens (no CSV, nomes separados por
+``|``). O CSV pode usar ``,`` ou ``;`` como separador (o Excel em português
+usa ``;``).
+
+Como ``bulk_create`` não dispara signals, o que eles fariam (índice de
+busca, caches, variantes das fotos) é feito aqui, uma vez por lote.
+"""
+import csv
+import io
+import os
+import time
+import zipfile
+
+import orjson
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from PIL import Image, UnidentifiedImageError
+from rest_framework.exceptions import ValidationError
+
+from . import metricas
+from .busca import obter_backend
+from .cache_respostas import invalidar_respostas
+from .estatisticas import invalidar_estatisticas
+from .models import ImagemImovel, Imovel
+from .serializers import ImovelImportacaoSerializer
+from .tarefas import enfileirar_lote
+
+
+FORMATOS = ('csv', 'jsonl')
+
+
+class ErroImportacao(Exception):
+    """Arquivo que não dá para ler (formato, zip corrompido, linhas demais)"""
+
+
+def formato_do_arquivo(nome):
+    extensao = os.path.splitext(nome or '')[1].lower().lstrip('.')
+    return {'ndjson': 'jsonl', 'json': 'jsonl'}.get(extensao, extensao)
+
+
+def ler_csv(arquivo):
+    """(número da linha no arquivo, dados) de cada registro do CSV"""
+    texto = io.TextIOWrapper(arquivo, encoding='utf-8-sig', newline='')
+    amostra = texto.read(4096)
+    texto.seek(0)
+    try:
+        dialeto = csv.Sniffer().sniff(amostra, delimiters=',;\t')
+    except csv.Error:
+        dialeto = csv.excel
+    leitor = csv.DictReader(texto, dialect=dialeto)
+    for registro in leitor:
+        dados = {chave.strip(): valor for chave, valor in registro.items()
+                 if chave and valor not in ('', None)}
+        if 'imagens' in dados:
+            dados['imagens'] = [nome.strip() for nome in dados['imagens'].split('|') if nome.strip()]
+        yield leitor.line_num, dados
+
+
+def ler_jsonl(arquivo):
+    for numero, linha in enumerate(arquivo, start=1):
+        if not linha.strip():
+            continue
+        try:
+            dados = orjson.loads(linha)
+        except orjson.JSONDecodeError as erro:
+            dados = ValidationError({'linha': [f'JSON inválido: {erro}']})
+        else:
+            if not isinstance(dados, dict):
+                dados = ValidationError({'linha': ['Cada linha deve ser um objeto JSON.']})
+        yield numero, dados
+
+
+class Importador:
+    """
+    Importa imóveis de ``dono``. ``imagens`` é o zip (arquivo ou caminho)
+    com as fotos citadas nas linhas; com ``simular=True`` só valida.
+    """
+
+    def __init__(self, dono, imagens=None, lote=None, simular=False):
+        self.dono = dono
+        self.lote = lote or getattr(settings, 'IMOVEIS_IMPORTACAO_LOTE', 500)
+        self.simular = simular
+        self.max_linhas = getattr(settings, 'IMOVEIS_IMPORTACAO_MAX_LINHAS', 10_000)
+        self.max_imagem = getattr(settings, 'IMOVEIS_IMPORTACAO_MAX_IMAGEM', 10 * 1024 * 1024)
+        self.serializer = ImovelImportacaoSerializer()
+        self.salvos = []
+        self.conferidas = {}
+
+        self.zip = None
+        self.arquivos_zip = {}
+        if imagens is not None:
+            try:
+                self.zip = zipfile.ZipFile(imagens)
+            except zipfile.BadZipFile:
+                raise ErroImportacao('O arquivo de imagens não é um zip válido.')
+            for info in self.zip.infolist():
+                if not info.is_dir():
+                    # Aceita o caminho completo dentro do zip ou só o nome do arquivo
+                    self.arquivos_zip.setdefault(info.filename, info)
+                    self.arquivos_zip.setdefault(os.path.basename(info.filename), info)
+
+    def importar(self, arquivo, formato):
+        if formato not in FORMATOS:
+            raise ErroImportacao(f'Formato não suportado: {formato or "?"}. Use csv ou jsonl.')
+        try:
+            return self._importar(arquivo, formato)
+        finally:
+            if self.zip is not None:
+                self.zip.close()
+
+    def _importar(self, arquivo, formato):
+        inicio = time.perf_counter()
+        linhas = ler_csv(arquivo) if formato == 'csv' else ler_jsonl(arquivo)
+
+        relatorio, validas = [], []
+        for posicao, (numero, dados) in enumerate(linhas, start=1):
+            if posicao > self.max_linhas:
+                raise ErroImportacao(f'O arquivo passa do limite de {self.max_linhas} imóveis por importação.')
+            try:
+                if isinstance(dados, ValidationError):
+                    raise dados
+                validados = self.serializer.run_validation(dados)
+                self._conferir_fotos(validados)
+            except ValidationError as erro:
+                relatorio.append({'linha': numero, 'status': 'erro', 'erros': erro.detail})
+            else:
+                validas.append((numero, validados))
+
+        if self.simular:
+            relatorio.extend({'linha': numero, 'status': 'valido'} for numero, _ in validas)
+        elif validas:
+            relatorio.extend(self._gravar(validas))
+            invalidar_estatisticas()
+            invalidar_respostas()
+
+        relatorio.sort(key=lambda item: item['linha'])
+        erros = sum(1 for item in relatorio if item['status'] == 'erro')
+        criados = sum(1 for item in relatorio if item['status'] == 'criado')
+        metricas.incrementar('importacao_linhas', criados, status='criado')
+        metricas.incrementar('importacao_linhas', erros, status='erro')
+        return {
+            'total': len(relatorio),
+            'criados': criados,
+            'validos': len(validas),
+            'erros': erros,
+            'simulacao': self.simular,
+            'duracao_s': round(time.perf_counter() - inicio, 3),
+            'linhas': relatorio,
+        }
+
+    def _conferir_fotos(self, validados):
+        for campo, lista in (('foto_principal', [validados['foto_principal']]),
+                             ('imagens', validados.get('imagens', []))):
+            erros = [erro for erro in map(self._conferir_foto, lista) if erro]
+            if erros:
+                raise ValidationError({campo: erros})
+
+    def _conferir_foto(self, nome):
+        """Mensagem de erro da foto ``nome`` (None se estiver tudo certo)"""
+        if nome not in self.conferidas:
+            info = self.arquivos_zip.get(nome)
+            if info is None:
+                erro = f'{nome}: não está no zip de imagens.'
+            elif info.file_size > self.max_imagem:
+                erro = f'{nome}: maior que {self.max_imagem // (1024 * 1024)} MB.'
+            else:
+                try:
+                    with self.zip.open(info) as conteudo:
+                        Image.open(conteudo).verify()
+                    erro = None
+                except (UnidentifiedImageError, Image.DecompressionBombError, zipfile.BadZipFile,
+                        OSError, SyntaxError):
+                    erro = f'{nome}: não é uma imagem válida.'
+            self.conferidas[nome] = erro
+        return self.conferidas[nome]
+
+    def _salvar_foto(self, nome, modelo, campo):
+        """Copia a foto do zip para o storage (no upload_to do campo) e devolve o nome salvo"""
+        with self.zip.open(self.arquivos_zip[nome]) as conteudo:
+            dados = conteudo.read()
+        destino = modelo._meta.get_field(campo).generate_filename(None, os.path.basename(nome))
+        salvo = default_storage.save(destino, ContentFile(dados))
+        self.salvos.append(salvo)
+        return salvo
+
+    def _gravar(self, validas):
+        try:
+            with transaction.atomic():
+                resultado = []
+                for inicio in range(0, len(validas), self.lote):
+                    resultado.extend(self._gravar_lote(validas[inicio:inicio + self.lote]))
+                return resultado
+        except Exception:
+            # A transação desfez as linhas; as fotos copiadas ficariam órfãs
+            for nome in self.salvos:
+                default_storage.delete(nome)
+            raise
+
+    def _gravar_lote(self, lote):
+        imoveis, galerias = [], []
+        for _, dados in lote:
+            dados = dict(dados)
+            foto = dados.pop('foto_principal')
+            galerias.append(dados.pop('imagens', []))
+            imovel = Imovel(dono=self.dono, **dados)
+            imovel.foto_principal = self._salvar_foto(foto, Imovel, 'foto_principal')
+            # Sem save(): o link normalmente calculado ali é preenchido aqui
+            imovel.whatsapp_link = imovel.get_whatsapp_link()
+            imoveis.append(imovel)
+
+        pendentes = []  # (instância, campo da foto, imóvel) que precisam de variantes
+        if connection.features.can_return_rows_from_bulk_insert:
+            Imovel.objects.bulk_create(imoveis)
+            pendentes.extend((imovel, 'foto_principal', imovel) for imovel in imoveis)
+        else:
+            # Sem RETURNING no INSERT em lote não há como saber as pks; o
+            # save() já agenda as variantes da foto principal pelos signals
+            for imovel in imoveis:
+                imovel.save()
+
+        imagens = [
+            ImagemImovel(imovel=imovel, imagem=self._salvar_foto(nome, ImagemImovel, 'imagem'), ordem=ordem)
+            for imovel, galeria in zip(imoveis, galerias)
+            for ordem, nome in enumerate(galeria)
+        ]
+        ImagemImovel.objects.bulk_create(imagens)
+        pendentes.extend((imagem, 'imagem', imagem.imovel) for imagem in imagens)
+
+        obter_backend().indexar(imoveis)
+        enfileirar_lote('gerar_variantes', [
+            ({'modelo': instancia._meta.label, 'pk': instancia.pk, 'campo': campo}, f'imovel:{imovel.pk}')
+            for instancia, campo, imovel in pendentes
+        ], dono=self.dono)
+        return [
+            {'linha': numero, 'status': 'criado', 'id': imovel.pk}
+            for (numero, _), imovel in zip(lote, imoveis)
+        ]
@@ -0,0 +1,252 @@
+"""
+Instrumentação por request.
+
+``InstrumentacaoMiddleware`` mede, para cada request: quantidade e tempo das
+consultas SQL, tempo de serialização (serializers que usam
+``SerializacaoMedida``), tempo de renderização e tamanho da resposta. Os
+números vão para o cabeçalho ``Server-Timing`` (visível no DevTools do
+navegador) e para o registro de ``metricas``, exposto em formato Prometheus
+em ``/api/_metrics``.
+
+Consultas com o mesmo SQL (parâmetros à parte) repetidas muitas vezes no
+mesmo request são o sintoma clássico de N+1: viram um aviso no log e a
+métrica ``n_mais_1_detectados``.
+
+Sob ASGI o middleware roda sem sair do event loop. As consultas do ORM
+assíncrono acontecem em threads do asgiref, com conexões abertas ali
+mesmo; por isso não dá para instalar o wrapper por request como no WSGI.
+Toda conexão recebe, ao ser aberta, um wrapper permanente que mede as
+consultas quando a medição em andamento (ContextVar, copiada pelo
+``sync_to_async``) é de um request assíncrono.
+"""
+import logging
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from . import metricas
+
+
+logger = logging.getLogger(__name__)
+
+# Limites (em segundos) dos buckets do histograma de duração
+BUCKETS_DURACAO = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+_medicao_atual = ContextVar('medicao_atual', default=None)
+
+
+class Medicao:
+    def __init__(self, assincrona=False):
+        self.assincrona = assincrona
+        self.consultas = 0
+        self.tempo_sql = 0.0
+        self.tempos = Counter()
+        self.formatos_sql = Counter()
+
+    def registrar_consulta(self, sql, duracao):
+        self.consultas += 1
+        self.tempo_sql += duracao
+        self.formatos_sql[sql] += 1
+
+    def repetidas(self, limite):
+        """Consultas idênticas (mesmo SQL) executadas ``limite`` vezes ou mais"""
+        return [(sql, vezes) for sql, vezes in self.formatos_sql.most_common() if vezes >= limite]
+
+
+@contextmanager
+def cronometrar(etapa):
+    """Soma a duração do bloco à etapa do request em andamento (se houver)"""
+    medicao = _medicao_atual.get()
+    if medicao is None:
+        yield
+        return
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        medicao.tempos[etapa] += time.perf_counter() - inicio
+
+
+class SerializacaoMedida:
+    """
+    Mixin de serializer: conta o tempo de ``.data`` como serialização.
+    Use também ``Meta.list_serializer_class = ListSerializerMedido`` para
+    cobrir o ``many=True``.
+    """
+
+    @property
+    def data(self):
+        with cronometrar('serializacao'):
+            return super().data
+
+
+def _medir_consulta_assincrona(execute, sql, params, many, context):
+    medicao = _medicao_atual.get()
+    if medicao is None or not medicao.assincrona:
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        medicao.registrar_consulta(sql, time.perf_counter() - inicio)
+
+
+@receiver(connection_created)
+def _instrumentar_conexao(sender, connection, **kwargs):
+    # No começo da lista: os execute_wrapper() por request (WSGI) são
+    # empilhados e desempilhados no fim dela
+    if _medir_consulta_assincrona not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _medir_consulta_assincrona)
+
+
+def _rota(request):
+    correspondencia = getattr(request, 'resolver_match', None)
+    return correspondencia.view_name if correspondencia else 'nao_encontrada'
+
+
+class InstrumentacaoMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.assincrono = iscoroutinefunction(get_response)
+        if self.assincrono:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.assincrono:
+            return self.__acall__(request)
+        if not getattr(settings, 'IMOVEIS_INSTRUMENTACAO', True):
+            return self.get_response(request)
+
+        medicao = Medicao()
+        token = _medicao_atual.set(medicao)
+        inicio = time.perf_counter()
+        try:
+            with ExitStack() as pilha:
+                for alias in connections:
+                    pilha.enter_context(connections[alias].execute_wrapper(self._wrapper(medicao)))
+                response = self.get_response(request)
+        finally:
+            _medicao_atual.reset(token)
+        self._concluir(request, response, medicao, time.perf_counter() - inicio)
+        return response
+
+    async def __acall__(self, request):
+        if not getattr(settings, 'IMOVEIS_INSTRUMENTACAO', True):
+            return await self.get_response(request)
+
+        medicao = Medicao(assincrona=True)
+        token = _medicao_atual.set(medicao)
+        inicio = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _medicao_atual.reset(token)
+        self._concluir(request, response, medicao, time.perf_counter() - inicio)
+        return response
+
+    def _concluir(self, request, response, medicao, duracao):
+        if hasattr(response, '_inicio_renderizacao'):
+            medicao.tempos['renderizacao'] = time.perf_counter() - response._inicio_renderizacao
+
+        self._registrar(request, response, medicao, duracao)
+        if getattr(settings, 'IMOVEIS_SERVER_TIMING', True):
+            self._server_timing(response, medicao, duracao)
+
+    def process_template_response(self, request, response):
+        # Chamado logo antes do render() das respostas do DRF
+        response._inicio_renderizacao = time.perf_counter()
+        return response
+
+    def _wrapper(self, medicao):
+        def executar(execute, sql, params, many, context):
+            inicio = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                medicao.registrar_consulta(sql, time.perf_counter() - inicio)
+        return executar
+
+    def _registrar(self, request, response, medicao, duracao):
+        rota = _rota(request)
+        tamanho = 0 if response.streaming else len(response.content)
+
+        metricas.incrementar('http_requisicoes', rota=rota, metodo=request.method,
+                             status=str(response.status_code))
+        metricas.incrementar('http_duracao_segundos_sum', duracao, rota=rota)
+        metricas.incrementar('http_duracao_segundos_count', rota=rota)
+        for limite in BUCKETS_DURACAO:
+            if duracao <= limite:
+                metricas.incrementar('http_duracao_segundos_bucket', rota=rota, le=str(limite))
+        metricas.incrementar('http_duracao_segundos_bucket', rota=rota, le='+Inf')
+        metricas.incrementar('http_consultas_sql', medicao.consultas, rota=rota)
+        metricas.incrementar('http_sql_segundos', medicao.tempo_sql, rota=rota)
+        metricas.incrementar('http_serializacao_segundos', medicao.tempos['serializacao'], rota=rota)
+        metricas.incrementar('http_resposta_bytes', tamanho, rota=rota)
+
+        limite = getattr(settings, 'IMOVEIS_N_MAIS_1_LIMITE', 10)
+        for sql, vezes in medicao.repetidas(limite):
+            metricas.incrementar('n_mais_1_detectados', rota=rota)
+            logger.warning('Possível N+1 em %s: %d consultas iguais: %s', rota, vezes, sql[:300])
+
+    def _server_timing(self, response, medicao, duracao):
+        entradas = [
+            f'db;dur={medicao.tempo_sql * 1000:.2f};desc="{medicao.consultas} consultas"',
+            f"ser;dur={medicao.tempos['serializacao'] * 1000:.2f}",
+        ]
+        if 'renderizacao' in medicao.tempos:
+            entradas.append(f"render;dur={medicao.tempos['renderizacao'] * 1000:.2f}")
+        entradas.append(f'total;dur={duracao * 1000:.2f}')
+        response['Server-Timing'] = ', '.join(entradas)
+        # Sem isso o frontend (outra origem) não enxerga os tempos
+        origens = getattr(settings, 'CORS_ALLOWED_ORIGINS', [])
+        if origens:
+            response['Timing-Allow-Origin'] = ', '.join(origens)
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _ordem_amostra(amostra):
+    """Ordena por rótulos, com os buckets do histograma em ordem crescente de ``le``"""
+    nome, rotulos, _ = amostra
+    sem_le = tuple(item for item in rotulos if item[0] != 'le')
+    le = dict(rotulos).get('le')
+    return sem_le, nome, float(le) if le is not None else 0.0
+
+
+def formato_prometheus(prefixo='imoveis'):
+    """Todos os contadores de ``metricas`` no formato texto do Prometheus"""
+    familias = {}
+    for (nome, rotulos), valor in metricas.coletar().items():
+        base = nome
+        for sufixo in ('_bucket', '_sum', '_count'):
+            if nome.endswith(sufixo):
+                base = nome[:-len(sufixo)]
+        familias.setdefault(base, []).append((nome, rotulos, valor))
+
+    linhas = []
+    for base in sorted(familias):
+        amostras = sorted(familias[base], key=_ordem_amostra)
+        histograma = any(nome.endswith('_bucket') for nome, _, _ in amostras)
+        if histograma:
+            linhas.append(f'# TYPE {prefixo}_{base} histogram')
+        else:
+            linhas.append(f'# TYPE {prefixo}_{base}_total counter')
+        for nome, rotulos, valor in amostras:
+            nome_final = f'{prefixo}_{nome}' if histograma else f'{prefixo}_{nome}_total'
+            texto_rotulos = ','.join(f'{chave}="{_escapar(rotulo)}"' for chave, rotulo in rotulos)
+            if float(valor).is_integer():
+                valor = int(valor)
+            linhas.append(f'{nome_final}{{{texto_rotulos}}} {valor}' if texto_rotulos else f'{nome_final} {valor}')
+    return '\n'.join(linhas) + '\n'
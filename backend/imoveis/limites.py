@@ -0,0 +1,245 @@
+"""
+Limite de requisições por balde de fichas (token bucket).
+
+Cada chave (um IP ou um usuário, dentro de um escopo) tem um balde de até
+N fichas, reabastecido continuamente à taxa do escopo: com "300/min" cabem
+300 requests de uma vez e depois 5 por segundo. Cada request gasta uma
+ficha; com o balde vazio a API responde 429 com Retry-After. O estado de
+uma chave são dois números (fichas e horário), e não a lista de horários
+da janela que o throttle padrão do DRF guarda no cache.
+
+Escopos (``DEFAULT_THROTTLE_RATES`` do REST_FRAMEWORK, no formato do DRF):
+
+* ``anonimo``: por IP, em toda a API, para quem não está autenticado;
+* ``usuario``: por usuário autenticado (token ou sessão);
+* ``login``: por IP, no login e no cadastro (força bruta de senhas).
+
+Armazenamento (``IMOVEIS_LIMITES_ARMAZENAMENTO``):
+
+* ``'memoria'``: dicionário do processo. De tempos em tempos descarta os
+  baldes que já teriam se enchido de novo (um balde cheio é o mesmo que
+  nenhum), então só ocupam memória as chaves ativas há pouco;
+* ``'sqlite'``: arquivo SQLite (``IMOVEIS_LIMITES_ARQUIVO``) compartilhado
+  pelos processos da máquina, com a mesma limpeza.
+"""
+import os
+import sqlite3
+import threading
+import time
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+from . import metricas
+
+
+# Segundos entre limpezas dos baldes cheios
+INTERVALO_COMPACTACAO = 60
+
+PERIODOS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+_taxas = {}
+
+
+def ler_taxa(texto):
+    """'300/min' -> (capacidade 300, 5.0 fichas por segundo); None sem limite"""
+    if texto is None:
+        return None
+    if texto not in _taxas:
+        quantidade, periodo = texto.split('/')
+        capacidade = int(quantidade)
+        _taxas[texto] = (capacidade, capacidade / PERIODOS[periodo[0]])
+    return _taxas[texto]
+
+
+def gastar(fichas, atualizado, capacidade, taxa, agora):
+    """
+    Reabastece o balde até ``agora`` e tenta gastar uma ficha.
+    ``fichas`` None é um balde novo (cheio).
+
+    Retorna (fichas restantes, segundos de espera, quando estará cheio):
+    espera 0 se a ficha foi gasta.
+    """
+    if fichas is None:
+        fichas = capacidade
+    else:
+        fichas = min(capacidade, fichas + (agora - atualizado) * taxa)
+    if fichas >= 1:
+        fichas -= 1
+        espera = 0.0
+    else:
+        espera = (1 - fichas) / taxa
+    return fichas, espera, agora + (capacidade - fichas) / taxa
+
+
+class ArmazenamentoMemoria:
+    """Baldes no próprio processo (padrão)"""
+
+    def __init__(self):
+        self._baldes = {}  # chave -> (fichas, atualizado, cheio_em)
+        self._lock = threading.Lock()
+        self._proxima_compactacao = time.monotonic() + INTERVALO_COMPACTACAO
+
+    def consumir(self, chave, capacidade, taxa):
+        """Segundos de espera (0 se o request pode passar)"""
+        agora = time.monotonic()
+        with self._lock:
+            balde = self._baldes.get(chave)
+            if balde is None:
+                fichas, espera, cheio_em = gastar(None, agora, capacidade, taxa, agora)
+            else:
+                fichas, espera, cheio_em = gastar(balde[0], balde[1], capacidade, taxa, agora)
+            self._baldes[chave] = (fichas, agora, cheio_em)
+            if agora >= self._proxima_compactacao:
+                self._compactar(agora)
+        return espera
+
+    def _compactar(self, agora):
+        self._baldes = {chave: balde for chave, balde in self._baldes.items() if balde[2] > agora}
+        self._proxima_compactacao = agora + INTERVALO_COMPACTACAO
+
+    def limpar(self):
+        with self._lock:
+            self._baldes.clear()
+
+    def __len__(self):
+        return len(self._baldes)
+
+
+class ArmazenamentoSQLite:
+    """
+    Baldes num arquivo SQLite, para vários processos na mesma máquina.
+    Cada consumo é uma transação ``BEGIN IMMEDIATE`` (leitura e gravação do
+    balde sem outro processo no meio), com uma conexão por thread.
+    """
+
+    def __init__(self, caminho):
+        self.caminho = str(caminho)
+        self._local = threading.local()
+        self._proxima_compactacao = time.time() + INTERVALO_COMPACTACAO
+
+    def _conexao(self):
+        conexao = getattr(self._local, 'conexao', None)
+        if conexao is None:
+            pasta = os.path.dirname(self.caminho)
+            if pasta:
+                os.makedirs(pasta, exist_ok=True)
+            conexao = sqlite3.connect(self.caminho, timeout=5, isolation_level=None,
+                                      check_same_thread=False)
+            conexao.execute('PRAGMA journal_mode=WAL')
+            # Perder os baldes numa queda do sistema não tem importância
+            conexao.execute('PRAGMA synchronous=OFF')
+            conexao.execute(
+                'CREATE TABLE IF NOT EXISTS baldes ('
+                'chave TEXT PRIMARY KEY, fichas REAL NOT NULL, '
+                'atualizado REAL NOT NULL, cheio_em REAL NOT NULL) WITHOUT ROWID'
+            )
+            conexao.execute('CREATE INDEX IF NOT EXISTS baldes_cheio_em ON baldes (cheio_em)')
+            self._local.conexao = conexao
+        return conexao
+
+    def consumir(self, chave, capacidade, taxa):
+        # Relógio de parede: o horário gravado é lido por outros processos
+        agora = time.time()
+        conexao = self._conexao()
+        conexao.execute('BEGIN IMMEDIATE')
+        try:
+            balde = conexao.execute(
+                'SELECT fichas, atualizado FROM baldes WHERE chave = ?', (chave,)
+            ).fetchone()
+            if balde is None:
+                fichas, espera, cheio_em = gastar(None, agora, capacidade, taxa, agora)
+            else:
+                fichas, espera, cheio_em = gastar(balde[0], balde[1], capacidade, taxa, agora)
+            conexao.execute('INSERT OR REPLACE INTO baldes VALUES (?, ?, ?, ?)',
+                            (chave, fichas, agora, cheio_em))
+            if agora >= self._proxima_compactacao:
+                self._proxima_compactacao = agora + INTERVALO_COMPACTACAO
+                conexao.execute('DELETE FROM baldes WHERE cheio_em <= ?', (agora,))
+            conexao.execute('COMMIT')
+        except BaseException:
+            conexao.execute('ROLLBACK')
+            raise
+        return espera
+
+    def limpar(self):
+        self._conexao().execute('DELETE FROM baldes')
+
+    def __len__(self):
+        return self._conexao().execute('SELECT COUNT(*) FROM baldes').fetchone()[0]
+
+
+_armazenamento = None
+
+
+def obter_armazenamento():
+    """Instancia (uma vez) o armazenamento configurado"""
+    global _armazenamento
+    if _armazenamento is None:
+        if getattr(settings, 'IMOVEIS_LIMITES_ARMAZENAMENTO', 'memoria') == 'sqlite':
+            _armazenamento = ArmazenamentoSQLite(settings.IMOVEIS_LIMITES_ARQUIVO)
+        else:
+            _armazenamento = ArmazenamentoMemoria()
+    return _armazenamento
+
+
+@receiver(setting_changed)
+def _recriar_armazenamento(setting, **kwargs):
+    global _armazenamento
+    if setting in ('IMOVEIS_LIMITES_ARMAZENAMENTO', 'IMOVEIS_LIMITES_ARQUIVO'):
+        _armazenamento = None
+
+
+class LimiteBalde(BaseThrottle):
+    """Throttle do DRF por balde de fichas; a chave vem de ``identificar``"""
+    escopo = None
+
+    def identificar(self, request):
+        """Chave do cliente neste escopo (None: o limite não se aplica)"""
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        self.espera = 0.0
+        if not getattr(settings, 'IMOVEIS_LIMITES_ATIVOS', True):
+            return True
+        taxa = ler_taxa(api_settings.DEFAULT_THROTTLE_RATES.get(self.escopo))
+        identificador = self.identificar(request) if taxa else None
+        if identificador is None:
+            return True
+        capacidade, por_segundo = taxa
+        self.espera = obter_armazenamento().consumir(f'{self.escopo}:{identificador}', capacidade, por_segundo)
+        if self.espera:
+            metricas.incrementar('limites_recusados', escopo=self.escopo)
+            return False
+        return True
+
+    def wait(self):
+        return self.espera
+
+
+class LimiteAnonimo(LimiteBalde):
+    escopo = 'anonimo'
+
+    def identificar(self, request):
+        if request.user and request.user.is_authenticated:
+            return None
+        return self.get_ident(request)
+
+
+class LimiteUsuario(LimiteBalde):
+    escopo = 'usuario'
+
+    def identificar(self, request):
+        if request.user and request.user.is_authenticated:
+            return request.user.pk
+        return None
+
+
+class LimiteLogin(LimiteBalde):
+    escopo = 'login'
+
+    def identificar(self, request):
+        return self.get_ident(request)
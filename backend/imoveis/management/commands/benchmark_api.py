@@ -0,0 +1,242 @@
+import itertools
+import json
+import platform
+import random
+import subprocess
+import tempfile
+from datetime import datetime, timezone
+from io import BytesIO
+
+import django
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework.test import APIClient
+
+from imoveis.benchmark import banco_temporario, criar_imoveis_sinteticos, executar_concorrente, resumir
+from imoveis.busca import obter_backend
+from imoveis.cache_respostas import invalidar_respostas
+from imoveis.estatisticas import invalidar_estatisticas
+from imoveis.filters import ImovelFilter
+from imoveis.models import Imovel
+
+
+SENHA = 'benchmark-senha-123'
+ORDENACOES = ['preco', '-preco', 'criado_em', '-criado_em', 'visualizacoes', '-visualizacoes']
+BUSCAS = ['cozinha americana', 'garagem', 'quintal casa']
+
+
+def _jpeg(nome):
+    buffer = BytesIO()
+    Image.new('RGB', (800, 600), (90, 140, 200)).save(buffer, 'JPEG')
+    return SimpleUploadedFile(nome, buffer.getvalue(), content_type='image/jpeg')
+
+
+def _valor_filtro(nome, sorteio):
+    if nome == 'bairro':
+        return sorteio.choice(Imovel.BAIRROS_CHOICES)[0]
+    if nome == 'tipo':
+        return sorteio.choice(Imovel.TIPO_CHOICES)[0]
+    if nome == 'preco_min':
+        return sorteio.randrange(300, 1500, 50)
+    return sorteio.randrange(1500, 3000, 50)
+
+
+def _commit_atual():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark da API REST: listagem com cada combinação de filtros, busca, ordenação, '
+        'detalhe, destaques, estatísticas, login e cadastro com fotos, em catálogos sintéticos'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tamanhos', type=int, nargs='+', default=[1_000, 10_000])
+        parser.add_argument('--repeticoes', type=int, default=20, help='Requisições por cenário')
+        parser.add_argument('--concorrencia', type=int, default=1)
+        parser.add_argument('--cenarios', nargs='+', help='Só os cenários cujo nome começa com esses prefixos')
+        parser.add_argument('--frio', action='store_true',
+                            help='Limpa o cache de respostas antes de cada requisição')
+        parser.add_argument('--saida', help='Grava os resultados neste arquivo JSON')
+        parser.add_argument('--comparar', help='JSON de uma execução anterior para comparar')
+        parser.add_argument('--tolerancia', type=float, default=20.0,
+                            help='Aumento de p95 (em %%) a partir do qual o cenário é marcado como regressão')
+        parser.add_argument('--estrito', action='store_true', help='Falha se houver regressão')
+        parser.add_argument('--json', action='store_true', help='Saída em JSON')
+
+    def handle(self, *args, **options):
+        anterior = None
+        if options['comparar']:
+            with open(options['comparar'], encoding='utf-8') as arquivo:
+                anterior = json.load(arquivo)
+
+        resultados = {}
+        # Todos os requests saem do mesmo IP: o limite de requisições cortaria a rodada
+        with banco_temporario(), override_settings(
+            MEDIA_ROOT=tempfile.mkdtemp(prefix='benchmark-media-'), IMOVEIS_LIMITES_ATIVOS=False,
+        ):
+            self.dono = User.objects.create_user('benchmark', password=SENHA)
+            for tamanho in sorted(options['tamanhos']):
+                criar_imoveis_sinteticos(tamanho - Imovel.objects.count(), self.dono, semente=tamanho)
+                # bulk_create não dispara signals
+                obter_backend().reindexar()
+                invalidar_estatisticas()
+                invalidar_respostas()
+                self.ids = list(Imovel.objects.filter(ativo=True).values_list('pk', flat=True))
+
+                resultados[str(tamanho)] = {
+                    nome: self._medir(funcao, options)
+                    for nome, funcao in self._cenarios(options['cenarios'])
+                }
+
+        relatorio = {
+            'meta': {
+                'commit': _commit_atual(),
+                'data': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'banco': connection.vendor,
+                'repeticoes': options['repeticoes'],
+                'concorrencia': options['concorrencia'],
+                'frio': options['frio'],
+            },
+            'resultados': resultados,
+        }
+        if options['saida']:
+            with open(options['saida'], 'w', encoding='utf-8') as arquivo:
+                json.dump(relatorio, arquivo, indent=2, ensure_ascii=False)
+
+        regressoes = self._comparar(anterior, relatorio, options['tolerancia']) if anterior else []
+        if options['json']:
+            self.stdout.write(json.dumps(relatorio, indent=2, ensure_ascii=False))
+        else:
+            self._imprimir(relatorio, anterior)
+
+        if regressoes and options['estrito']:
+            raise CommandError(f'{len(regressoes)} cenário(s) com regressão: ' + ', '.join(regressoes))
+
+    # Cenários: (nome, funcao(cliente, sorteio) -> (resposta, status esperado))
+
+    def _cenarios(self, prefixos):
+        cenarios = []
+
+        filtros = list(ImovelFilter.base_filters)
+        for tamanho in range(len(filtros) + 1):
+            for combinacao in itertools.combinations(filtros, tamanho):
+                nome = 'listar' + ('?' + '&'.join(combinacao) if combinacao else '')
+                cenarios.append((nome, self._listar(combinacao)))
+
+        for ordenacao in ORDENACOES:
+            cenarios.append((f'listar?ordering={ordenacao}', self._listar((), ordering=ordenacao)))
+        cenarios.append(('buscar', lambda cliente, sorteio: (
+            cliente.get('/api/imoveis/', {'search': sorteio.choice(BUSCAS)}), 200
+        )))
+        cenarios.append(('detalhe', lambda cliente, sorteio: (
+            cliente.get(f'/api/imoveis/{sorteio.choice(self.ids)}/'), 200
+        )))
+        cenarios.append(('destaques', lambda cliente, sorteio: (cliente.get('/api/imoveis/destaques/'), 200)))
+        cenarios.append(('estatisticas', lambda cliente, sorteio: (
+            cliente.get('/api/imoveis/estatisticas/'), 200
+        )))
+        cenarios.append(('login', lambda cliente, sorteio: (
+            cliente.post('/api/auth/login/', {'username': 'benchmark', 'password': SENHA}, format='json'), 200
+        )))
+        cenarios.append(('cadastrar_com_fotos', self._cadastrar))
+
+        if prefixos:
+            cenarios = [(nome, funcao) for nome, funcao in cenarios if nome.startswith(tuple(prefixos))]
+        return cenarios
+
+    def _listar(self, combinacao, **fixos):
+        def funcao(cliente, sorteio):
+            parametros = {nome: _valor_filtro(nome, sorteio) for nome in combinacao}
+            parametros.update(fixos)
+            return cliente.get('/api/imoveis/', parametros), 200
+        return funcao
+
+    def _cadastrar(self, cliente, sorteio):
+        cliente.force_authenticate(self.dono)
+        resposta = cliente.post('/api/imoveis/', {
+            'titulo': f'Imóvel de benchmark {sorteio.random()}',
+            'descricao': 'Cadastrado pelo benchmark da API',
+            'preco': '950.00',
+            'bairro': Imovel.BAIRROS_CHOICES[0][0],
+            'tipo': Imovel.TIPO_CHOICES[0][0],
+            'telefone_contato': '(77) 99999-0000',
+            'foto_principal': _jpeg('principal.jpg'),
+            'imagens_upload': [_jpeg('galeria1.jpg'), _jpeg('galeria2.jpg')],
+        }, format='multipart')
+        return resposta, 201
+
+    def _medir(self, funcao, options):
+        consultas = []
+
+        def requisicao(i):
+            if options['frio']:
+                caches['respostas'].clear()
+            sorteio = random.Random(i)
+            with CaptureQueriesContext(connection) as capturadas:
+                resposta, esperado = funcao(APIClient(), sorteio)
+            consultas.append(len(capturadas))
+            return resposta.status_code == esperado
+
+        latencias, erros, duracao = executar_concorrente(
+            requisicao, options['repeticoes'], options['concorrencia']
+        )
+        resultado = resumir(latencias, duracao, erros)
+        resultado['consultas_media'] = round(sum(consultas) / len(consultas), 2) if consultas else 0
+        resultado['consultas_max'] = max(consultas, default=0)
+        return resultado
+
+    def _comparar(self, anterior, atual, tolerancia):
+        """Marca em cada resultado a variação em relação à execução anterior"""
+        regressoes = []
+        for tamanho, cenarios in atual['resultados'].items():
+            for nome, resultado in cenarios.items():
+                base = anterior.get('resultados', {}).get(tamanho, {}).get(nome)
+                if not base or not base.get('p95_ms'):
+                    continue
+                variacao = (resultado['p95_ms'] - base['p95_ms']) / base['p95_ms'] * 100
+                resultado['variacao_p95_pct'] = round(variacao, 1)
+                resultado['variacao_consultas'] = round(
+                    resultado['consultas_media'] - base.get('consultas_media', 0), 2
+                )
+                resultado['regressao'] = variacao > tolerancia or resultado['variacao_consultas'] > 0
+                if resultado['regressao']:
+                    regressoes.append(f'{tamanho}:{nome}')
+        return regressoes
+
+    def _imprimir(self, relatorio, anterior):
+        meta = relatorio['meta']
+        self.stdout.write(
+            f"commit {meta['commit'] or '?'} | {meta['banco']} | "
+            f"{meta['repeticoes']} req/cenário | concorrência {meta['concorrencia']}"
+        )
+        if anterior:
+            self.stdout.write(f"comparando com {anterior.get('meta', {}).get('commit') or '?'}")
+
+        for tamanho, cenarios in relatorio['resultados'].items():
+            self.stdout.write(self.style.MIGRATE_HEADING(f'{tamanho} imóveis'))
+            for nome, r in cenarios.items():
+                linha = (
+                    f"  {nome:38} p50={r['p50_ms']:>9}ms p95={r['p95_ms']:>9}ms "
+                    f"p99={r['p99_ms']:>9}ms {r['vazao_rps']:>7} req/s "
+                    f"consultas={r['consultas_media']}"
+                )
+                if r['erros']:
+                    linha += f' erros={r["erros"]}'
+                if 'variacao_p95_pct' in r:
+                    linha += f" Δp95={r['variacao_p95_pct']:+}%"
+                self.stdout.write(self.style.ERROR(linha) if r.get('regressao') else linha)
@@ -0,0 +1,201 @@
+import asyncio
+import json
+import random
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from io import BytesIO
+
+from django.contrib.auth.models import User
+from django.core.asgi import get_asgi_application
+from django.core.cache import cache, caches
+from django.core.management.base import BaseCommand
+from django.core.wsgi import get_wsgi_application
+from django.db import connections
+from django.test import override_settings
+from django.urls import include, path
+
+from imoveis import api_async, api_urls
+from imoveis.benchmark import banco_temporario, criar_imoveis_sinteticos, resumir
+from imoveis.models import Imovel
+from imoveis.visualizacoes import contador
+
+
+# URLconf da rodada "asgi": as leituras de imóveis nas views assíncronas,
+# como o asgi.py configura (IMOVEIS_API_ASSINCRONA)
+urlpatterns = [path('api/', include(api_async.rotas(api_urls.router) + api_urls.urlpatterns))]
+
+MODOS = {
+    # modo: (servidor, ROOT_URLCONF)
+    'wsgi': ('wsgi', 'AlugaLarCorrente.urls'),
+    'asgi_views_sincronas': ('asgi', 'AlugaLarCorrente.urls'),
+    'asgi': ('asgi', __name__),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara a vazão das leituras de imóveis (listagem, detalhe, destaques, estatísticas) '
+        'sob WSGI com um número fixo de threads e sob ASGI, com as views síncronas e com as '
+        'assíncronas, com clientes lentos simulados'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--imoveis', type=int, default=2_000, help='Tamanho do catálogo')
+        parser.add_argument('--requisicoes', type=int, default=2_000, help='Requisições por rodada')
+        parser.add_argument('--clientes', type=int, default=64, help='Requisições em andamento ao mesmo tempo')
+        parser.add_argument('--threads', type=int, default=8, help='Threads do servidor WSGI')
+        parser.add_argument('--atrasos', type=float, nargs='+', default=[0, 50],
+                            help='Tempo (ms) que o cliente leva para receber cada resposta')
+        parser.add_argument('--modos', nargs='+', choices=list(MODOS), default=list(MODOS))
+        parser.add_argument('--json', action='store_true', help='Saída em JSON')
+
+    def handle(self, *args, **options):
+        resultados = {}
+        # Todos os requests saem do mesmo IP: o limite de requisições cortaria a rodada
+        with banco_temporario(), override_settings(IMOVEIS_LIMITES_ATIVOS=False):
+            dono = User.objects.create_user('benchmark', password='benchmark-senha-123')
+            criar_imoveis_sinteticos(options['imoveis'], dono)
+            self.ids = list(Imovel.objects.filter(ativo=True).values_list('pk', flat=True))
+            connections.close_all()
+
+            for atraso in options['atrasos']:
+                for modo in options['modos']:
+                    servidor, urlconf = MODOS[modo]
+                    caches['respostas'].clear()
+                    cache.clear()
+                    with override_settings(ROOT_URLCONF=urlconf):
+                        if servidor == 'wsgi':
+                            resultado = self._wsgi(options, atraso / 1000)
+                        else:
+                            resultado = asyncio.run(self._asgi(options, atraso / 1000))
+                    contador.flush()
+                    resultados[f'{modo}@{atraso:g}ms'] = resultado
+
+        if options['json']:
+            self.stdout.write(json.dumps(resultados, indent=2))
+            return
+        for nome, resultado in resultados.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(nome))
+            for chave, valor in resultado.items():
+                self.stdout.write(f'  {chave}: {valor}')
+
+    def _alvos(self, total):
+        """(caminho, query string) de cada requisição: mistura das quatro leituras"""
+        sorteio = random.Random(42)
+        alvos = []
+        for i in range(total):
+            tipo = i % 4
+            if tipo == 0:
+                alvos.append(('/api/imoveis/', f'page={sorteio.randint(1, 5)}&ordering=preco'))
+            elif tipo == 1:
+                alvos.append((f'/api/imoveis/{sorteio.choice(self.ids)}/', ''))
+            elif tipo == 2:
+                alvos.append(('/api/imoveis/destaques/', ''))
+            else:
+                alvos.append(('/api/imoveis/estatisticas/', ''))
+        return alvos
+
+    def _wsgi(self, options, atraso):
+        """
+        Servidor com ``--threads`` threads (como o gunicorn com gthread): a
+        thread só fica livre depois que o cliente recebeu a resposta.
+        """
+        aplicacao = get_wsgi_application()
+        latencias, erros = [], 0
+
+        def atender(caminho, query):
+            environ = {
+                'REQUEST_METHOD': 'GET', 'PATH_INFO': caminho, 'QUERY_STRING': query,
+                'SERVER_NAME': 'testserver', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+                'HTTP_HOST': 'testserver', 'REMOTE_ADDR': '10.0.0.1',
+                'wsgi.version': (1, 0), 'wsgi.url_scheme': 'http', 'wsgi.input': BytesIO(),
+                'wsgi.errors': sys.stderr, 'wsgi.multithread': True, 'wsgi.multiprocess': False,
+                'wsgi.run_once': False,
+            }
+            status = []
+            corpo = aplicacao(environ, lambda linha, cabecalhos, exc_info=None: status.append(linha))
+            try:
+                for _ in corpo:
+                    pass
+                # Envio para o cliente lento: a thread fica presa no socket
+                time.sleep(atraso)
+            finally:
+                corpo.close()
+            return status[0].startswith('200')
+
+        alvos = iter(self._alvos(options['requisicoes']))
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['threads']) as executor:
+            pendentes = {}
+            for caminho, query in alvos:
+                pendentes[executor.submit(atender, caminho, query)] = time.perf_counter()
+                if len(pendentes) >= options['clientes']:
+                    break
+            while pendentes:
+                prontos, _ = wait(pendentes, return_when=FIRST_COMPLETED)
+                for futuro in prontos:
+                    enviado_em = pendentes.pop(futuro)
+                    if futuro.exception() is None and futuro.result():
+                        latencias.append(time.perf_counter() - enviado_em)
+                    else:
+                        erros += 1
+                    proximo = next(alvos, None)
+                    if proximo is not None:
+                        pendentes[executor.submit(atender, *proximo)] = time.perf_counter()
+        duracao = time.perf_counter() - inicio
+        return resumir(latencias, duracao, erros)
+
+    async def _asgi(self, options, atraso):
+        """Um event loop com ``--clientes`` requisições em andamento"""
+        aplicacao = get_asgi_application()
+        alvos = iter(self._alvos(options['requisicoes']))
+        latencias, erros = [], 0
+
+        async def requisicao(caminho, query):
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+                'method': 'GET', 'scheme': 'http', 'path': caminho, 'raw_path': caminho.encode(),
+                'query_string': query.encode(), 'root_path': '',
+                'headers': [(b'host', b'testserver')],
+                'client': ('10.0.0.1', 50000), 'server': ('testserver', 80),
+            }
+            recebido = False
+            status = None
+
+            async def receive():
+                nonlocal recebido
+                if not recebido:
+                    recebido = True
+                    return {'type': 'http.request', 'body': b'', 'more_body': False}
+                # O cliente não desconecta; o Django cancela a espera no fim
+                await asyncio.Future()
+
+            async def send(mensagem):
+                nonlocal status
+                if mensagem['type'] == 'http.response.start':
+                    status = mensagem['status']
+                elif not mensagem.get('more_body'):
+                    # Envio para o cliente lento: o event loop segue atendendo
+                    await asyncio.sleep(atraso)
+
+            await aplicacao(scope, receive, send)
+            return status == 200
+
+        async def cliente():
+            nonlocal erros
+            for caminho, query in alvos:
+                inicio = time.perf_counter()
+                try:
+                    ok = await requisicao(caminho, query)
+                except Exception:
+                    ok = False
+                if ok:
+                    latencias.append(time.perf_counter() - inicio)
+                else:
+                    erros += 1
+
+        inicio = time.perf_counter()
+        await asyncio.gather(*(cliente() for _ in range(options['clientes'])))
+        duracao = time.perf_counter() - inicio
+        return resumir(latencias, duracao, erros)
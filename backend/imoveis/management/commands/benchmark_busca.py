@@ -0,0 +1,76 @@
+import json
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+
+from imoveis import busca
+from imoveis.benchmark import banco_temporario, criar_imoveis_sinteticos, resumir
+from imoveis.models import Imovel
+
+
+CONSULTAS = ['cozinha americana', 'vermelhao', 'garagem', 'suite varanda', 'quintal casa']
+
+
+class Command(BaseCommand):
+    help = 'Compara a latência de ?search= com LIKE e com o índice FTS5 em catálogos de vários tamanhos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tamanhos', type=int, nargs='+', default=[10_000, 100_000])
+        parser.add_argument('--repeticoes', type=int, default=20)
+        parser.add_argument('--json', action='store_true', help='Saída em JSON')
+
+    def handle(self, *args, **options):
+        backends = {'like': busca.BackendLike(), 'fts5': busca.BackendFTS5()}
+        resultados = {}
+
+        # Todos os requests saem do mesmo IP: o limite de requisições cortaria a
+        # rodada. E sem o cache de respostas: as mesmas URLs se repetem, e a partir
+        # da segunda vez a medida seria a do cache, não a da busca
+        sem_cache = override_settings(
+            IMOVEIS_LIMITES_ATIVOS=False,
+            CACHES={**settings.CACHES, 'benchmark_sem_cache': {
+                'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+            }},
+            IMOVEIS_CACHE_RESPOSTAS_ALIAS='benchmark_sem_cache',
+        )
+        with banco_temporario(), sem_cache:
+            dono = User.objects.create_user('benchmark', password='benchmark')
+            cliente = Client()
+            for tamanho in sorted(options['tamanhos']):
+                faltam = tamanho - Imovel.objects.count()
+                criar_imoveis_sinteticos(faltam, dono, semente=tamanho)
+                backends['fts5'].reindexar()
+
+                resultados[tamanho] = {
+                    nome: self._medir(cliente, backend, options['repeticoes'])
+                    for nome, backend in backends.items()
+                }
+
+        busca._backend = None
+
+        if options['json']:
+            self.stdout.write(json.dumps({'cache_respostas': False, **resultados}, indent=2))
+            return
+
+        self.stdout.write('Cache de respostas desligado: cada request executa a busca.')
+        for tamanho, por_backend in resultados.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(f'{tamanho} imóveis'))
+            for nome, resultado in por_backend.items():
+                self.stdout.write(
+                    f"  {nome:5} p50={resultado['p50_ms']}ms p95={resultado['p95_ms']}ms "
+                    f"p99={resultado['p99_ms']}ms"
+                )
+
+    def _medir(self, cliente, backend, repeticoes):
+        busca._backend = backend
+        latencias = []
+        inicio_rodada = time.perf_counter()
+        for _ in range(repeticoes):
+            for consulta in CONSULTAS:
+                inicio = time.perf_counter()
+                cliente.get('/api/imoveis/', {'search': consulta})
+                latencias.append(time.perf_counter() - inicio)
+        return resumir(latencias, time.perf_counter() - inicio_rodada)
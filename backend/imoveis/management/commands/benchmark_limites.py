@@ -0,0 +1,122 @@
+import json
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.test import Client, RequestFactory, override_settings
+from rest_framework.request import Request
+from rest_framework.throttling import AnonRateThrottle
+
+from imoveis.benchmark import banco_temporario, executar_concorrente, percentil, resumir
+from imoveis.limites import ArmazenamentoMemoria, ArmazenamentoSQLite, LimiteAnonimo, ler_taxa
+
+
+class _AnonimoDRF(AnonRateThrottle):
+    """Throttle padrão do DRF (lista de horários no cache), para comparação"""
+    def get_rate(self):
+        return self.taxa
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede o custo por request do limite de requisições: throttle padrão do DRF '
+        '(cache), balde em memória e balde em SQLite; com --http, também a API inteira'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chamadas', type=int, default=20_000)
+        parser.add_argument('--chaves', type=int, default=1_000, help='IPs distintos')
+        parser.add_argument('--taxa', default='300/min')
+        parser.add_argument('--http', action='store_true',
+                            help='Compara GET /api/imoveis/estatisticas/ com e sem limite')
+        parser.add_argument('--json', action='store_true', help='Saída em JSON')
+
+    def handle(self, *args, **options):
+        pasta = tempfile.mkdtemp(prefix='benchmark-limites-')
+        try:
+            resultados = {
+                'drf_cache': self._rodada(self._drf(options['taxa']), options),
+                'balde_memoria': self._rodada(self._balde(ArmazenamentoMemoria(), options['taxa']), options),
+                'balde_sqlite': self._rodada(
+                    self._balde(ArmazenamentoSQLite(os.path.join(pasta, 'limites.sqlite3')), options['taxa']),
+                    options,
+                ),
+            }
+        finally:
+            shutil.rmtree(pasta, ignore_errors=True)
+        if options['http']:
+            resultados.update(self._http(options))
+
+        if options['json']:
+            self.stdout.write(json.dumps(resultados, indent=2))
+            return
+        for nome, resultado in resultados.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(nome))
+            for chave, valor in resultado.items():
+                self.stdout.write(f'  {chave}: {valor}')
+
+    def _requests(self, options):
+        fabrica = RequestFactory()
+        requests = []
+        for i in range(options['chaves']):
+            request = Request(fabrica.get('/api/imoveis/', REMOTE_ADDR=f'10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}'))
+            request.user = AnonymousUser()
+            requests.append(request)
+        return requests
+
+    def _drf(self, taxa):
+        cache.clear()
+        _AnonimoDRF.taxa = taxa
+        throttle = _AnonimoDRF()
+        return throttle.allow_request
+
+    def _balde(self, armazenamento, taxa):
+        throttle = LimiteAnonimo()
+        capacidade, por_segundo = ler_taxa(taxa)
+
+        def permitir(request, view):
+            # O mesmo caminho de allow_request, com o armazenamento da rodada
+            chave = f'{throttle.escopo}:{throttle.identificar(request)}'
+            return armazenamento.consumir(chave, capacidade, por_segundo) == 0
+        return permitir
+
+    def _rodada(self, permitir, options):
+        requests = self._requests(options)
+        # Metade das chamadas numa chave só (um scraper), o resto espalhado
+        alvos = [requests[0] if i % 2 else requests[i % len(requests)] for i in range(options['chamadas'])]
+        tempos, liberados = [], 0
+        inicio = time.perf_counter()
+        for request in alvos:
+            antes = time.perf_counter()
+            liberados += bool(permitir(request, None))
+            tempos.append((time.perf_counter() - antes) * 1_000_000)
+        duracao = time.perf_counter() - inicio
+        return {
+            'chamadas': len(alvos),
+            'liberadas': liberados,
+            'media_us': round(statistics.fmean(tempos), 2),
+            'p50_us': round(percentil(tempos, 50), 2),
+            'p99_us': round(percentil(tempos, 99), 2),
+            'chamadas_por_s': round(len(alvos) / duracao),
+        }
+
+    def _http(self, options):
+        resultados = {}
+        total = min(options['chamadas'], 2_000)
+        with banco_temporario():
+            for nome, ativos in (('http_sem_limite', False), ('http_com_limite', True)):
+                with override_settings(IMOVEIS_LIMITES_ATIVOS=ativos):
+                    cliente = Client()
+
+                    def requisicao(i):
+                        resposta = cliente.get('/api/imoveis/estatisticas/',
+                                               REMOTE_ADDR=f'10.0.{i // 256 % 256}.{i % 256}')
+                        return resposta.status_code == 200
+                    latencias, erros, duracao = executar_concorrente(requisicao, total, 1)
+                resultados[nome] = resumir(latencias, duracao, erros)
+        return resultados
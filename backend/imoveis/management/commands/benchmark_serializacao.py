@@ -0,0 +1,103 @@
+import json
+import time
+from io import BytesIO
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from imoveis.benchmark import percentil
+from imoveis.models import Imovel
+from imoveis.renderizadores import JSONRapidoParser, JSONRapidoRenderer
+from imoveis.serializers import ImovelListSerializer
+
+
+class ImovelListSerializerAnterior(serializers.ModelSerializer):
+    """ImovelListSerializer como era antes dos campos derivados pré-calculados"""
+    dono_nome = serializers.CharField(source='dono.username', read_only=True)
+    bairro_display = serializers.CharField(source='get_bairro_display', read_only=True)
+    tipo_display = serializers.CharField(source='get_tipo_display', read_only=True)
+    whatsapp_link = serializers.CharField(source='get_whatsapp_link', read_only=True)
+
+    class Meta:
+        model = Imovel
+        fields = [campo for campo in ImovelListSerializer.Meta.fields if campo != 'foto_variantes']
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede o tempo de serialização da listagem e de renderização/parse do JSON '
+        '(json padrão x orjson), em memória, sem banco'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--linhas', type=int, default=1000)
+        parser.add_argument('--repeticoes', type=int, default=30)
+        parser.add_argument('--json', action='store_true', help='Saída em JSON')
+
+    def handle(self, *args, **options):
+        imoveis = self._imoveis(options['linhas'])
+        serializers_medidos = {
+            'anterior': ImovelListSerializerAnterior,
+            'atual': ImovelListSerializer,
+        }
+
+        etapas = {
+            nome: (lambda classe=classe: classe(imoveis, many=True).data)
+            for nome, classe in serializers_medidos.items()
+        }
+        # Página como a da listagem, com os dados já serializados
+        pagina = {'count': len(imoveis), 'next': None, 'previous': None,
+                  'results': ImovelListSerializer(imoveis, many=True).data}
+        corpo = JSONRenderer().render(pagina)
+        etapas['render_json'] = lambda: JSONRenderer().render(pagina)
+        etapas['render_orjson'] = lambda: JSONRapidoRenderer().render(pagina)
+        etapas['parse_json'] = lambda: JSONParser().parse(BytesIO(corpo))
+        etapas['parse_orjson'] = lambda: JSONRapidoParser().parse(BytesIO(corpo))
+
+        resultados = {}
+        for nome, funcao in etapas.items():
+            tempos = []
+            for _ in range(options['repeticoes']):
+                inicio = time.perf_counter()
+                funcao()
+                tempos.append((time.perf_counter() - inicio) * 1000)
+            resultados[nome] = {
+                'linhas': len(imoveis),
+                'p50_ms': round(percentil(tempos, 50), 3),
+                'p95_ms': round(percentil(tempos, 95), 3),
+            }
+        resultados['render_orjson']['bytes_identicos'] = JSONRapidoRenderer().render(pagina) == corpo
+
+        if options['json']:
+            self.stdout.write(json.dumps(resultados, indent=2))
+            return
+        for nome, resultado in resultados.items():
+            linha = (
+                f"{nome:14} {resultado['linhas']} linhas: "
+                f"p50={resultado['p50_ms']}ms p95={resultado['p95_ms']}ms"
+            )
+            if 'bytes_identicos' in resultado:
+                linha += ' (bytes idênticos ao json)' if resultado['bytes_identicos'] else ' (SAÍDA DIFERENTE)'
+            self.stdout.write(linha)
+
+    def _imoveis(self, quantidade):
+        """Instâncias não salvas, como viriam do banco com select_related('dono')"""
+        dono = User(id=1, username='benchmark')
+        bairros = [codigo for codigo, _ in Imovel.BAIRROS_CHOICES]
+        tipos = [codigo for codigo, _ in Imovel.TIPO_CHOICES]
+        agora = timezone.now()
+        imoveis = []
+        for i in range(quantidade):
+            imovel = Imovel(
+                id=i + 1, titulo=f'Casa com quintal e garagem {i}', preco='850.00',
+                bairro=bairros[i % len(bairros)], tipo=tipos[i % len(tipos)],
+                telefone_contato='(77) 99999-0000', foto_principal=f'imoveis/{i}.jpg',
+                dono=dono, criado_em=agora,
+            )
+            imovel.whatsapp_link = imovel.get_whatsapp_link()
+            imoveis.append(imovel)
+        return imoveis
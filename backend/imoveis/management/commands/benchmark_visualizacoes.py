@@ -0,0 +1,79 @@
+import json
+import random
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db.models import Sum
+from django.test import Client, override_settings
+
+from imoveis.benchmark import (
+    banco_temporario, criar_imoveis_sinteticos, executar_concorrente, resumir
+)
+from imoveis.models import Imovel
+from imoveis.visualizacoes import contador
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede a vazão de GET /api/imoveis/{id}/ sob concorrência, gravando cada '
+        'visualização na hora (comportamento antigo) e com o buffer de visualizações'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--imoveis', type=int, default=50)
+        parser.add_argument('--requisicoes', type=int, default=2000)
+        parser.add_argument('--concorrencia', type=int, default=8)
+        parser.add_argument('--intervalo', type=float, default=1.0,
+                            help='Intervalo de flush (s) usado na rodada com buffer')
+        parser.add_argument('--json', action='store_true', help='Saída em JSON')
+
+    def handle(self, *args, **options):
+        # Todos os requests saem do mesmo IP: o limite de requisições cortaria a rodada
+        with banco_temporario(), override_settings(IMOVEIS_LIMITES_ATIVOS=False):
+            ids = self._popular(options['imoveis'])
+            resultados = {
+                'imediato': self._rodada(ids, options, intervalo=0),
+                'buffer': self._rodada(ids, options, intervalo=options['intervalo']),
+            }
+
+        if options['json']:
+            self.stdout.write(json.dumps(resultados, indent=2))
+            return
+
+        for nome, resultado in resultados.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(nome))
+            for chave, valor in resultado.items():
+                self.stdout.write(f'  {chave}: {valor}')
+
+    def _popular(self, quantidade):
+        dono = User.objects.create_user('benchmark', password='benchmark')
+        criar_imoveis_sinteticos(quantidade, dono)
+        return list(Imovel.objects.values_list('pk', flat=True))
+
+    def _rodada(self, ids, options, intervalo):
+        Imovel.objects.update(visualizacoes=0)
+        contador._intervalo = intervalo
+        sorteio = random.Random(42)
+        alvos = [sorteio.choice(ids) for _ in range(options['requisicoes'])]
+        clientes = {}
+
+        def requisicao(i):
+            cliente = clientes.setdefault(
+                i % options['concorrencia'], Client(raise_request_exception=False)
+            )
+            return cliente.get(f'/api/imoveis/{alvos[i]}/').status_code == 200
+
+        try:
+            latencias, erros, duracao = executar_concorrente(
+                requisicao, options['requisicoes'], options['concorrencia']
+            )
+            contador.flush()
+        finally:
+            contador._intervalo = None
+
+        resultado = resumir(latencias, duracao, erros)
+        # Confere se nenhum incremento se perdeu
+        resultado['visualizacoes_gravadas'] = Imovel.objects.aggregate(
+            total=Sum('visualizacoes')
+        )['total']
+        return resultado
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from imoveis.visualizacoes import contador
+
+
+class Command(BaseCommand):
+    help = (
+        'Grava no banco as visualizações acumuladas no buffer compartilhado '
+        '(IMOVEIS_VISUALIZACOES_BUFFER = "cache" com cache em arquivo, Redis etc.)'
+    )
+
+    def handle(self, *args, **options):
+        if not contador.buffer.compartilhado:
+            # Este processo acabou de começar: o buffer dele está sempre vazio
+            raise CommandError(
+                'O buffer de visualizações é local a cada processo: só o próprio servidor '
+                'grava o que acumulou (no intervalo e ao encerrar). Para usar este comando, '
+                'configure IMOVEIS_VISUALIZACOES_BUFFER = "cache" com um cache compartilhado.'
+            )
+        total = contador.flush()
+        self.stdout.write(self.style.SUCCESS(f'{total} visualização(ões) gravada(s).'))
@@ -0,0 +1,47 @@
+import json
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from imoveis.importacao import ErroImportacao, Importador, formato_do_arquivo
+
+
+class Command(BaseCommand):
+    help = 'Importa imóveis de um CSV ou JSON Lines (com o zip das fotos) para um usuário'
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo', help='CSV ou JSON Lines com um imóvel por linha')
+        parser.add_argument('--dono', required=True, help='Username do dono dos imóveis')
+        parser.add_argument('--imagens', help='Zip com as fotos citadas em foto_principal/imagens')
+        parser.add_argument('--formato', choices=['csv', 'jsonl'], help='Padrão: pela extensão do arquivo')
+        parser.add_argument('--lote', type=int, help='Linhas por bulk_create')
+        parser.add_argument('--simular', action='store_true', help='Só valida, sem gravar nada')
+        parser.add_argument('--json', action='store_true', help='Relatório completo em JSON')
+
+    def handle(self, *args, **options):
+        try:
+            dono = User.objects.get(username=options['dono'])
+        except User.DoesNotExist:
+            raise CommandError(f"Usuário não encontrado: {options['dono']}")
+
+        formato = options['formato'] or formato_do_arquivo(options['arquivo'])
+        try:
+            with open(options['arquivo'], 'rb') as arquivo:
+                importador = Importador(dono, options['imagens'], lote=options['lote'],
+                                        simular=options['simular'])
+                relatorio = importador.importar(arquivo, formato)
+        except (ErroImportacao, OSError) as erro:
+            raise CommandError(str(erro))
+
+        if options['json']:
+            self.stdout.write(json.dumps(relatorio, indent=2, ensure_ascii=False, default=str))
+            return
+        for linha in relatorio['linhas']:
+            if linha['status'] == 'erro':
+                self.stdout.write(self.style.ERROR(f"linha {linha['linha']}: {json.dumps(linha['erros'], ensure_ascii=False)}"))
+        acao = 'válido(s)' if relatorio['simulacao'] else 'criado(s)'
+        quantidade = relatorio['validos'] if relatorio['simulacao'] else relatorio['criados']
+        self.stdout.write(self.style.SUCCESS(
+            f"{quantidade} imóvel(is) {acao}, {relatorio['erros']} linha(s) com erro "
+            f"em {relatorio['duracao_s']}s."
+        ))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from imoveis.sincronizacao import limpar_removidos
+
+
+class Command(BaseCommand):
+    help = (
+        'Apaga os registros de imóveis excluídos mais antigos que '
+        'IMOVEIS_SINCRONIZACAO_RETENCAO (rodar periodicamente, ex.: cron diário)'
+    )
+
+    def handle(self, *args, **options):
+        total = limpar_removidos()
+        self.stdout.write(self.style.SUCCESS(f'{total} registro(s) de remoção apagado(s).'))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from imoveis.cache_respostas import invalidar_respostas
+from imoveis.models import Imovel
+
+
+class Command(BaseCommand):
+    help = 'Preenche o whatsapp_link dos imóveis criados antes da coluna existir'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=1000)
+        parser.add_argument(
+            '--todos', action='store_true',
+            help='Recalcula também as linhas já preenchidas'
+        )
+
+    def handle(self, *args, **options):
+        imoveis = Imovel.objects.only('id', 'titulo', 'telefone_contato').order_by('pk')
+        if not options['todos']:
+            imoveis = imoveis.filter(whatsapp_link='')
+
+        # Lotes por faixa de id: não mantém um cursor aberto enquanto atualiza a tabela
+        total = 0
+        ultimo_id = 0
+        while True:
+            lote = list(imoveis.filter(pk__gt=ultimo_id)[:options['lote']])
+            if not lote:
+                break
+            for imovel in lote:
+                imovel.whatsapp_link = imovel.get_whatsapp_link()
+            total += Imovel.objects.bulk_update(lote, ['whatsapp_link'])
+            ultimo_id = lote[-1].pk
+
+        # bulk_update não dispara signals
+        invalidar_respostas()
+        self.stdout.write(self.style.SUCCESS(f'{total} imóvel(is) atualizado(s).'))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from imoveis.tarefas import trabalhar
+
+
+class Command(BaseCommand):
+    help = 'Executa as tarefas em segundo plano pendentes (variantes de imagens etc.)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=4,
+                            help='Tarefas executadas em paralelo (o Pillow libera o GIL)')
+        parser.add_argument('--intervalo', type=float, default=2.0,
+                            help='Segundos de espera quando a fila está vazia')
+        parser.add_argument('--uma-vez', action='store_true',
+                            help='Processa um lote e sai, em vez de ficar em execução')
+
+    def handle(self, *args, **options):
+        if options['uma_vez']:
+            total = trabalhar(threads=options['threads'], uma_vez=True)
+            self.stdout.write(self.style.SUCCESS(f'{total} tarefa(s) processada(s).'))
+            return
+
+        self.stdout.write(f"Processando tarefas com {options['threads']} thread(s). Ctrl+C para sair.")
+        try:
+            trabalhar(threads=options['threads'], intervalo=options['intervalo'])
+        except KeyboardInterrupt:
+            self.stdout.write('Encerrado.')
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from imoveis.busca import obter_backend
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói o índice de busca textual dos imóveis'
+
+    def handle(self, *args, **options):
+        backend = obter_backend()
+        backend.reindexar()
+        self.stdout.write(self.style.SUCCESS(f'Índice reconstruído ({type(backend).__name__}).'))
@@ -0,0 +1,37 @@
+"""
+Registro simples de métricas do processo.
+
+Contadores em memória identificados por nome e rótulos opcionais, lidos
+por quem precisa expor ou testar os números (ex.: taxa de acerto de cache).
+"""
+import threading
+from collections import defaultdict
+
+
+_lock = threading.Lock()
+_contadores = defaultdict(float)
+
+
+def _chave(nome, rotulos):
+    return nome, tuple(sorted(rotulos.items()))
+
+
+def incrementar(nome, valor=1, **rotulos):
+    with _lock:
+        _contadores[_chave(nome, rotulos)] += valor
+
+
+def obter(nome, **rotulos):
+    with _lock:
+        return _contadores.get(_chave(nome, rotulos), 0)
+
+
+def coletar():
+    """Cópia de todos os contadores: {(nome, ((rotulo, valor), ...)): total}"""
+    with _lock:
+        return dict(_contadores)
+
+
+def zerar():
+    with _lock:
+        _contadores.clear()
@@ -0,0 +1,61 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+TABELA = 'imoveis_busca'
+
+
+def criar_indice(apps, schema_editor):
+    """Cria e popula o índice FTS5 (apenas no SQLite)"""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+
+    Imovel = apps.get_model('imoveis', 'Imovel')
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE {TABELA} USING fts5("
+        f"titulo, descricao, bairro, tokenize = 'unicode61 remove_diacritics 2')"
+    )
+
+    bairros = dict(Imovel._meta.get_field('bairro').choices)
+    linhas = [
+        (pk, titulo, descricao, bairros.get(bairro, bairro))
+        for pk, titulo, descricao, bairro in Imovel.objects.values_list(
+            'pk', 'titulo', 'descricao', 'bairro'
+        ).iterator()
+    ]
+    if linhas:
+        with schema_editor.connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {TABELA} (rowid, titulo, descricao, bairro) VALUES (%s, %s, %s, %s)',
+                linhas,
+            )
+
+
+def remover_indice(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(f'DROP TABLE IF EXISTS {TABELA}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('imoveis', '0002_imovel_visualizacoes_alter_imovel_bairro_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndiceBusca',
+            fields=[
+                ('imovel', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='indice_busca', serialize=False, to='imoveis.imovel')),
+                ('titulo', models.TextField()),
+                ('descricao', models.TextField()),
+                ('bairro', models.TextField()),
+            ],
+            options={
+                'db_table': 'imoveis_busca',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(criar_indice, remover_indice),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 6.0.1 on 2026-10-17 10:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('imoveis', '0003_indice_busca'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='imagemimovel',
+            index=models.Index(fields=['imovel', 'ordem'], name='imagem_imovel_ordem_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='imovel',
+            index=models.Index(condition=models.Q(('ativo', True)), fields=['criado_em', 'id'], name='imovel_ativo_criado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='imovel',
+            index=models.Index(condition=models.Q(('ativo', True)), fields=['bairro', 'criado_em'], name='imovel_ativo_bairro_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='imovel',
+            index=models.Index(condition=models.Q(('ativo', True)), fields=['tipo', 'criado_em'], name='imovel_ativo_tipo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='imovel',
+            index=models.Index(condition=models.Q(('ativo', True)), fields=['preco', 'id'], name='imovel_ativo_preco_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='imovel',
+            index=models.Index(condition=models.Q(('ativo', True)), fields=['visualizacoes', 'id'], name='imovel_ativo_visualiz_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='imovel',
+            index=models.Index(fields=['ativo', 'tipo', 'bairro', 'preco'], name='imovel_estatisticas_idx'),
+        ),
+    ]
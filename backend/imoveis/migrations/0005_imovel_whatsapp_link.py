@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-17 10:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('imoveis', '0004_indices_listagem'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imovel',
+            name='whatsapp_link',
+            field=models.TextField(blank=True, editable=False, verbose_name='Link do WhatsApp'),
+        ),
+    ]
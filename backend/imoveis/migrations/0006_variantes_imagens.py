@@ -0,0 +1,23 @@
+# Generated by Django 6.0.1 on 2026-10-17 10:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('imoveis', '0005_imovel_whatsapp_link'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imagemimovel',
+            name='variantes',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Variantes da Imagem'),
+        ),
+        migrations.AddField(
+            model_name='imovel',
+            name='variantes',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Variantes da Foto'),
+        ),
+    ]
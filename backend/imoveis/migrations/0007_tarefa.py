@@ -0,0 +1,40 @@
+# Generated by Django 6.0.1 on 2026-10-17 10:20
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('imoveis', '0006_variantes_imagens'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tarefa',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nome', models.CharField(max_length=100, verbose_name='Tarefa')),
+                ('parametros', models.JSONField(blank=True, default=dict, verbose_name='Parâmetros')),
+                ('referencia', models.CharField(blank=True, db_index=True, help_text='Objeto a que a tarefa se refere, ex.: imovel:12', max_length=100, verbose_name='Referência')),
+                ('status', models.CharField(choices=[('pendente', 'Pendente'), ('executando', 'Executando'), ('concluida', 'Concluída'), ('falhou', 'Falhou')], default='pendente', max_length=20, verbose_name='Status')),
+                ('tentativas', models.IntegerField(default=0, verbose_name='Tentativas')),
+                ('max_tentativas', models.IntegerField(default=3, verbose_name='Máximo de Tentativas')),
+                ('erro', models.TextField(blank=True, verbose_name='Último Erro')),
+                ('executar_apos', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Executar Após')),
+                ('criado_em', models.DateTimeField(auto_now_add=True, verbose_name='Data de Criação')),
+                ('atualizado_em', models.DateTimeField(auto_now=True, verbose_name='Última Atualização')),
+                ('dono', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='tarefas', to=settings.AUTH_USER_MODEL, verbose_name='Usuário')),
+            ],
+            options={
+                'verbose_name': 'Tarefa',
+                'verbose_name_plural': 'Tarefas',
+                'ordering': ['criado_em'],
+                'indexes': [models.Index(fields=['status', 'executar_apos'], name='tarefa_fila_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 6.0.1 on 2026-10-17 11:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('imoveis', '0007_tarefa'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImovelRemovido',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('imovel_id', models.IntegerField(verbose_name='Imóvel')),
+                ('removido_em', models.DateTimeField(auto_now_add=True, verbose_name='Removido em')),
+            ],
+            options={
+                'verbose_name': 'Imóvel Removido',
+                'verbose_name_plural': 'Imóveis Removidos',
+                'ordering': ['removido_em', 'id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='imovel',
+            index=models.Index(fields=['atualizado_em', 'id'], name='imovel_sincronizacao_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='imovelremovido',
+            index=models.Index(fields=['removido_em', 'id'], name='removido_sincronizacao_idx'),
+        ),
+    ]
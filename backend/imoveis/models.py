@@ -2,6 +2,7 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.db.models.signals import post_save
 from django.dispatch import receiver
+from django.utils import timezone
 from urllib.parse import quote
 
 
@@ -27,26 +28,66 @@ class Perfil(models.Model):
         verbose_name="Telefone/WhatsApp"
     )
     
+    # Campos comparados com os valores lidos do banco para saber se há o que gravar
+    CAMPOS_RASTREADOS = ('tipo', 'telefone')
+    
     class Meta:
         verbose_name = "Perfil"
         verbose_name_plural = "Perfis"
     
     def __str__(self):
         return f"{self.user.username} - {self.get_tipo_display()}"
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        perfil = super().from_db(db, field_names, values)
+        perfil._gravados = perfil._valores_rastreados()
+        return perfil
+    
+    def _valores_rastreados(self):
+        # Campos adiados (only/defer) ficam de fora: não foram lidos nem alterados
+        return {campo: self.__dict__[campo] for campo in self.CAMPOS_RASTREADOS if campo in self.__dict__}
+    
+    def campos_alterados(self):
+        """Campos rastreados com valor diferente do que está no banco (todos, se nunca foi salvo)"""
+        gravados = getattr(self, '_gravados', None)
+        if gravados is None:
+            return set(self.CAMPOS_RASTREADOS)
+        return {campo for campo, valor in self._valores_rastreados().items()
+                if gravados.get(campo, valor) != valor}
+    
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._gravados = self._valores_rastreados()
 
 
 @receiver(post_save, sender=User)
 def criar_perfil_usuario(sender, instance, created, **kwargs):
-    """Cria automaticamente um perfil quando um usuário é criado"""
+    """
+    Cria automaticamente um perfil quando um usuário é criado (com os
+    campos de ``instance.dados_perfil``, se houver, como no registro)
+    """
     if created:
-        Perfil.objects.create(user=instance)
+        Perfil.objects.create(user=instance, **getattr(instance, 'dados_perfil', {}))
 
 
 @receiver(post_save, sender=User)
-def salvar_perfil_usuario(sender, instance, **kwargs):
-    """Salva o perfil quando o usuário é salvo"""
-    if hasattr(instance, 'perfil'):
-        instance.perfil.save()
+def salvar_perfil_usuario(sender, instance, created=False, **kwargs):
+    """
+    Salva junto o perfil carregado no usuário, se algum campo dele mudou.
+    Salvar o usuário (last_login, senha regravada no login, nome) não
+    escreve no perfil à toa, nem o busca no banco só para isso.
+    """
+    # Recém-criado: o perfil acabou de ser inserido por criar_perfil_usuario
+    if created or not User.perfil.is_cached(instance):
+        return
+    try:
+        perfil = instance.perfil
+    except Perfil.DoesNotExist:
+        return
+    alterados = perfil.campos_alterados()
+    if alterados:
+        perfil.save(update_fields=alterados if perfil.pk else None)
 
 
 class Imovel(models.Model):
@@ -145,14 +186,84 @@ class Imovel(models.Model):
         verbose_name="Última Atualização"
     )
     
+    # Fotos redimensionadas geradas a partir de foto_principal (imoveis/imagens.py)
+    variantes = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name="Variantes da Foto"
+    )
+    
+    # Derivado de titulo/telefone_contato, recalculado em save()
+    whatsapp_link = models.TextField(
+        blank=True,
+        editable=False,
+        verbose_name="Link do WhatsApp"
+    )
+    
     class Meta:
         verbose_name = "Imóvel"
         verbose_name_plural = "Imóveis"
         ordering = ['-criado_em']
+        # Índices parciais (só imóveis ativos) casados com os filtros do
+        # ImovelFilter e com as ordenações aceitas pela listagem
+        indexes = [
+            models.Index(
+                fields=['criado_em', 'id'],
+                condition=models.Q(ativo=True),
+                name='imovel_ativo_criado_idx',
+            ),
+            models.Index(
+                fields=['bairro', 'criado_em'],
+                condition=models.Q(ativo=True),
+                name='imovel_ativo_bairro_idx',
+            ),
+            models.Index(
+                fields=['tipo', 'criado_em'],
+                condition=models.Q(ativo=True),
+                name='imovel_ativo_tipo_idx',
+            ),
+            models.Index(
+                fields=['preco', 'id'],
+                condition=models.Q(ativo=True),
+                name='imovel_ativo_preco_idx',
+            ),
+            models.Index(
+                fields=['visualizacoes', 'id'],
+                condition=models.Q(ativo=True),
+                name='imovel_ativo_visualiz_idx',
+            ),
+            # Cobre o agregado das estatísticas sem ler a tabela
+            models.Index(
+                fields=['ativo', 'tipo', 'bairro', 'preco'],
+                name='imovel_estatisticas_idx',
+            ),
+            # Sincronização incremental: o que mudou depois do cursor
+            models.Index(
+                fields=['atualizado_em', 'id'],
+                name='imovel_sincronizacao_idx',
+            ),
+        ]
+    
+    # Campos que entram no cálculo do whatsapp_link
+    CAMPOS_WHATSAPP = {'titulo', 'telefone_contato'}
     
     def __str__(self):
         return f"{self.titulo} - {self.get_bairro_display()} - R$ {self.preco}"
     
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or self.CAMPOS_WHATSAPP & set(update_fields):
+            self.whatsapp_link = self.get_whatsapp_link()
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'whatsapp_link'}
+        super().save(*args, **kwargs)
+    
+    @property
+    def whatsapp_link_atual(self):
+        """Link salvo no banco; só é calculado na hora para linhas ainda sem backfill"""
+        return self.whatsapp_link or self.get_whatsapp_link()
+    
     def get_whatsapp_link(self):
         """
         Retorna o link da API do WhatsApp com mensagem pré-formatada
@@ -201,10 +312,159 @@ class ImagemImovel(models.Model):
         verbose_name="Ordem"
     )
     
+    variantes = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name="Variantes da Imagem"
+    )
+    
     class Meta:
         verbose_name = "Imagem do Imóvel"
         verbose_name_plural = "Imagens dos Imóveis"
         ordering = ['ordem']
+        # Atende o prefetch das imagens já na ordem de exibição
+        indexes = [
+            models.Index(fields=['imovel', 'ordem'], name='imagem_imovel_ordem_idx'),
+        ]
     
     def __str__(self):
         return f"Imagem de {self.imovel.titulo}"
+
+
+class ImovelRemovido(models.Model):
+    """
+    Registro de um imóvel excluído. Sem ele a exclusão (inclusive em
+    cascata, junto com o dono) não deixaria rastro para a sincronização
+    incremental (/api/imoveis/sincronizar/).
+    """
+    imovel_id = models.IntegerField(
+        verbose_name="Imóvel"
+    )
+    
+    removido_em = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="Removido em"
+    )
+    
+    class Meta:
+        verbose_name = "Imóvel Removido"
+        verbose_name_plural = "Imóveis Removidos"
+        ordering = ['removido_em', 'id']
+        indexes = [
+            models.Index(fields=['removido_em', 'id'], name='removido_sincronizacao_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Imóvel {self.imovel_id} removido em {self.removido_em:%d/%m/%Y %H:%M}"
+
+
+class Tarefa(models.Model):
+    """
+    Tarefa da fila de processamento em segundo plano (ver imoveis/tarefas.py)
+    """
+    STATUS_CHOICES = [
+        ('pendente', 'Pendente'),
+        ('executando', 'Executando'),
+        ('concluida', 'Concluída'),
+        ('falhou', 'Falhou'),
+    ]
+    
+    nome = models.CharField(
+        max_length=100,
+        verbose_name="Tarefa"
+    )
+    
+    parametros = models.JSONField(
+        default=dict,
+        blank=True,
+        verbose_name="Parâmetros"
+    )
+    
+    referencia = models.CharField(
+        max_length=100,
+        blank=True,
+        db_index=True,
+        verbose_name="Referência",
+        help_text="Objeto a que a tarefa se refere, ex.: imovel:12"
+    )
+    
+    dono = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='tarefas',
+        verbose_name="Usuário"
+    )
+    
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='pendente',
+        verbose_name="Status"
+    )
+    
+    tentativas = models.IntegerField(
+        default=0,
+        verbose_name="Tentativas"
+    )
+    
+    max_tentativas = models.IntegerField(
+        default=3,
+        verbose_name="Máximo de Tentativas"
+    )
+    
+    erro = models.TextField(
+        blank=True,
+        verbose_name="Último Erro"
+    )
+    
+    executar_apos = models.DateTimeField(
+        default=timezone.now,
+        verbose_name="Executar Após"
+    )
+    
+    criado_em = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="Data de Criação"
+    )
+    
+    atualizado_em = models.DateTimeField(
+        auto_now=True,
+        verbose_name="Última Atualização"
+    )
+    
+    class Meta:
+        verbose_name = "Tarefa"
+        verbose_name_plural = "Tarefas"
+        ordering = ['criado_em']
+        indexes = [
+            models.Index(fields=['status', 'executar_apos'], name='tarefa_fila_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.nome} ({self.referencia or '-'}) - {self.get_status_display()}"
+
+
+class IndiceBusca(models.Model):
+    """
+    Tabela virtual FTS5 usada pela busca textual (ver imoveis/busca.py).
+
+    Não é gerenciada pelo Django: existe apenas para permitir o JOIN com
+    Imovel; quem cria e mantém a tabela é a migração e o backend de busca.
+    """
+    imovel = models.OneToOneField(
+        Imovel,
+        on_delete=models.DO_NOTHING,
+        primary_key=True,
+        db_column='rowid',
+        related_name='indice_busca'
+    )
+    titulo = models.TextField()
+    descricao = models.TextField()
+    bairro = models.TextField()
+    
+    class Meta:
+        managed = False
+        db_table = 'imoveis_busca'
@@ -0,0 +1,134 @@
+"""
+Moldagem de querysets a partir do serializer em uso.
+
+``moldar_queryset(queryset, SerializerClass)`` percorre os campos do
+serializer e aplica só o que ele realmente vai ler:
+
+* ``select_related`` para relações para-um (``dono``, ``dono.perfil``);
+* ``Prefetch`` para relações para-muitos (``imagens``), com o queryset do
+  filho moldado pelo serializer aninhado;
+* ``only()`` com as colunas usadas em cada nível.
+
+Campos cuja fonte é uma propriedade ou método do model não dizem quais
+colunas leem; o serializer pode declará-las em ``Meta.dependencias``
+(ex.: ``{'whatsapp_link_atual': ['whatsapp_link', 'titulo', 'telefone_contato']}``).
+Sem essa declaração o nível inteiro é carregado, para nunca trocar uma
+coluna a menos por uma consulta extra por objeto.
+
+O plano de cada classe de serializer (e de cada conjunto de campos pedido
+com ``?fields=``/``?omit=``) é calculado uma vez e reaproveitado.
+"""
+import re
+from functools import lru_cache
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+
+
+DISPLAY = re.compile(r'^get_(\w+)_display$')
+
+
+class Plano:
+    def __init__(self):
+        self.select = []
+        self.prefetch = []  # (caminho, model, classe do serializer filho, campo que aponta para o pai)
+        self.campos = set()
+
+
+def _concretos(modelo, prefixo):
+    return {prefixo + campo.name for campo in modelo._meta.concrete_fields}
+
+
+def _planejar_nivel(plano, serializer, modelo, prefixo):
+    dependencias = getattr(getattr(serializer, 'Meta', None), 'dependencias', {})
+    plano.campos.add(prefixo + modelo._meta.pk.name)
+    restrito = True
+
+    for campo in serializer.fields.values():
+        if campo.write_only:
+            continue
+        if campo.source == '*':
+            restrito = False
+            continue
+
+        partes = campo.source.split('.')
+        atual, caminho = modelo, prefixo
+        for parte in partes[:-1]:
+            # Fontes pontilhadas (dono.username): cada salto é uma relação para-um
+            try:
+                relacao = atual._meta.get_field(parte)
+            except FieldDoesNotExist:
+                relacao = None
+            if relacao is None or not relacao.is_relation or relacao.many_to_many or relacao.one_to_many:
+                atual = None
+                break
+            plano.campos.add(caminho + parte)
+            if caminho + parte not in plano.select:
+                plano.select.append(caminho + parte)
+            atual, caminho = relacao.related_model, f'{caminho}{parte}__'
+        if atual is None:
+            restrito = False
+            continue
+
+        ultimo = partes[-1]
+        if ultimo in dependencias:
+            plano.campos.update(caminho + nome for nome in dependencias[ultimo])
+            continue
+
+        try:
+            definicao = atual._meta.get_field(ultimo)
+        except FieldDoesNotExist:
+            display = DISPLAY.match(ultimo)
+            if display and display.group(1) in {f.name for f in atual._meta.concrete_fields}:
+                plano.campos.add(caminho + display.group(1))
+            elif ultimo in ('pk', atual._meta.pk.attname):
+                plano.campos.add(caminho + atual._meta.pk.name)
+            else:
+                restrito = False
+            continue
+
+        if isinstance(campo, serializers.BaseSerializer):
+            filho = campo.child if isinstance(campo, serializers.ListSerializer) else campo
+            if definicao.one_to_many or definicao.many_to_many:
+                volta = definicao.field.name if definicao.one_to_many else None
+                plano.prefetch.append((caminho + ultimo, definicao.related_model, type(filho), volta))
+                continue
+            if definicao.concrete:
+                plano.campos.add(caminho + ultimo)
+            plano.select.append(caminho + ultimo)
+            _planejar_nivel(plano, filho, definicao.related_model, f'{caminho}{ultimo}__')
+        elif definicao.concrete:
+            plano.campos.add(caminho + ultimo)
+        else:
+            restrito = False
+
+    if not restrito:
+        plano.campos.update(_concretos(modelo, prefixo))
+
+
+@lru_cache(maxsize=256)
+def planejar(serializer_class, campos=None):
+    """Plano do serializer; com ``campos`` (frozenset), só desses campos"""
+    plano = Plano()
+    serializer = serializer_class() if campos is None else serializer_class(campos=campos)
+    _planejar_nivel(plano, serializer, serializer_class.Meta.model, '')
+    return plano
+
+
+def moldar_queryset(queryset, serializer_class, extras=(), campos=None):
+    """
+    Aplica ao queryset o select_related/prefetch_related/only() que o
+    serializer precisa. ``extras`` são colunas usadas fora dele (ordenação
+    do cursor, por exemplo); ``campos`` restringe aos campos pedidos pelo
+    cliente (serializers com ``CamposDinamicos``).
+    """
+    plano = planejar(serializer_class, frozenset(campos) if campos is not None else None)
+    if plano.select:
+        queryset = queryset.select_related(*plano.select)
+    for caminho, modelo, filho, volta in plano.prefetch:
+        queryset = queryset.prefetch_related(Prefetch(
+            caminho,
+            queryset=moldar_queryset(modelo._default_manager.all(), filho, extras=[volta] if volta else []),
+        ))
+    return queryset.only(*plano.campos, *extras)
@@ -0,0 +1,210 @@
+"""
+Paginação da listagem de imóveis.
+
+Por padrão continua a paginação por número de página do DRF. Com
+``?paginacao=cursor`` a listagem passa a usar keyset: a próxima página é
+buscada com ``WHERE (campo, id) > (valor, id)`` a partir do último item,
+sem OFFSET e sem COUNT(*). Numa busca sem ``?ordering=`` a chave é a
+relevância (``relevancia``, anotada pelo backend de busca), então a busca
+também pode ser percorrida por cursor. O total só é calculado se pedido com
+``?contagem=exata`` ou ``?contagem=aproximada`` (contagem em cache).
+
+``apaginar`` é a paginação por número de página com o ORM assíncrono
+(views de imoveis/api_async.py); o cursor só existe na versão síncrona.
+"""
+import base64
+import binascii
+import hashlib
+import json
+from collections import OrderedDict
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class ImovelPagination(PageNumberPagination):
+    modo_query_param = 'paginacao'
+    cursor_query_param = 'cursor'
+    contagem_query_param = 'contagem'
+
+    # Campos aceitos como chave do cursor (sempre desempatados pelo id)
+    campos_cursor = ('criado_em', 'preco', 'visualizacoes')
+    timeout_contagem = 60
+
+    def usa_cursor(self, request):
+        return (
+            request.query_params.get(self.modo_query_param) == 'cursor'
+            or self.cursor_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.modo_cursor = self.usa_cursor(request)
+        if not self.modo_cursor:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordenacao = self._ordenacao(queryset)
+        campo = self.ordenacao.lstrip('-')
+        decrescente = self.ordenacao.startswith('-')
+
+        self.count = self._contar(queryset, request)
+
+        cursor = self._decodificar(request.query_params.get(self.cursor_query_param))
+        self.voltando = bool(cursor and cursor['direcao'] == 'anterior')
+        # Voltando uma página, percorre a ordenação ao contrário e inverte no fim
+        invertido = decrescente != self.voltando
+        prefixo = '-' if invertido else ''
+        queryset = queryset.order_by(f'{prefixo}{campo}', f'{prefixo}id')
+
+        if cursor:
+            try:
+                valor = self._valor(queryset, campo, cursor['valor'])
+            except (DjangoValidationError, ValueError):
+                raise ValidationError({self.cursor_query_param: 'Cursor inválido.'})
+            operador = 'lt' if invertido else 'gt'
+            queryset = queryset.filter(
+                Q(**{f'{campo}__{operador}': valor})
+                | Q(**{campo: valor, f'id__{operador}': cursor['id']})
+            )
+
+        itens = list(queryset[:self.page_size + 1])
+        self.tem_mais = len(itens) > self.page_size
+        itens = itens[:self.page_size]
+        if self.voltando:
+            itens.reverse()
+
+        self.veio_de_cursor = cursor is not None
+        self.itens = itens
+        return itens
+
+    async def apaginar(self, queryset, request, view=None):
+        """paginate_queryset do DRF (por número de página) com COUNT e página assíncronos"""
+        self.modo_cursor = False
+        self.request = request
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        paginator = self.django_paginator_class(queryset, page_size)
+        # Paginator.count é cached_property: com o total já calculado, a
+        # validação do número da página não consulta o banco
+        paginator.__dict__['count'] = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(page_number=page_number, message=str(exc)))
+        self.page.object_list = [item async for item in self.page.object_list]
+
+        if paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+        return list(self.page)
+
+    def get_paginated_response(self, data):
+        if not self.modo_cursor:
+            return super().get_paginated_response(data)
+        return Response(OrderedDict([
+            ('count', self.count),
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_next_link(self):
+        if not self.modo_cursor:
+            return super().get_next_link()
+        if not self.itens or not (self.tem_mais or self.voltando):
+            return None
+        return self._link(self.itens[-1], 'proxima')
+
+    def get_previous_link(self):
+        if not self.modo_cursor:
+            return super().get_previous_link()
+        if not self.itens or not (self.veio_de_cursor and (self.tem_mais or not self.voltando)):
+            return None
+        return self._link(self.itens[0], 'anterior')
+
+    def _ordenacao(self, queryset):
+        """Primeiro campo da ordenação atual, desde que possa servir de chave do cursor"""
+        ordenacao = queryset.query.order_by or queryset.model._meta.ordering
+        primeiro = ordenacao[0] if ordenacao else '-criado_em'
+        if primeiro == 'relevancia' and 'relevancia' in queryset.query.annotations:
+            # Busca sem ?ordering=: páginas em ordem de relevância, desempatadas pelo id
+            return primeiro
+        if not isinstance(primeiro, str) or primeiro.lstrip('-') not in self.campos_cursor:
+            raise ValidationError({
+                self.modo_query_param: (
+                    'A paginação por cursor só aceita ordenação por: '
+                    + ', '.join(self.campos_cursor)
+                )
+            })
+        return primeiro
+
+    def _valor(self, queryset, campo, texto):
+        if campo in queryset.query.annotations:
+            # relevancia: float do JSON, sem perda (repr de ida e volta)
+            return float(texto)
+        return queryset.model._meta.get_field(campo).to_python(texto)
+
+    def _contar(self, queryset, request):
+        modo = request.query_params.get(self.contagem_query_param)
+        if modo == 'exata':
+            return queryset.count()
+        if modo == 'aproximada':
+            # Mesmos filtros = mesma contagem, independente da página
+            parametros = sorted(
+                (chave, valor) for chave, valor in request.query_params.items()
+                if chave not in (self.cursor_query_param, self.page_query_param)
+            )
+            chave = 'imoveis:contagem:' + hashlib.md5(json.dumps(parametros).encode()).hexdigest()
+            total = cache.get(chave)
+            if total is None:
+                total = queryset.count()
+                cache.set(chave, total, self.timeout_contagem)
+            return total
+        return None
+
+    def _codificar(self, item, direcao):
+        valor = getattr(item, self.ordenacao.lstrip('-'))
+        dados = {
+            'o': self.ordenacao,
+            'v': valor.isoformat() if hasattr(valor, 'isoformat') else str(valor),
+            'id': item.pk,
+            'd': direcao,
+        }
+        bruto = json.dumps(dados, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(bruto).decode().rstrip('=')
+
+    def _decodificar(self, cursor):
+        if not cursor:
+            return None
+        try:
+            bruto = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            dados = json.loads(bruto)
+            decodificado = {
+                'ordenacao': dados['o'],
+                'valor': dados['v'],
+                'id': int(dados['id']),
+                'direcao': dados['d'],
+            }
+        except (binascii.Error, ValueError, KeyError, TypeError):
+            raise ValidationError({self.cursor_query_param: 'Cursor inválido.'})
+
+        if decodificado['ordenacao'] != self.ordenacao:
+            raise ValidationError({
+                self.cursor_query_param: 'O cursor foi gerado com outra ordenação.'
+            })
+        return decodificado
+
+    def _link(self, item, direcao):
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.page_query_param)
+        url = replace_query_param(url, self.modo_query_param, 'cursor')
+        return replace_query_param(url, self.cursor_query_param, self._codificar(item, direcao))
@@ -0,0 +1,75 @@
+"""
+Renderer e parser JSON com orjson.
+
+Geram exatamente os mesmos bytes que o ``JSONRenderer`` padrão do DRF (JSON
+compacto, UTF-8 sem escapes, ``\\u2028``/``\\u2029`` escapados), só que mais
+rápido. Os tipos que o orjson não trata do mesmo jeito que o DRF (datas com
+milissegundos e ``Z``, ``Decimal``, ``timedelta``, lazy strings...) passam
+pelo ``default`` do próprio encoder do DRF.
+
+Tudo que foge do caminho comum (indentação pedida no Accept, ``UNICODE_JSON``
+ou ``COMPACT_JSON`` desligados, inteiros maiores que 64 bits, floats em notação
+científica, encoding que não é UTF-8) cai no renderer/parser padrão, então a
+saída nunca muda.
+"""
+import codecs
+import re
+from io import BytesIO
+
+import orjson
+from django.conf import settings
+from rest_framework import parsers, renderers
+from rest_framework.utils import encoders
+
+
+OPCOES = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS | orjson.OPT_NON_STR_KEYS
+
+_encoder = encoders.JSONEncoder()
+
+# Floats abaixo de 1e-4 ou a partir de 1e16 podem sair diferentes do json
+# (``0.00001`` x ``1e-05``). Na saída compacta do orjson eles sempre aparecem
+# como número (depois de ``:``, ``,`` ou ``[``) com ``e+``, ``e-`` ou
+# começando por ``0.0000``. As buscas literais custam uma fração do dumps
+# (``+`` sozinho é a mais barata); a regex, lenta em páginas grandes, só roda
+# quando alguma delas encontra algo.
+FLOAT_DIVERGENTE = re.compile(rb'(?:^|[:,\[])-?(?:[0-9.]+e|0\.0000)')
+
+
+def _float_divergente(ret):
+    suspeito = b'+' in ret or b'e-' in ret or b'.0000' in ret
+    return suspeito and FLOAT_DIVERGENTE.search(ret) is not None
+
+
+class JSONRapidoRenderer(renderers.JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if indent is not None or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=_encoder.default, option=OPCOES)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        if _float_divergente(ret):
+            return super().render(data, accepted_media_type, renderer_context)
+        if b'\xe2' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
+
+class JSONRapidoParser(parsers.JSONParser):
+    renderer_class = JSONRapidoRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if codecs.lookup(encoding).name != 'utf-8':
+            return super().parse(stream, media_type, parser_context)
+        corpo = stream.read()
+        try:
+            return orjson.loads(corpo)
+        except orjson.JSONDecodeError:
+            # O json da biblioteca padrão decide (aceita o que o DRF aceitava
+            # e gera a mesma mensagem de erro)
+            return super().parse(BytesIO(corpo), media_type, parser_context)
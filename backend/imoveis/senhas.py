@@ -0,0 +1,105 @@
+"""
+Hash de senhas: custo configurável e limite de cálculos simultâneos.
+
+O ``PBKDF2PasswordHasher`` daqui é o do Django com o número de iterações
+vindo de ``IMOVEIS_SENHA_ITERACOES`` (None = o padrão do Django). Ao subir
+o número, as senhas antigas continuam valendo e são regravadas com o custo
+novo no próximo login, sem migração. Ao baixar, nada é regravado: um hash
+mais forte que o configurado nunca vira um mais fraco.
+
+Cada hash ocupa um núcleo por centenas de milissegundos. Uma rajada de
+logins não pode ocupar todas as threads que atendem o resto da API: no
+máximo ``IMOVEIS_SENHA_CONCORRENCIA`` hashes rodam ao mesmo tempo e os
+demais esperam por uma vaga. Login e cadastro da API (dentro de
+``recusar_se_ocupado()``) esperam até ``IMOVEIS_SENHA_ESPERA`` segundos e
+desistem com ``HashOcupado`` (a API responde 503 com Retry-After); os
+outros caminhos (admin, ``set_password``, ``changepassword``) esperam o
+quanto for preciso, sem erro.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from . import metricas
+
+
+class HashOcupado(Exception):
+    """Nenhuma vaga para calcular hash de senha dentro do tempo de espera"""
+
+
+_lock = threading.Lock()
+_vagas = None
+_recusar = ContextVar('senhas_recusar_se_ocupado', default=False)
+
+
+def _semaforo():
+    global _vagas
+    with _lock:
+        if _vagas is None:
+            limite = getattr(settings, 'IMOVEIS_SENHA_CONCORRENCIA', None) or os.cpu_count() or 2
+            _vagas = threading.BoundedSemaphore(limite)
+        return _vagas
+
+
+@receiver(setting_changed)
+def _recriar_semaforo(setting, **kwargs):
+    global _vagas
+    if setting == 'IMOVEIS_SENHA_CONCORRENCIA':
+        with _lock:
+            _vagas = None
+
+
+@contextmanager
+def recusar_se_ocupado():
+    """Hashes calculados dentro do bloco desistem com HashOcupado após IMOVEIS_SENHA_ESPERA"""
+    token = _recusar.set(True)
+    try:
+        yield
+    finally:
+        _recusar.reset(token)
+
+
+@contextmanager
+def vaga_de_hash():
+    """Ocupa uma das vagas de cálculo de hash (ver recusar_se_ocupado)"""
+    vagas = _semaforo()
+    inicio = time.perf_counter()
+    if not _recusar.get():
+        vagas.acquire()
+    elif not vagas.acquire(timeout=getattr(settings, 'IMOVEIS_SENHA_ESPERA', 5)):
+        metricas.incrementar('senhas_hash_recusados')
+        raise HashOcupado()
+    espera = time.perf_counter() - inicio
+    try:
+        yield
+    finally:
+        vagas.release()
+        metricas.incrementar('senhas_hash')
+        metricas.incrementar('senhas_hash_espera_segundos', espera)
+        metricas.incrementar('senhas_hash_segundos', time.perf_counter() - inicio - espera)
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    """PBKDF2-SHA256 com ``IMOVEIS_SENHA_ITERACOES`` e no máximo N cálculos ao mesmo tempo"""
+
+    @property
+    def iterations(self):
+        return getattr(settings, 'IMOVEIS_SENHA_ITERACOES', None) or hashers.PBKDF2PasswordHasher.iterations
+
+    def must_update(self, encoded):
+        # O Django regrava qualquer hash com número diferente, inclusive maior
+        if self.decode(encoded)['iterations'] > self.iterations:
+            return False
+        return super().must_update(encoded)
+
+    def encode(self, password, salt, iterations=None):
+        # verify() e harden_runtime() também passam por aqui
+        with vaga_de_hash():
+            return super().encode(password, salt, iterations)
@@ -1,6 +1,27 @@
 from rest_framework import serializers
+from rest_framework.authtoken.models import Token
 from django.contrib.auth.models import User
-from .models import Imovel, ImagemImovel, Perfil
+from django.core.files.storage import default_storage
+from django.db import transaction
+from .models import Imovel, ImagemImovel, Perfil, Tarefa
+from .imagens import FORMATOS, VARIANTES
+from .instrumentacao import SerializacaoMedida
+
+
+class ListSerializerMedido(SerializacaoMedida, serializers.ListSerializer):
+    """ListSerializer do many=True com o tempo de serialização medido"""
+
+
+class CamposDinamicos:
+    """
+    Mixin de serializer: ``campos=`` restringe a saída a esses campos
+    (usado pelo ?fields= / ?omit= da API).
+    """
+    def __init__(self, *args, campos=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if campos is not None:
+            for nome in set(self.fields) - set(campos):
+                self.fields.pop(nome)
 
 
 class PerfilSerializer(serializers.ModelSerializer):
@@ -10,7 +31,7 @@ class PerfilSerializer(serializers.ModelSerializer):
         fields = ['tipo', 'telefone']
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SerializacaoMedida, serializers.ModelSerializer):
     """Serializer para o modelo User"""
     perfil = PerfilSerializer(read_only=True)
     
@@ -19,48 +40,110 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ['id', 'username', 'email', 'first_name', 'last_name', 'perfil']
 
 
+class DisplayField(serializers.Field):
+    """
+    Nome de exibição de um campo com choices.
+
+    Equivale a get_FOO_display(), mas usa um dicionário montado uma única
+    vez em vez de reconstruí-lo a cada linha serializada.
+    """
+    def __init__(self, choices, **kwargs):
+        self.nomes = dict(choices)
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+    
+    def to_representation(self, value):
+        return self.nomes.get(value, value)
+
+
+class VariantesField(serializers.Field):
+    """
+    URLs das versões redimensionadas de uma foto:
+    {"card": {"largura": 480, "altura": 360, "webp": url, "jpeg": url}, ...}
+    ou null enquanto ainda não foram geradas.
+    """
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+    
+    def to_representation(self, variantes):
+        request = self.context.get('request')
+        resultado = {}
+        for nome in VARIANTES:
+            dados = variantes.get(nome)
+            if not dados:
+                continue
+            item = {'largura': dados['largura'], 'altura': dados['altura']}
+            for formato in FORMATOS:
+                url = default_storage.url(dados[formato]['nome'])
+                item[formato] = request.build_absolute_uri(url) if request else url
+            resultado[nome] = item
+        return resultado or None
+
+
 class ImagemImovelSerializer(serializers.ModelSerializer):
     """Serializer para imagens adicionais do imóvel"""
+    variantes = VariantesField()
+    
     class Meta:
         model = ImagemImovel
-        fields = ['id', 'imagem', 'descricao', 'ordem']
+        fields = ['id', 'imagem', 'descricao', 'ordem', 'variantes']
 
 
-class ImovelListSerializer(serializers.ModelSerializer):
+class TarefaSerializer(SerializacaoMedida, serializers.ModelSerializer):
+    """Situação de uma tarefa em segundo plano (sem o traceback completo)"""
+    status_display = serializers.CharField(source='get_status_display', read_only=True)
+    
+    class Meta:
+        model = Tarefa
+        list_serializer_class = ListSerializerMedido
+        fields = [
+            'id', 'nome', 'referencia', 'status', 'status_display',
+            'tentativas', 'max_tentativas', 'executar_apos', 'criado_em', 'atualizado_em'
+        ]
+
+
+class ImovelListSerializer(CamposDinamicos, SerializacaoMedida, serializers.ModelSerializer):
     """Serializer simplificado para listagem de imóveis"""
     dono_nome = serializers.CharField(source='dono.username', read_only=True)
-    bairro_display = serializers.CharField(source='get_bairro_display', read_only=True)
-    tipo_display = serializers.CharField(source='get_tipo_display', read_only=True)
-    whatsapp_link = serializers.CharField(source='get_whatsapp_link', read_only=True)
+    bairro_display = DisplayField(Imovel.BAIRROS_CHOICES, source='bairro')
+    tipo_display = DisplayField(Imovel.TIPO_CHOICES, source='tipo')
+    whatsapp_link = serializers.CharField(source='whatsapp_link_atual', read_only=True)
+    foto_variantes = VariantesField(source='variantes')
     
     class Meta:
         model = Imovel
+        list_serializer_class = ListSerializerMedido
         fields = [
             'id', 'titulo', 'preco', 'bairro', 'bairro_display', 
-            'tipo', 'tipo_display', 'foto_principal', 'ativo',
+            'tipo', 'tipo_display', 'foto_principal', 'foto_variantes', 'ativo',
             'dono_nome', 'visualizacoes', 'criado_em', 'whatsapp_link'
         ]
+        # Colunas lidas por propriedades do model (ver imoveis/otimizacao.py)
+        dependencias = {'whatsapp_link_atual': ['whatsapp_link', 'titulo', 'telefone_contato']}
 
 
-class ImovelDetailSerializer(serializers.ModelSerializer):
+class ImovelDetailSerializer(CamposDinamicos, SerializacaoMedida, serializers.ModelSerializer):
     """Serializer completo para detalhes do imóvel"""
     dono = UserSerializer(read_only=True)
     imagens = ImagemImovelSerializer(many=True, read_only=True)
-    bairro_display = serializers.CharField(source='get_bairro_display', read_only=True)
-    tipo_display = serializers.CharField(source='get_tipo_display', read_only=True)
-    whatsapp_link = serializers.CharField(source='get_whatsapp_link', read_only=True)
+    bairro_display = DisplayField(Imovel.BAIRROS_CHOICES, source='bairro')
+    tipo_display = DisplayField(Imovel.TIPO_CHOICES, source='tipo')
+    whatsapp_link = serializers.CharField(source='whatsapp_link_atual', read_only=True)
+    foto_variantes = VariantesField(source='variantes')
     
     class Meta:
         model = Imovel
         fields = [
             'id', 'titulo', 'descricao', 'preco', 'bairro', 'bairro_display',
             'tipo', 'tipo_display', 'telefone_contato', 'foto_principal',
-            'ativo', 'visualizacoes', 'criado_em', 'atualizado_em',
+            'foto_variantes', 'ativo', 'visualizacoes', 'criado_em', 'atualizado_em',
             'dono', 'imagens', 'whatsapp_link'
         ]
+        dependencias = {'whatsapp_link_atual': ['whatsapp_link', 'titulo', 'telefone_contato']}
 
 
-class ImovelCreateUpdateSerializer(serializers.ModelSerializer):
+class ImovelCreateUpdateSerializer(SerializacaoMedida, serializers.ModelSerializer):
     """Serializer para criar/atualizar imóveis"""
     imagens_upload = serializers.ListField(
         child=serializers.ImageField(),
@@ -110,6 +193,23 @@ class ImovelCreateUpdateSerializer(serializers.ModelSerializer):
         return instance
 
 
+class ImovelImportacaoSerializer(serializers.ModelSerializer):
+    """
+    Uma linha da importação em lote. As fotos são nomes de arquivos do zip
+    enviado junto; quem confere se eles existem é o importador. A foto
+    principal é obrigatória, como no cadastro pela API.
+    """
+    foto_principal = serializers.CharField()
+    imagens = serializers.ListField(child=serializers.CharField(), required=False)
+    
+    class Meta:
+        model = Imovel
+        fields = [
+            'titulo', 'descricao', 'preco', 'bairro', 'tipo',
+            'telefone_contato', 'ativo', 'foto_principal', 'imagens'
+        ]
+
+
 class RegisterSerializer(serializers.ModelSerializer):
     """Serializer para registro de novos usuários"""
     password = serializers.CharField(write_only=True, required=True, style={'input_type': 'password'})
@@ -132,14 +232,19 @@ class RegisterSerializer(serializers.ModelSerializer):
     
     def create(self, validated_data):
         validated_data.pop('password2')
-        tipo = validated_data.pop('tipo')
-        telefone = validated_data.pop('telefone', '')
-        
-        user = User.objects.create_user(**validated_data)
+        password = validated_data.pop('password')
+        username = User.normalize_username(validated_data.pop('username'))
+        email = User.objects.normalize_email(validated_data.pop('email', ''))
         
-        # Atualizar perfil
-        user.perfil.tipo = tipo
-        user.perfil.telefone = telefone
-        user.perfil.save()
+        user = User(username=username, email=email, **{
+            campo: validated_data[campo] for campo in ('first_name', 'last_name') if campo in validated_data
+        })
+        # O hash (a parte cara) é calculado antes de abrir a transação
+        user.set_password(password)
+        # Lido por criar_perfil_usuario: o perfil já nasce com tipo e telefone
+        user.dados_perfil = {'tipo': validated_data['tipo'], 'telefone': validated_data.get('telefone', '')}
         
+        with transaction.atomic():
+            user.save()
+            Token.objects.create(user=user)
         return user
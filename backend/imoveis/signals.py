@@ -0,0 +1,154 @@
+"""
+Signals que mantêm estruturas derivadas de Imovel (e o cache de tokens) em sincronia.
+"""
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from .autenticacao import invalidar_token, invalidar_usuario
+from .busca import obter_backend
+from .cache_respostas import invalidar_respostas
+from .estatisticas import invalidar_estatisticas
+from .imagens import variantes_desatualizadas
+from .models import Imovel, ImagemImovel, ImovelRemovido, Perfil
+from .tarefas import enfileirar
+
+
+CAMPOS_INDEXADOS = {'titulo', 'descricao', 'bairro'}
+
+
+@receiver(post_save, sender=Imovel)
+def indexar_imovel(sender, instance, update_fields=None, **kwargs):
+    """Atualiza o índice de busca quando um campo buscável muda"""
+    if update_fields is not None and not CAMPOS_INDEXADOS & set(update_fields):
+        return
+    obter_backend().indexar([instance])
+
+
+@receiver(post_delete, sender=Imovel)
+def remover_imovel_do_indice(sender, instance, **kwargs):
+    """Remove o imóvel excluído do índice de busca"""
+    obter_backend().remover([instance.pk])
+
+
+@receiver(post_delete, sender=Imovel)
+def registrar_remocao(sender, instance, **kwargs):
+    """Deixa o registro da exclusão para a sincronização incremental"""
+    ImovelRemovido.objects.create(imovel_id=instance.pk)
+
+
+@receiver(post_save, sender=Imovel)
+@receiver(post_delete, sender=Imovel)
+def invalidar_cache_estatisticas(sender, **kwargs):
+    """Qualquer escrita em Imovel pode mudar contagens e preços"""
+    invalidar_estatisticas()
+
+
+@receiver(post_save, sender=Imovel)
+@receiver(post_delete, sender=Imovel)
+@receiver(post_save, sender=ImagemImovel)
+@receiver(post_delete, sender=ImagemImovel)
+def invalidar_cache_respostas(sender, **kwargs):
+    """Listagem, detalhe e destaques mostram dados de imóveis e imagens"""
+    invalidar_respostas()
+
+
+# Dados do dono que a API mostra junto com os imóveis (UserSerializer, dono_nome)
+CAMPOS_DONO = {
+    User: {'username', 'email', 'first_name', 'last_name'},
+    Perfil: {'tipo', 'telefone'},
+}
+
+
+def _dados_do_dono(usuario):
+    # Campos adiados (only/defer) ficam de fora, como em Perfil._valores_rastreados
+    return {campo: usuario.__dict__[campo] for campo in CAMPOS_DONO[User] if campo in usuario.__dict__}
+
+
+@receiver(post_init, sender=User)
+def guardar_dados_do_dono(sender, instance, **kwargs):
+    instance._dono_gravado = _dados_do_dono(instance)
+
+
+def _dono_mudou(sender, instance, update_fields):
+    """
+    Algum campo do dono mostrado pela API foi gravado com valor novo? Login
+    (last_login, senha regravada) e save() sem mudanças não contam.
+    """
+    campos = CAMPOS_DONO[sender]
+    if update_fields is not None:
+        campos = campos & set(update_fields)
+    if sender is Perfil:
+        return bool(campos & instance.campos_alterados())
+    gravados, atuais = instance._dono_gravado, _dados_do_dono(instance)
+    mudou = any(campo in atuais and gravados.get(campo, object()) != atuais[campo] for campo in campos)
+    gravados.update({campo: atuais[campo] for campo in campos if campo in atuais})
+    return mudou
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+@receiver(post_save, sender=Perfil)
+@receiver(post_delete, sender=Perfil)
+def atualizar_dados_do_dono(sender, instance, created=False, update_fields=None, **kwargs):
+    """
+    O detalhe traz o dono (nome, email, telefone do perfil): ele faz parte
+    dos imóveis dele, que mudam de atualizado_em (e de ETag) e voltam na
+    sincronização
+    """
+    if created:
+        # Ainda sem imóveis
+        return
+    if kwargs['signal'] is post_save and not _dono_mudou(sender, instance, update_fields):
+        return
+    dono_id = instance.user_id if sender is Perfil else instance.pk
+    Imovel.objects.filter(dono_id=dono_id).update(atualizado_em=timezone.now())
+    invalidar_respostas()
+
+
+def _enfileirar_variantes(instancia, campo, imovel):
+    if not variantes_desatualizadas(instancia, campo):
+        return
+    enfileirar(
+        'gerar_variantes',
+        {'modelo': instancia._meta.label, 'pk': instancia.pk, 'campo': campo},
+        referencia=f'imovel:{imovel.pk}',
+        dono=imovel.dono,
+        unica=True,
+    )
+
+
+@receiver(post_save, sender=ImagemImovel)
+@receiver(post_delete, sender=ImagemImovel)
+def marcar_imovel_atualizado(sender, instance, **kwargs):
+    """A galeria faz parte do imóvel: muda o atualizado_em (e o ETag) dele"""
+    Imovel.objects.filter(pk=instance.imovel_id).update(atualizado_em=timezone.now())
+
+
+@receiver(post_save, sender=Imovel)
+def gerar_variantes_foto_principal(sender, instance, raw=False, **kwargs):
+    """Agenda as versões redimensionadas quando a foto principal muda"""
+    if not raw:
+        _enfileirar_variantes(instance, 'foto_principal', instance)
+
+
+@receiver(post_save, sender=ImagemImovel)
+def gerar_variantes_imagem(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _enfileirar_variantes(instance, 'imagem', instance.imovel)
+
+
+@receiver(post_delete, sender=Token)
+def invalidar_token_em_cache(sender, instance, **kwargs):
+    """Logout (ou token excluído): o token deixa de valer na hora"""
+    invalidar_token(instance.key)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+@receiver(post_save, sender=Perfil)
+def invalidar_usuario_em_cache(sender, instance, **kwargs):
+    """Usuário desativado ou com dados/perfil alterados não pode vir do cache"""
+    invalidar_usuario(instance.user_id if sender is Perfil else instance.pk)
@@ -0,0 +1,117 @@
+"""
+Sincronização incremental do catálogo (/api/imoveis/sincronizar/).
+
+O cliente guarda o cursor ``proximo`` de cada resposta e o devolve em
+``?desde=``; recebe só o que mudou depois dele, então o custo é
+proporcional às mudanças e não ao tamanho do catálogo. Sem ``?desde=`` a
+primeira rodada percorre o catálogo inteiro pelo mesmo caminho.
+
+Há duas fontes, cada uma com sua posição dentro do cursor:
+
+* ``Imovel`` por ``(atualizado_em, id)``: criados, alterados e desativados;
+* ``ImovelRemovido`` por ``(removido_em, id)``: exclusões.
+
+O ``atualizado_em`` é gravado no save(), antes do commit; uma transação
+mais lenta pode ficar visível depois de outra mais nova. Por isso só entra
+o que tem mais de ``IMOVEIS_SINCRONIZACAO_ATRASO`` segundos, para o cursor
+não passar por cima de uma linha que ainda vai aparecer.
+
+Os registros de remoção só ficam guardados por
+``IMOVEIS_SINCRONIZACAO_RETENCAO`` dias (``manage.py limpar_remocoes``
+apaga os mais antigos). O cursor leva também ``visto_ate``: até quando o
+cliente já recebeu tudo. Se isso é mais antigo que a retenção, alguma
+exclusão pode ter sido apagada antes de chegar a ele, e o cliente precisa
+refazer a sincronização do zero (a view responde 410).
+"""
+import base64
+import binascii
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+
+from .models import ImovelRemovido
+
+
+FONTES = ('imoveis', 'removidos')
+
+
+def ler_cursor(texto):
+    """
+    {'imoveis': (data, id) ou None, 'removidos': (data, id) ou None,
+    'visto_ate': data ou None}
+    """
+    posicoes = dict.fromkeys(FONTES + ('visto_ate',))
+    if not texto:
+        return posicoes
+    try:
+        dados = json.loads(base64.urlsafe_b64decode(texto + '=' * (-len(texto) % 4)))
+        if dados.get('visto_ate'):
+            posicoes['visto_ate'] = parse_datetime(dados['visto_ate'])
+            if posicoes['visto_ate'] is None:
+                raise ValueError(dados['visto_ate'])
+        for fonte in FONTES:
+            if dados.get(fonte):
+                data, pk = dados[fonte]
+                data = parse_datetime(data)
+                if data is None:
+                    raise ValueError(data)
+                posicoes[fonte] = (data, int(pk))
+    except (binascii.Error, ValueError, TypeError, AttributeError):
+        raise ValidationError({'desde': ['Cursor inválido.']})
+    return posicoes
+
+
+def gravar_cursor(posicoes):
+    dados = {
+        fonte: [posicoes[fonte][0].isoformat(), posicoes[fonte][1]] if posicoes[fonte] else None
+        for fonte in FONTES
+    }
+    dados['visto_ate'] = posicoes['visto_ate'].isoformat() if posicoes['visto_ate'] else None
+    bruto = json.dumps(dados, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(bruto).decode().rstrip('=')
+
+
+def retencao():
+    return timedelta(days=getattr(settings, 'IMOVEIS_SINCRONIZACAO_RETENCAO', 30))
+
+
+def limite_visivel():
+    """Mudanças até aqui já podem entrar (ver IMOVEIS_SINCRONIZACAO_ATRASO)"""
+    return timezone.now() - timedelta(seconds=getattr(settings, 'IMOVEIS_SINCRONIZACAO_ATRASO', 2))
+
+
+def expirado(posicoes):
+    """O cliente pode ter perdido exclusões já apagadas? (cursor sem visto_ate também)"""
+    visto_ate = posicoes['visto_ate']
+    return visto_ate is None or visto_ate < timezone.now() - retencao()
+
+
+def limpar_removidos():
+    """Apaga os registros de remoção mais antigos que a retenção. Retorna quantos."""
+    apagados, _ = ImovelRemovido.objects.filter(removido_em__lt=timezone.now() - retencao()).delete()
+    return apagados
+
+
+def depois_de(queryset, campo, posicao):
+    """Linhas depois de ``posicao`` na ordem (campo, id), já ordenadas"""
+    queryset = queryset.filter(**{f'{campo}__lte': limite_visivel()}).order_by(campo, 'id')
+    if posicao:
+        data, pk = posicao
+        queryset = queryset.filter(Q(**{f'{campo}__gt': data}) | Q(**{campo: data, 'id__gt': pk}))
+    return queryset
+
+
+def pagina(queryset, campo, posicao, tamanho):
+    """(itens, nova posição, tem mais)"""
+    itens = list(depois_de(queryset, campo, posicao)[:tamanho + 1])
+    tem_mais = len(itens) > tamanho
+    itens = itens[:tamanho]
+    if itens:
+        ultimo = itens[-1]
+        posicao = (getattr(ultimo, campo), ultimo.pk)
+    return itens, posicao, tem_mais
@@ -0,0 +1,265 @@
+"""
+Gerador de catálogos sintéticos para testes de escala.
+
+Cria usuários (com perfil), imóveis e imagens de galeria com cara de
+Corrente-BA: preços por tipo e bairro, descrições em português, telefones
+(77) e fotos de placeholder. Tudo é inserido com ``bulk_create`` em lotes,
+sem passar pelos signals; o que eles fariam (perfil, whatsapp_link, índice
+de busca, caches) é feito aqui mesmo, uma vez por lote ou no final.
+
+A mesma semente gera sempre os mesmos dados.
+"""
+import math
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+from io import BytesIO
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image, ImageDraw
+
+from .busca import obter_backend
+from .cache_respostas import invalidar_respostas
+from .estatisticas import invalidar_estatisticas
+from .imagens import gerar_variantes
+from .models import ImagemImovel, Imovel, Perfil
+
+
+# Aluguel mediano (R$) por tipo e fator de preço por bairro
+MEDIANAS = {'casa': 1100, 'apartamento': 950, 'kitnet': 550, 'quarto': 350}
+PESOS_TIPO = {'casa': 45, 'apartamento': 20, 'kitnet': 25, 'quarto': 10}
+FATORES_BAIRRO = {
+    'centro': 1.25, 'nova_corrente': 1.1, 'aeroporto_i': 1.0, 'aeroporto_ii': 0.95,
+    'vermelhao': 0.85, 'sincerino': 0.9, 'vila_nova': 0.9,
+}
+PESOS_BAIRRO = {
+    'centro': 25, 'nova_corrente': 15, 'aeroporto_i': 12, 'aeroporto_ii': 10,
+    'vermelhao': 14, 'sincerino': 12, 'vila_nova': 12,
+}
+
+ADJETIVOS = ['espaçosa', 'aconchegante', 'reformada', 'nova', 'ampla', 'bem localizada', 'ventilada']
+COMODIDADES = [
+    'cozinha americana', 'suíte com varanda', 'garagem coberta', 'área de serviço',
+    'quintal amplo', 'portão eletrônico', 'piso em cerâmica', 'sala conjugada',
+    'armários planejados', 'caixa d\'água independente', 'energia solar', 'forro de PVC',
+]
+REFERENCIAS = [
+    'perto da praça', 'próximo ao mercado', 'a duas quadras da feira', 'perto da escola',
+    'próximo ao hospital', 'em rua calçada', 'em rua calma', 'perto do rio Corrente',
+]
+CONDICOES = ['água inclusa', 'água e luz inclusas', 'aceita pet', 'não aceita pet', 'mobiliado', 'sem fiador']
+CORES = [(180, 120, 70), (90, 140, 200), (210, 190, 150), (120, 160, 90), (200, 90, 80), (150, 150, 160)]
+
+
+@contextmanager
+def datas_manuais(modelo, *campos):
+    """Desliga auto_now/auto_now_add para gravar datas espalhadas no tempo"""
+    originais = []
+    for nome in campos:
+        campo = modelo._meta.get_field(nome)
+        originais.append((campo, campo.auto_now, campo.auto_now_add))
+        campo.auto_now = campo.auto_now_add = False
+    try:
+        yield
+    finally:
+        for campo, auto_now, auto_now_add in originais:
+            campo.auto_now, campo.auto_now_add = auto_now, auto_now_add
+
+
+def _placeholder(sorteio, indice):
+    """JPEG 1600x1200 em degradê, leve de gerar e de comprimir"""
+    inicio, fim = sorteio.sample(CORES, 2)
+    imagem = Image.new('RGB', (1600, 1200))
+    desenho = ImageDraw.Draw(imagem)
+    for y in range(0, 1200, 8):
+        t = y / 1200
+        cor = tuple(int(a + (b - a) * t) for a, b in zip(inicio, fim))
+        desenho.rectangle([0, y, 1600, y + 8], fill=cor)
+    desenho.text((40, 40), f'Imóvel sintético {indice}', fill=(255, 255, 255))
+    buffer = BytesIO()
+    imagem.save(buffer, 'JPEG', quality=80)
+    return buffer.getvalue()
+
+
+class GeradorCatalogo:
+    def __init__(self, semente=42, prefixo='sintetico', senha='sintetico-123',
+                 quantidade_fotos=8, dias=365, saida=None):
+        self.semente = semente
+        self.sorteio = random.Random(semente)
+        self.prefixo = prefixo
+        self.senha = senha
+        self.quantidade_fotos = quantidade_fotos
+        self.dias = dias
+        self.saida = saida or (lambda mensagem: None)
+        self.agora = timezone.now()
+
+    def gerar(self, imoveis, usuarios, lote=5000, imagens_por_imovel=(0, 4)):
+        """Gera tudo e devolve as quantidades criadas"""
+        if User.objects.filter(username__startswith=f'{self.prefixo}_').exists():
+            raise ValueError(
+                f'Já existem usuários "{self.prefixo}_*"; use outro prefixo para gerar mais dados.'
+            )
+
+        self.fotos, self.galeria = self._fotos()
+        locadores = self._criar_usuarios(usuarios, lote)
+        totais = self._criar_imoveis(imoveis, locadores, lote, imagens_por_imovel)
+
+        # O que os signals fariam a cada save, feito uma vez só
+        obter_backend().reindexar()
+        invalidar_estatisticas()
+        invalidar_respostas()
+        return {'usuarios': usuarios, **totais}
+
+    def _fotos(self):
+        """Grava as fotos de placeholder (e suas variantes) uma vez e as reaproveita"""
+        if not self.quantidade_fotos:
+            return [('', {})], []
+
+        fotos, galeria = [], []
+        for indice in range(self.quantidade_fotos):
+            conteudo = _placeholder(self.sorteio, indice)
+            for pasta, destino in (('imoveis', fotos), ('imoveis/galeria', galeria)):
+                nome = default_storage.save(
+                    f'{pasta}/{self.prefixo}_{self.semente}_{indice}.jpg', ContentFile(conteudo)
+                )
+                destino.append((nome, gerar_variantes(Imovel(foto_principal=nome).foto_principal)))
+        self.saida(f'{len(fotos)} foto(s) de placeholder gravada(s)')
+        return fotos, galeria
+
+    def _telefone(self):
+        return f'(77) 9{self.sorteio.randrange(8000, 10000)}-{self.sorteio.randrange(10000):04d}'
+
+    def _criar_usuarios(self, quantidade, lote):
+        # O hash da senha é o passo mais caro de create_user: calculado uma vez
+        senha = make_password(self.senha)
+        locadores = []
+        for inicio in range(0, quantidade, lote):
+            fim = min(inicio + lote, quantidade)
+            with transaction.atomic():
+                usuarios = User.objects.bulk_create([
+                    User(
+                        username=f'{self.prefixo}_{i:07d}',
+                        email=f'{self.prefixo}_{i:07d}@exemplo.com.br',
+                        password=senha,
+                        date_joined=self.agora - timedelta(days=self.sorteio.uniform(0, self.dias)),
+                    )
+                    for i in range(inicio, fim)
+                ])
+                usuarios = self._com_pk(User, usuarios)
+                # Sem post_save: o perfil que criar_perfil_usuario criaria vem aqui
+                # Cerca de 30% são locadores; o primeiro sempre é, para haver donos
+                perfis = [
+                    Perfil(
+                        user=usuario,
+                        tipo='LOCADOR' if self.sorteio.random() < 0.3 or i == 0 else 'LOCATARIO',
+                        telefone=self._telefone(),
+                    )
+                    for i, usuario in zip(range(inicio, fim), usuarios)
+                ]
+                Perfil.objects.bulk_create(perfis)
+            locadores.extend(perfil.user_id for perfil in perfis if perfil.tipo == 'LOCADOR')
+            self.saida(f'{fim}/{quantidade} usuário(s)')
+        return locadores
+
+    def _com_pk(self, modelo, objetos):
+        """Garante as pks dos objetos (nem todo banco as devolve no bulk_create)"""
+        if all(objeto.pk for objeto in objetos):
+            return objetos
+        pks = list(modelo.objects.order_by('-pk').values_list('pk', flat=True)[:len(objetos)])
+        for objeto, pk in zip(objetos, reversed(pks)):
+            objeto.pk = pk
+        return objetos
+
+    def _imovel(self, numero, locador, pesos):
+        sorteio = self.sorteio
+        tipo = sorteio.choices(pesos['tipos'], cum_weights=pesos['tipos_acumulados'])[0]
+        bairro = sorteio.choices(pesos['bairros'], cum_weights=pesos['bairros_acumulados'])[0]
+        nome_tipo = pesos['nomes_tipo'][tipo]
+        nome_bairro = pesos['nomes_bairro'][bairro]
+
+        mediana = MEDIANAS[tipo] * FATORES_BAIRRO[bairro]
+        preco = max(150, round(sorteio.lognormvariate(math.log(mediana), 0.3) / 50) * 50)
+        quartos = 1 if tipo in ('kitnet', 'quarto') else sorteio.choice([1, 2, 2, 3, 3, 4])
+        descricao = (
+            f'{nome_tipo} com {quartos} quarto{"s" if quartos > 1 else ""}, '
+            f'{", ".join(sorteio.sample(COMODIDADES, sorteio.randint(2, 4)))}. '
+            f'Fica no {nome_bairro}, {sorteio.choice(REFERENCIAS)}. '
+            f'{sorteio.choice(CONDICOES).capitalize()}.'
+        )
+        criado_em = self.agora - timedelta(days=sorteio.uniform(0, self.dias))
+        foto, variantes = sorteio.choice(self.fotos)
+
+        imovel = Imovel(
+            titulo=f'{nome_tipo} {sorteio.choice(ADJETIVOS)} no {nome_bairro} #{numero}',
+            descricao=descricao,
+            preco=preco,
+            bairro=bairro,
+            tipo=tipo,
+            dono_id=locador,
+            telefone_contato=self._telefone(),
+            foto_principal=foto,
+            variantes=variantes,
+            ativo=sorteio.random() < 0.9,
+            # Poucos imóveis concentram a maior parte das visitas
+            visualizacoes=min(int(sorteio.paretovariate(1.5)) - 1, 50_000),
+            criado_em=criado_em,
+            atualizado_em=criado_em + timedelta(days=sorteio.uniform(0, 30)),
+        )
+        # Sem save(): o link normalmente calculado ali é preenchido aqui
+        imovel.whatsapp_link = imovel.get_whatsapp_link()
+        return imovel
+
+    def _imagem(self, imovel, ordem):
+        nome, variantes = self.sorteio.choice(self.galeria)
+        return ImagemImovel(
+            imovel_id=imovel.pk,
+            imagem=nome,
+            variantes=variantes,
+            descricao=self.sorteio.choice(['Sala', 'Quarto', 'Cozinha', 'Fachada', 'Quintal']),
+            ordem=ordem,
+        )
+
+    def _criar_imoveis(self, quantidade, locadores, lote, imagens_por_imovel):
+        tipos, pesos_tipo = zip(*PESOS_TIPO.items())
+        bairros, pesos_bairro = zip(*PESOS_BAIRRO.items())
+        pesos = {
+            'tipos': tipos, 'tipos_acumulados': list(_acumular(pesos_tipo)),
+            'bairros': bairros, 'bairros_acumulados': list(_acumular(pesos_bairro)),
+            'nomes_tipo': dict(Imovel.TIPO_CHOICES), 'nomes_bairro': dict(Imovel.BAIRROS_CHOICES),
+        }
+        # Alguns locadores têm muitos imóveis; a maioria tem um ou dois
+        pesos_locador = list(_acumular(1 / (posicao + 1) for posicao in range(len(locadores))))
+        minimo, maximo = imagens_por_imovel
+        total_imagens = 0
+
+        with datas_manuais(Imovel, 'criado_em', 'atualizado_em'):
+            for inicio in range(0, quantidade, lote):
+                fim = min(inicio + lote, quantidade)
+                donos = self.sorteio.choices(locadores, cum_weights=pesos_locador, k=fim - inicio)
+                with transaction.atomic():
+                    imoveis = self._com_pk(Imovel, Imovel.objects.bulk_create([
+                        self._imovel(numero, dono, pesos)
+                        for numero, dono in zip(range(inicio, fim), donos)
+                    ]))
+                    imagens = [
+                        self._imagem(imovel, ordem)
+                        for imovel in imoveis if self.galeria
+                        for ordem in range(self.sorteio.randint(minimo, maximo))
+                    ]
+                    ImagemImovel.objects.bulk_create(imagens)
+                total_imagens += len(imagens)
+                self.saida(f'{fim}/{quantidade} imóvel(is), {total_imagens} imagem(ns)')
+
+        return {'imoveis': quantidade, 'imagens': total_imagens}
+
+
+def _acumular(pesos):
+    total = 0
+    for peso in pesos:
+        total += peso
+        yield total
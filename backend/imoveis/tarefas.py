@@ -0,0 +1,189 @@
+"""
+Fila de tarefas em segundo plano guardada no banco (modelo Tarefa).
+
+Quem precisa tirar trabalho pesado do request chama ``enfileirar()``; o
+comando ``manage.py processar_tarefas`` reserva as tarefas pendentes e as
+executa em um pool de threads. Tarefas que falham voltam para a fila com
+espera exponencial até ``max_tentativas``.
+
+Com ``IMOVEIS_TAREFAS_SINCRONAS = True`` a tarefa é executada na hora, no
+próprio processo (útil em testes e em desenvolvimento sem worker).
+"""
+import logging
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Tarefa
+
+
+logger = logging.getLogger(__name__)
+
+_registro = {}
+
+
+class ErroPermanente(Exception):
+    """Falha que não adianta repetir (a tarefa vai direto para 'falhou')"""
+
+
+def tarefa(nome):
+    """Registra a função como executora das tarefas com esse nome"""
+    def decorador(funcao):
+        _registro[nome] = funcao
+        return funcao
+    return decorador
+
+
+def sincronas():
+    return getattr(settings, 'IMOVEIS_TAREFAS_SINCRONAS', False)
+
+
+def enfileirar(nome, parametros=None, referencia='', dono=None, unica=False, max_tentativas=3):
+    """
+    Cria uma tarefa pendente. Com ``unica=True`` não duplica uma tarefa
+    igual que ainda esteja pendente: essa vai ler os dados quando rodar.
+    Uma igual já em execução pode ter lido dados que mudaram desde então,
+    por isso não conta.
+    """
+    parametros = parametros or {}
+    if nome not in _registro:
+        raise ValueError(f'Tarefa desconhecida: {nome}')
+
+    if unica:
+        existente = Tarefa.objects.filter(
+            nome=nome, parametros=parametros, status='pendente'
+        ).first()
+        if existente:
+            return existente
+
+    nova = Tarefa.objects.create(
+        nome=nome, parametros=parametros, referencia=referencia,
+        dono=dono, max_tentativas=max_tentativas,
+    )
+    if sincronas() and reservar(nova.pk):
+        nova.refresh_from_db()
+        executar(nova)
+    return nova
+
+
+def enfileirar_lote(nome, itens, dono=None, max_tentativas=3):
+    """
+    Várias tarefas ``nome`` num só INSERT; ``itens`` são pares
+    (parametros, referencia). Sem a deduplicação de ``unica``.
+    """
+    if nome not in _registro:
+        raise ValueError(f'Tarefa desconhecida: {nome}')
+    novas = Tarefa.objects.bulk_create([
+        Tarefa(nome=nome, parametros=parametros, referencia=referencia,
+               dono=dono, max_tentativas=max_tentativas)
+        for parametros, referencia in itens
+    ])
+    if sincronas():
+        # Sem RETURNING no INSERT em lote não há pk: ficam para o worker
+        for nova in novas:
+            if nova.pk is not None and reservar(nova.pk):
+                nova.refresh_from_db()
+                executar(nova)
+    return novas
+
+
+def reservar(tarefa_id):
+    """
+    Marca a tarefa como em execução. O UPDATE condicional garante que só um
+    worker consegue reservá-la, mesmo com vários processos lendo a fila.
+    """
+    return Tarefa.objects.filter(pk=tarefa_id, status='pendente').update(
+        status='executando', tentativas=F('tentativas') + 1, atualizado_em=timezone.now()
+    ) == 1
+
+
+def executar(instancia):
+    """Executa uma tarefa já reservada e registra o resultado"""
+    funcao = _registro.get(instancia.nome)
+    try:
+        if funcao is None:
+            raise ErroPermanente(f'Tarefa desconhecida: {instancia.nome}')
+        funcao(**instancia.parametros)
+    except Exception as erro:
+        permanente = isinstance(erro, ErroPermanente)
+        if permanente or instancia.tentativas >= instancia.max_tentativas:
+            instancia.status = 'falhou'
+        else:
+            instancia.status = 'pendente'
+            espera = getattr(settings, 'IMOVEIS_TAREFAS_ESPERA_BASE', 5) * 2 ** (instancia.tentativas - 1)
+            instancia.executar_apos = timezone.now() + timedelta(seconds=espera)
+        instancia.erro = traceback.format_exc()
+        logger.warning('Tarefa %s #%s falhou: %s', instancia.nome, instancia.pk, erro)
+    else:
+        instancia.status = 'concluida'
+        instancia.erro = ''
+    instancia.save(update_fields=['status', 'erro', 'executar_apos', 'atualizado_em'])
+    return instancia.status
+
+
+def recuperar_travadas(timeout=None):
+    """Devolve à fila tarefas presas em 'executando' (worker que morreu no meio)"""
+    timeout = timeout or getattr(settings, 'IMOVEIS_TAREFAS_TIMEOUT', 600)
+    limite = timezone.now() - timedelta(seconds=timeout)
+    return Tarefa.objects.filter(status='executando', atualizado_em__lt=limite).update(
+        status='pendente', atualizado_em=timezone.now()
+    )
+
+
+def _executar_em_thread(tarefa_id):
+    try:
+        executar(Tarefa.objects.get(pk=tarefa_id))
+    finally:
+        close_old_connections()
+
+
+def processar_pendentes(limite=50, executor=None):
+    """
+    Reserva até ``limite`` tarefas vencidas e as executa (no executor, se
+    informado). Retorna quantas foram reservadas.
+    """
+    candidatas = Tarefa.objects.filter(
+        status='pendente', executar_apos__lte=timezone.now()
+    ).order_by('executar_apos').values_list('pk', flat=True)[:limite]
+
+    reservadas = [tarefa_id for tarefa_id in candidatas if reservar(tarefa_id)]
+    if executor is None:
+        for tarefa_id in reservadas:
+            executar(Tarefa.objects.get(pk=tarefa_id))
+    else:
+        for futuro in [executor.submit(_executar_em_thread, t) for t in reservadas]:
+            futuro.result()
+    return len(reservadas)
+
+
+def trabalhar(threads=4, intervalo=2.0, uma_vez=False, parar=None):
+    """Laço do worker: processa a fila até ser interrompido"""
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        while parar is None or not parar():
+            recuperar_travadas()
+            processadas = processar_pendentes(limite=threads * 4, executor=executor)
+            close_old_connections()
+            if uma_vez:
+                return processadas
+            if not processadas:
+                time.sleep(intervalo)
+
+
+@tarefa('gerar_variantes')
+def gerar_variantes(modelo, pk, campo):
+    """Gera as variantes redimensionadas de uma foto enviada"""
+    from django.apps import apps
+
+    from .imagens import atualizar_variantes
+
+    instancia = apps.get_model(modelo).objects.filter(pk=pk).first()
+    if instancia is None:
+        # Objeto excluído antes de a tarefa rodar: nada a fazer
+        return
+    atualizar_variantes(instancia, campo, repetir_transitorios=True)
@@ -1,3 +1,1928 @@
-from django.test import TestCase
+import csv
+import datetime
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, make_password
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test import AsyncClient, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path, resolve
+from django.utils import timezone
+from asgiref.sync import sync_to_async
+from django.utils.translation import gettext_lazy
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from . import api_async, api_urls, metricas, senhas, tarefas
+from .autenticacao import CacheTokens, cache_tokens, taxa_acerto as taxa_acerto_tokens
+from .busca import BackendFTS5, BackendLike, obter_backend, tokenizar
+from .cache_respostas import taxa_acerto
+from .estatisticas import calcular_estatisticas
+from .imagens import atualizar_variantes
+from .instrumentacao import InstrumentacaoMiddleware
+from .limites import ArmazenamentoMemoria, ArmazenamentoSQLite, gastar, ler_taxa, obter_armazenamento
+from .models import ImagemImovel, Imovel, ImovelRemovido, Perfil, Tarefa
+from .renderizadores import JSONRapidoParser, JSONRapidoRenderer
+from .sincronizacao import FONTES, gravar_cursor, ler_cursor
+from .sinteticos import GeradorCatalogo
+from .visualizacoes import BufferCache, BufferMemoria, ContadorVisualizacoes, contador
+
+
+# URLconf com as leituras assíncronas, como sob ASGI (ROOT_URLCONF='imoveis.tests')
+urlpatterns = [path('api/', include(api_async.rotas(api_urls.router) + api_urls.urlpatterns))]
+
+
+def setUpModule():
+    # Os testes fazem centenas de requests do mesmo IP: o limite de
+    # requisições só vale em LimitesTests, que o liga de novo. E cada
+    # create_user calcula um hash: com o custo de produção a suíte se arrasta.
+    # O contador de visualizações não grava no meio dos testes (o flush
+    # mudaria contagens e consultas); quem testa o flush chama flush()
+    configuracao = override_settings(
+        IMOVEIS_LIMITES_ATIVOS=False, IMOVEIS_SENHA_ITERACOES=1000,
+        IMOVEIS_VISUALIZACOES_INTERVALO=3600,
+    )
+    configuracao.enable()
+    contador.buffer.retirar()
+    contador._ultimo_flush = time.monotonic()
+    global _limites_desligados
+    _limites_desligados = configuracao
+
+
+def tearDownModule():
+    _limites_desligados.disable()
+    # O flush do atexit gravaria acessos dos testes no banco de desenvolvimento
+    contador.buffer.retirar()
+
+
+def gerar_jpeg(nome='foto.jpg', tamanho=(2400, 1600), exif=True):
+    """JPEG em memória, com EXIF (câmera e orientação) por padrão"""
+    imagem = Image.new('RGB', tamanho, (200, 120, 40))
+    dados_exif = Image.Exif()
+    if exif:
+        dados_exif[0x010F] = 'Camera Teste'  # Make
+        dados_exif[0x0112] = 6  # Orientation: girada 90°
+    buffer = BytesIO()
+    imagem.save(buffer, 'JPEG', exif=dados_exif.tobytes())
+    return SimpleUploadedFile(nome, buffer.getvalue(), content_type='image/jpeg')
+
+
+def criar_imovel(dono, **campos):
+    dados = {
+        'titulo': 'Casa no Centro',
+        'descricao': 'Casa ampla com quintal',
+        'preco': '800.00',
+        'bairro': 'centro',
+        'tipo': 'casa',
+        'telefone_contato': '(77) 99999-0000',
+        'foto_principal': '',
+    }
+    dados.update(campos)
+    return Imovel.objects.create(dono=dono, **dados)
+
+
+class ContadorVisualizacoesTests(TestCase):
+    def setUp(self):
+        self.dono = User.objects.create_user('dono', password='senha-segura-123')
+        self.imovel = criar_imovel(self.dono)
+        self.outro = criar_imovel(self.dono, titulo='Kitnet')
+
+    def test_registrar_nao_grava_ate_o_flush(self):
+        contador_teste = ContadorVisualizacoes(BufferMemoria(), intervalo=3600)
+        contador_teste.registrar(self.imovel.pk)
+        contador_teste.registrar(self.imovel.pk)
+
+        self.imovel.refresh_from_db()
+        self.assertEqual(self.imovel.visualizacoes, 0)
+        self.assertEqual(contador_teste.pendentes(self.imovel.pk), 2)
+
+    def test_flush_soma_ao_valor_do_banco(self):
+        contador_teste = ContadorVisualizacoes(BufferMemoria(), intervalo=3600)
+        Imovel.objects.filter(pk=self.imovel.pk).update(visualizacoes=10)
+        for _ in range(3):
+            contador_teste.registrar(self.imovel.pk)
+        contador_teste.registrar(self.outro.pk)
+
+        # Um UPDATE por quantidade distinta de acessos (2) + savepoint e release
+        with self.assertNumQueries(4):
+            self.assertEqual(contador_teste.flush(), 4)
+
+        self.imovel.refresh_from_db()
+        self.outro.refresh_from_db()
+        self.assertEqual(self.imovel.visualizacoes, 13)
+        self.assertEqual(self.outro.visualizacoes, 1)
+        self.assertEqual(contador_teste.pendentes(self.imovel.pk), 0)
+
+    def test_intervalo_zero_grava_imediatamente(self):
+        contador_teste = ContadorVisualizacoes(BufferMemoria(), intervalo=0)
+        contador_teste.registrar(self.imovel.pk)
+
+        self.imovel.refresh_from_db()
+        self.assertEqual(self.imovel.visualizacoes, 1)
+
+    def test_detalhe_exibe_visualizacoes_pendentes(self):
+        contador.buffer.retirar()
+        self.addCleanup(contador.buffer.retirar)
+
+        client = APIClient()
+        client.get(f'/api/imoveis/{self.imovel.pk}/')
+        response = client.get(f'/api/imoveis/{self.imovel.pk}/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['visualizacoes'], 2)
+        self.imovel.refresh_from_db()
+        self.assertEqual(self.imovel.visualizacoes, 0)
+
+        contador.flush()
+        self.imovel.refresh_from_db()
+        self.assertEqual(self.imovel.visualizacoes, 2)
+
+    def test_comando_so_com_buffer_compartilhado(self):
+        # Buffer em memória: o processo do comando não vê o dos servidores
+        with self.assertRaises(CommandError):
+            call_command('flush_visualizacoes', stdout=StringIO())
+
+        pasta = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, pasta, ignore_errors=True)
+        arquivo = {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': pasta}
+        with override_settings(CACHES={**settings.CACHES, 'visualizacoes': arquivo}), \
+                mock.patch.object(contador, 'buffer', BufferCache('visualizacoes')):
+            # Outro processo (o servidor) acumulou os acessos no mesmo cache
+            servidor = ContadorVisualizacoes(BufferCache('visualizacoes'), intervalo=3600)
+            servidor.registrar(self.imovel.pk, 2)
+            saida = StringIO()
+            call_command('flush_visualizacoes', stdout=saida)
+        self.assertIn('2 visualização', saida.getvalue())
+        self.imovel.refresh_from_db()
+        self.assertEqual(self.imovel.visualizacoes, 2)
+
+
+class BuscaTests(TestCase):
+    def setUp(self):
+        self.dono = User.objects.create_user('dono', password='senha-segura-123')
+        self.cozinha = criar_imovel(
+            self.dono, titulo='Apartamento com cozinha americana',
+            descricao='Dois quartos e varanda', bairro='centro',
+        )
+        self.vermelhao = criar_imovel(
+            self.dono, titulo='Casa ampla', descricao='Quintal e garagem', bairro='vermelhao',
+        )
+        self.client = APIClient()
+
+    def buscar(self, termo, **params):
+        response = self.client.get('/api/imoveis/', {'search': termo, **params})
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in response.data['results']]
+
+    def test_tokenizar_remove_acentos(self):
+        self.assertEqual(tokenizar('Vermelhão, Suíte!'), ['vermelhao', 'suite'])
+
+    def test_busca_ignora_acentos(self):
+        self.assertEqual(self.buscar('vermelhao'), [self.vermelhao.pk])
+        self.assertEqual(self.buscar('VERMELHÃO'), [self.vermelhao.pk])
+
+    def test_busca_exige_todos_os_termos_e_aceita_prefixo(self):
+        self.assertEqual(self.buscar('cozinha americ'), [self.cozinha.pk])
+        self.assertEqual(self.buscar('cozinha garagem'), [])
+
+    def test_resultados_ordenados_por_relevancia(self):
+        no_titulo = criar_imovel(self.dono, titulo='Garagem ampla', descricao='Sem detalhes')
+        self.assertEqual(self.buscar('garagem'), [no_titulo.pk, self.vermelhao.pk])
+
+    def test_ordering_explicito_tem_prioridade(self):
+        mais_caro = criar_imovel(self.dono, titulo='Garagem', descricao='', preco='2000.00')
+        self.assertEqual(
+            self.buscar('garagem', ordering='preco'), [self.vermelhao.pk, mais_caro.pk]
+        )
+
+    def test_indice_acompanha_edicao_e_exclusao(self):
+        self.cozinha.titulo = 'Kitnet mobiliada'
+        self.cozinha.save()
+        self.assertEqual(self.buscar('cozinha'), [])
+        self.assertEqual(self.buscar('mobiliada'), [self.cozinha.pk])
+
+        self.cozinha.delete()
+        self.assertEqual(self.buscar('mobiliada'), [])
+
+    def test_reindexar_reconstroi_indice(self):
+        Imovel.objects.filter(pk=self.cozinha.pk).update(titulo='Sobrado')
+        backend = BackendFTS5()
+        backend.reindexar()
+        qs = backend.filtrar(Imovel.objects.all(), 'sobrado', [])
+        self.assertEqual(list(qs.values_list('pk', flat=True)), [self.cozinha.pk])
+
+    def test_backend_like(self):
+        qs = BackendLike().filtrar(Imovel.objects.all(), 'quintal', ['titulo', 'descricao'])
+        self.assertEqual(list(qs.values_list('pk', flat=True)), [self.vermelhao.pk])
+
+
+class EstatisticasTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        metricas.zerar()
+        self.dono = User.objects.create_user('dono', password='senha-segura-123')
+        criar_imovel(self.dono, tipo='casa', bairro='centro', preco='500.00')
+        criar_imovel(self.dono, tipo='casa', bairro='vermelhao', preco='900.00')
+        criar_imovel(self.dono, tipo='kitnet', bairro='centro', preco='700.00')
+        criar_imovel(self.dono, tipo='quarto', bairro='centro', preco='1000.00')
+        criar_imovel(self.dono, tipo='casa', bairro='centro', preco='5000.00', ativo=False)
+        self.client = APIClient()
+
+    def test_calculo_em_duas_consultas(self):
+        with self.assertNumQueries(2):
+            dados = calcular_estatisticas()
+
+        self.assertEqual(dados['total'], 5)
+        self.assertEqual(dados['ativos'], 4)
+        self.assertEqual(dados['por_tipo'], {
+            'Casa': 2, 'Kitnet': 1, 'Apartamento': 0, 'Quarto': 1,
+        })
+        self.assertEqual(dados['por_bairro']['Centro'], 3)
+        self.assertEqual(dados['por_bairro']['Vermelhão'], 1)
+        self.assertEqual(dados['preco'], {
+            'minimo': '500.00', 'maximo': '1000.00', 'media': '775.00', 'mediana': '800.00',
+        })
+
+    def test_catalogo_vazio(self):
+        Imovel.objects.all().delete()
+        dados = calcular_estatisticas()
+        self.assertEqual(dados['ativos'], 0)
+        self.assertIsNone(dados['preco']['mediana'])
+
+    def test_endpoint_usa_cache_e_invalida_na_escrita(self):
+        response = self.client.get('/api/imoveis/estatisticas/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/imoveis/estatisticas/')
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(response.data['ativos'], 4)
+
+        criar_imovel(self.dono)
+        response = self.client.get('/api/imoveis/estatisticas/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['ativos'], 5)
+
+        self.assertEqual(metricas.obter('estatisticas_cache', resultado='hit'), 1)
+        self.assertEqual(metricas.obter('estatisticas_cache', resultado='miss'), 2)
+
+
+class PaginacaoCursorTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.dono = User.objects.create_user('dono', password='senha-segura-123')
+        # 30 imóveis com preços repetidos para exercitar o desempate pelo id
+        self.imoveis = [
+            criar_imovel(self.dono, titulo=f'Imóvel {i}', preco=f'{500 + (i % 5) * 100}.00')
+            for i in range(30)
+        ]
+        self.client = APIClient()
+
+    def percorrer(self, **params):
+        ids = []
+        response = self.client.get('/api/imoveis/', {'paginacao': 'cursor', **params})
+        while True:
+            self.assertEqual(response.status_code, 200)
+            ids.extend(item['id'] for item in response.data['results'])
+            if not response.data['next']:
+                return ids, response
+            response = self.client.get(response.data['next'])
+
+    def test_percorre_todas_as_paginas_sem_repetir(self):
+        ids, _ = self.percorrer()
+        esperado = [imovel.pk for imovel in sorted(
+            self.imoveis, key=lambda i: (i.criado_em, i.pk), reverse=True
+        )]
+        self.assertEqual(ids, esperado)
+
+    def test_ordenacao_por_preco_com_empates(self):
+        ids, _ = self.percorrer(ordering='preco')
+        esperado = [imovel.pk for imovel in sorted(
+            self.imoveis, key=lambda i: (i.preco, i.pk)
+        )]
+        self.assertEqual(ids, esperado)
+
+    def test_busca_por_relevancia(self):
+        for i in range(15):
+            criar_imovel(self.dono, titulo=f'Sobrado amarelo {i}',
+                         descricao='Sobrado ' * (i % 4 + 1) + 'com quintal')
+        encontrados = obter_backend().filtrar(Imovel.objects.filter(ativo=True), 'sobrado',
+                                              ['titulo', 'descricao', 'bairro'])
+        esperado = list(encontrados.order_by('relevancia', 'id').values_list('pk', flat=True))
+        self.assertEqual(len(esperado), 15)
+
+        ids, _ = self.percorrer(search='sobrado')
+        self.assertEqual(ids, esperado)
+
+        primeira = self.client.get('/api/imoveis/', {'paginacao': 'cursor', 'search': 'sobrado'})
+        segunda = self.client.get(primeira.data['next'])
+        self.assertEqual(self.client.get(segunda.data['previous']).data['results'], primeira.data['results'])
+
+    def test_pagina_anterior(self):
+        primeira = self.client.get('/api/imoveis/', {'paginacao': 'cursor'})
+        self.assertIsNone(primeira.data['previous'])
+        segunda = self.client.get(primeira.data['next'])
+        voltou = self.client.get(segunda.data['previous'])
+        self.assertEqual(voltou.data['results'], primeira.data['results'])
+        self.assertIsNone(voltou.data['previous'])
+
+    def test_sem_count_por_padrao(self):
+        with self.assertNumQueries(1):  # só os imóveis (a listagem não usa as imagens)
+            response = self.client.get('/api/imoveis/', {'paginacao': 'cursor'})
+        self.assertIsNone(response.data['count'])
+
+        response = self.client.get('/api/imoveis/', {'paginacao': 'cursor', 'contagem': 'exata'})
+        self.assertEqual(response.data['count'], 30)
+
+    def test_contagem_aproximada_fica_em_cache(self):
+        params = {'paginacao': 'cursor', 'contagem': 'aproximada', 'bairro': 'centro'}
+        self.client.get('/api/imoveis/', params)
+        criar_imovel(self.dono)
+        response = self.client.get('/api/imoveis/', params)
+        self.assertEqual(response.data['count'], 30)
+
+    def test_cursor_invalido(self):
+        response = self.client.get('/api/imoveis/', {'cursor': 'lixo'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_paginacao_por_numero_continua_padrao(self):
+        response = self.client.get('/api/imoveis/', {'page': 2})
+        self.assertEqual(response.data['count'], 30)
+        self.assertEqual(len(response.data['results']), 12)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN é específico do SQLite')
+class PlanoConsultaTests(TestCase):
+    """
+    Garante que as consultas de cada combinação de filtros da listagem
+    continuam usando índice (nenhum "SCAN tabela" sem "USING ... INDEX").
+    """
+    VARREDURA_COMPLETA = re.compile(r'^SCAN (?!.*(USING|VIRTUAL TABLE))')
+
+    COMBINACOES = [
+        {},
+        {'bairro': 'centro'},
+        {'tipo': 'casa'},
+        {'bairro': 'centro', 'tipo': 'casa'},
+        {'preco_min': 500, 'preco_max': 900},
+        {'bairro': 'centro', 'preco_max': 900},
+        {'tipo': 'kitnet', 'preco_min': 400},
+        {'ordering': 'preco'},
+        {'ordering': '-preco'},
+        {'ordering': '-visualizacoes'},
+        {'page': 2},
+        {'paginacao': 'cursor'},
+        {'paginacao': 'cursor', 'ordering': 'preco', 'bairro': 'centro'},
+        {'search': 'quintal'},
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        dono = User.objects.create_user('dono', password='senha-segura-123')
+        for i in range(15):
+            criar_imovel(dono, titulo=f'Casa {i}', descricao='Quintal amplo')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def planos(self, url, params=None):
+        """Executa a requisição e devolve o plano de cada SELECT emitido"""
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(url, params or {})
+        self.assertEqual(response.status_code, 200)
+
+        planos = []
+        with connection.cursor() as cursor:
+            for consulta in consultas.captured_queries:
+                if not consulta['sql'].startswith('SELECT'):
+                    continue
+                cursor.execute('EXPLAIN QUERY PLAN ' + consulta['sql'])
+                planos.append((consulta['sql'], [linha[3] for linha in cursor.fetchall()]))
+        return planos
+
+    def assertSemVarreduraCompleta(self, url, params=None):
+        for sql, plano in self.planos(url, params):
+            varreduras = [passo for passo in plano if self.VARREDURA_COMPLETA.match(passo)]
+            self.assertFalse(varreduras, f'{url} {params}: {varreduras}\n{sql}')
+
+    def test_listagem(self):
+        for params in self.COMBINACOES:
+            with self.subTest(**params):
+                self.assertSemVarreduraCompleta('/api/imoveis/', params)
+
+    def test_destaques_e_detalhe(self):
+        self.assertSemVarreduraCompleta('/api/imoveis/destaques/')
+        imovel = Imovel.objects.first()
+        self.assertSemVarreduraCompleta(f'/api/imoveis/{imovel.pk}/')
+        contador.buffer.retirar()
+
+    def test_estatisticas(self):
+        self.assertSemVarreduraCompleta('/api/imoveis/estatisticas/')
+
+
+class CamposDerivadosTests(TestCase):
+    def setUp(self):
+        self.dono = User.objects.create_user('dono', password='senha-segura-123')
+
+    def test_whatsapp_link_gravado_no_save(self):
+        imovel = criar_imovel(self.dono, titulo='Kitnet', telefone_contato='(77) 98888-1111')
+        imovel.refresh_from_db()
+        self.assertTrue(imovel.whatsapp_link.startswith('https://wa.me/5577988881111?text='))
+        self.assertEqual(imovel.whatsapp_link, imovel.get_whatsapp_link())
+
+        imovel.titulo = 'Kitnet reformada'
+        imovel.save(update_fields=['titulo'])
+        imovel.refresh_from_db()
+        self.assertIn('Kitnet%20reformada', imovel.whatsapp_link)
+
+    def test_backfill(self):
+        imovel = criar_imovel(self.dono)
+        Imovel.objects.filter(pk=imovel.pk).update(whatsapp_link='')
+
+        call_command('preencher_campos_derivados', stdout=StringIO())
+
+        imovel.refresh_from_db()
+        self.assertEqual(imovel.whatsapp_link, imovel.get_whatsapp_link())
+
+    def test_serializer_mantem_saida(self):
+        imovel = criar_imovel(self.dono, bairro='vermelhao', tipo='kitnet')
+        response = APIClient().get('/api/imoveis/')
+        item = response.data['results'][0]
+        self.assertEqual(item['bairro_display'], 'Vermelhão')
+        self.assertEqual(item['tipo_display'], 'Kitnet')
+        self.assertEqual(item['whatsapp_link'], imovel.get_whatsapp_link())
+
+
+class VariantesImagemTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        # Executa a fila na hora para conferir o resultado dentro do teste
+        configuracao = override_settings(MEDIA_ROOT=self.media, IMOVEIS_TAREFAS_SINCRONAS=True)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        self.dono = User.objects.create_user('dono', password='senha-segura-123')
+
+    def abrir(self, nome):
+        with default_storage.open(nome, 'rb') as arquivo:
+            imagem = Image.open(arquivo)
+            imagem.load()
+        return imagem
+
+    def test_gera_variantes_sem_exif(self):
+        imovel = criar_imovel(self.dono, foto_principal=gerar_jpeg())
+        imovel.refresh_from_db()
+
+        self.assertEqual(imovel.variantes['origem'], imovel.foto_principal.name)
+        card = imovel.variantes['card']
+        # A orientação do EXIF é aplicada antes de redimensionar (retrato)
+        self.assertEqual((card['largura'], card['altura']), (240, 360))
+        for formato in ('webp', 'jpeg'):
+            imagem = self.abrir(card[formato]['nome'])
+            self.assertEqual(imagem.size, (240, 360))
+            self.assertFalse(imagem.getexif())
+        self.assertLess(card['webp']['bytes'], imovel.variantes['bytes_original'])
+
+    def test_imagem_pequena_nao_e_ampliada(self):
+        imovel = criar_imovel(self.dono, foto_principal=gerar_jpeg(tamanho=(300, 200), exif=False))
+        imovel.refresh_from_db()
+        self.assertEqual(imovel.variantes['full']['largura'], 300)
+
+    def test_troca_de_foto_remove_variantes_antigas(self):
+        imovel = criar_imovel(self.dono, foto_principal=gerar_jpeg())
+        imovel.refresh_from_db()
+        antiga = imovel.variantes['card']['webp']['nome']
+
+        imovel.foto_principal = gerar_jpeg('nova.jpg')
+        imovel.save()
+        imovel.refresh_from_db()
+
+        self.assertFalse(default_storage.exists(antiga))
+        self.assertIn('nova', imovel.variantes['card']['webp']['nome'])
+
+    def test_arquivo_invalido_nao_quebra_o_save(self):
+        invalido = SimpleUploadedFile('foto.jpg', b'nao e imagem', content_type='image/jpeg')
+        with self.assertLogs('imoveis.imagens', 'WARNING'):
+            imovel = criar_imovel(self.dono, foto_principal=invalido)
+        imovel.refresh_from_db()
+        self.assertIn('erro', imovel.variantes)
+        # Arquivo que não é imagem não adianta repetir: a tarefa conclui
+        self.assertEqual(Tarefa.objects.get().status, 'concluida')
+
+    def test_urls_nos_serializers(self):
+        imovel = criar_imovel(self.dono, foto_principal=gerar_jpeg())
+        ImagemImovel.objects.create(imovel=imovel, imagem=gerar_jpeg('galeria.jpg'))
+
+        client = APIClient()
+        item = client.get('/api/imoveis/').data['results'][0]
+        self.assertTrue(item['foto_variantes']['card']['webp'].endswith('_card.webp'))
+
+        detalhe = client.get(f'/api/imoveis/{imovel.pk}/').data
+        contador.buffer.retirar()
+        self.assertTrue(detalhe['imagens'][0]['variantes']['galeria']['jpeg'].endswith('_galeria.jpg'))
+
+
+class TarefasTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        configuracao = override_settings(MEDIA_ROOT=self.media, IMOVEIS_TAREFAS_ESPERA_BASE=0)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        self.dono = User.objects.create_user('dono', password='senha-segura-123')
+
+    def test_upload_so_enfileira(self):
+        imovel = criar_imovel(self.dono, foto_principal=gerar_jpeg())
+        imovel.refresh_from_db()
+        self.assertEqual(imovel.variantes, {})
+
+        tarefa = Tarefa.objects.get()
+        self.assertEqual((tarefa.status, tarefa.referencia), ('pendente', f'imovel:{imovel.pk}'))
+
+        self.assertEqual(tarefas.processar_pendentes(), 1)
+        imovel.refresh_from_db()
+        self.assertIn('card', imovel.variantes)
+        self.assertEqual(Tarefa.objects.get().status, 'concluida')
+
+    def test_nao_duplica_tarefa_pendente(self):
+        imovel = criar_imovel(self.dono, foto_principal=gerar_jpeg())
+        imovel.titulo = 'Outro título'
+        imovel.save()
+        self.assertEqual(Tarefa.objects.count(), 1)
+
+    def test_foto_trocada_durante_a_geracao(self):
+        imovel = criar_imovel(self.dono, foto_principal=gerar_jpeg('antiga.jpg'))
+        antiga = Tarefa.objects.get()
+        # O processador pegou a tarefa e leu o imóvel com a foto antiga
+        self.assertTrue(tarefas.reservar(antiga.pk))
+        lido_pela_antiga = Imovel.objects.get(pk=imovel.pk)
+
+        imovel.foto_principal = gerar_jpeg('nova.jpg')
+        imovel.save()
+        nova = Tarefa.objects.exclude(pk=antiga.pk).get()
+        self.assertEqual(nova.status, 'pendente')
+
+        self.assertEqual(tarefas.processar_pendentes(), 1)
+        imovel.refresh_from_db()
+        self.assertEqual(imovel.variantes['origem'], imovel.foto_principal.name)
+        variantes_novas = imovel.variantes
+
+        # A tarefa antiga termina depois: não sobrescreve nem deixa arquivos
+        pasta = os.path.join(self.media, os.path.dirname(variantes_novas['card']['jpeg']['nome']))
+        arquivos = set(os.listdir(pasta))
+        self.assertFalse(atualizar_variantes(lido_pela_antiga, 'foto_principal'))
+        imovel.refresh_from_db()
+        self.assertEqual(imovel.variantes, variantes_novas)
+        self.assertEqual(set(os.listdir(pasta)), arquivos)
+
+    def test_erro_transitorio_tenta_de_novo_ate_falhar(self):
+        imovel = criar_imovel(self.dono, foto_principal=gerar_jpeg())
+        default_storage.delete(imovel.foto_principal.name)
+
+        with self.assertLogs('imoveis.tarefas', 'WARNING'):
+            for _ in range(3):
+                tarefas.processar_pendentes()
+
+        tarefa = Tarefa.objects.get()
+        self.assertEqual((tarefa.status, tarefa.tentativas), ('falhou', 3))
+        self.assertIn('FileNotFoundError', tarefa.erro)
+        self.assertEqual(tarefas.processar_pendentes(), 0)
+
+    def test_reserva_e_exclusiva(self):
+        tarefa = tarefas.enfileirar('gerar_variantes', {'modelo': 'imoveis.Imovel', 'pk': 0, 'campo': 'foto_principal'})
+        self.assertTrue(tarefas.reservar(tarefa.pk))
+        self.assertFalse(tarefas.reservar(tarefa.pk))
+
+    def test_endpoint_lista_apenas_tarefas_do_usuario(self):
+        imovel = criar_imovel(self.dono, foto_principal=gerar_jpeg())
+        outro = User.objects.create_user('outro', password='senha-segura-123')
+        criar_imovel(outro, foto_principal=gerar_jpeg('outra.jpg'))
+
+        client = APIClient()
+        client.force_authenticate(self.dono)
+        resposta = client.get('/api/tarefas/', {'referencia': f'imovel:{imovel.pk}'})
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(len(resposta.data['results']), 1)
+        self.assertEqual(resposta.data['results'][0]['status'], 'pendente')
+
+        client.force_authenticate(None)
+        self.assertEqual(client.get('/api/tarefas/').status_code, 403)
+
+
+class CacheRespostasTests(TestCase):
+    def setUp(self):
+        caches['respostas'].clear()
+        metricas.zerar()
+        self.dono = User.objects.create_user('dono', password='senha-segura-123')
+        self.imovel = criar_imovel(self.dono, titulo='Casa no Centro')
+        self.client = APIClient()
+        self.addCleanup(contador.buffer.retirar)
+
+    def test_listagem_repetida_nao_consulta_o_banco(self):
+        primeira = self.client.get('/api/imoveis/?tipo=casa&ordering=preco')
+        with self.assertNumQueries(0):
+            segunda = self.client.get('/api/imoveis/?ordering=preco&tipo=casa&bairro=')
+
+        self.assertEqual(primeira['X-Cache'], 'MISS')
+        self.assertEqual(segunda['X-Cache'], 'HIT')
+        self.assertEqual(primeira.data, segunda.data)
+        self.assertEqual(taxa_acerto('list'), 0.5)
+
+    def test_parametros_diferentes_nao_compartilham_entrada(self):
+        self.client.get('/api/imoveis/', {'page': 1})
+        self.assertEqual(self.client.get('/api/imoveis/', {'page': 1, 'search': 'centro'})['X-Cache'], 'MISS')
+
+    def test_dono_alterado_invalida_respostas(self):
+        detalhe = f'/api/imoveis/{self.imovel.pk}/'
+        self.client.get(detalhe)
+        # Login só grava last_login, e save() sem mudanças não grava nada novo:
+        # o cache continua valendo
+        self.client.post('/api/auth/login/', {'username': 'dono', 'password': 'senha-segura-123'}, format='json')
+        User.objects.get(pk=self.dono.pk).save()
+        User.objects.create_user('outro', password='senha-segura-123')
+        self.assertEqual(self.client.get(detalhe)['X-Cache'], 'HIT')
+
+        self.client.force_authenticate(self.dono)
+        self.client.patch('/api/perfil/', {'email': 'novo@exemplo.com'}, format='json')
+        self.client.force_authenticate(None)
+        resposta = self.client.get(detalhe)
+        self.assertEqual(resposta['X-Cache'], 'MISS')
+        self.assertEqual(resposta.data['dono']['email'], 'novo@exemplo.com')
+
+        perfil = Perfil.objects.get(user=self.dono)
+        perfil.telefone = '77911112222'
+        perfil.save()
+        self.assertEqual(self.client.get(detalhe).data['dono']['perfil']['telefone'], '77911112222')
+
+    def test_escrita_invalida_respostas(self):
+        self.client.get('/api/imoveis/destaques/')
+        self.imovel.titulo = 'Casa reformada'
+        self.imovel.save()
+
+        resposta = self.client.get('/api/imoveis/destaques/')
+        self.assertEqual(resposta['X-Cache'], 'MISS')
+        self.assertEqual(resposta.data[0]['titulo'], 'Casa reformada')
+
+        self.client.get(f'/api/imoveis/{self.imovel.pk}/')
+        ImagemImovel.objects.create(imovel=self.imovel, imagem='imoveis/galeria/x.jpg')
+        resposta = self.client.get(f'/api/imoveis/{self.imovel.pk}/')
+        self.assertEqual(resposta['X-Cache'], 'MISS')
+        self.assertEqual(len(resposta.data['imagens']), 1)
+
+    def test_detalhe_em_cache_continua_contando_visualizacoes(self):
+        contador.buffer.retirar()
+        self.client.get(f'/api/imoveis/{self.imovel.pk}/')
+        # Só a leitura do contador; sem joins nem serialização
+        with self.assertNumQueries(1):
+            resposta = self.client.get(f'/api/imoveis/{self.imovel.pk}/')
+        self.assertEqual(resposta['X-Cache'], 'HIT')
+        self.assertEqual(resposta.data['visualizacoes'], 2)
+
+    def test_erros_nao_sao_guardados(self):
+        self.client.get('/api/imoveis/999999/')
+        self.assertEqual(self.client.get('/api/imoveis/999999/').status_code, 404)
+        self.assertEqual(metricas.obter('respostas_cache', endpoint='retrieve', resultado='hit'), 0)
+
+
+class GetCondicionalTests(TestCase):
+    def setUp(self):
+        caches['respostas'].clear()
+        self.dono = User.objects.create_user('dono', password='senha-segura-123')
+        self.imovel = criar_imovel(self.dono)
+        for i in range(5):
+            criar_imovel(self.dono, titulo=f'Apartamento {i}', descricao='Descrição longa ' * 20)
+        self.client = APIClient()
+        self.addCleanup(contador.buffer.retirar)
+
+    def revalidar(self, url, resposta, **parametros):
+        return self.client.get(url, parametros, HTTP_IF_NONE_MATCH=resposta['ETag'])
+
+    def test_listagem_304_economiza_o_corpo(self):
+        resposta = self.client.get('/api/imoveis/', {'tipo': 'casa'})
+        self.assertTrue(resposta['ETag'].startswith('W/"'))
+        self.assertIn('Last-Modified', resposta)
+        self.assertEqual(resposta['Cache-Control'], 'no-cache')
+
+        caches['respostas'].clear()
+        # Mesmo sem o cache, o 304 sai de um único agregado, sem serializar
+        with self.assertNumQueries(1):
+            nao_modificada = self.revalidar('/api/imoveis/', resposta, tipo='casa')
+        self.assertEqual(nao_modificada.status_code, 304)
+        self.assertEqual(nao_modificada.content, b'')
+        self.assertGreater(len(resposta.content) - len(nao_modificada.content), 1000)
+
+    def test_etag_depende_dos_filtros_e_da_pagina(self):
+        casas = self.client.get('/api/imoveis/', {'tipo': 'casa'})
+        self.assertEqual(self.revalidar('/api/imoveis/', casas, tipo='apartamento').status_code, 200)
+        self.assertEqual(self.revalidar('/api/imoveis/', casas, tipo='casa', page=2).status_code, 404)
+
+    def test_alteracao_muda_o_etag(self):
+        detalhe = self.client.get(f'/api/imoveis/{self.imovel.pk}/')
+        destaques = self.client.get('/api/imoveis/destaques/')
+
+        ImagemImovel.objects.create(imovel=self.imovel, imagem='imoveis/galeria/x.jpg')
+        self.assertEqual(self.revalidar(f'/api/imoveis/{self.imovel.pk}/', detalhe).status_code, 200)
+
+        self.imovel.delete()
+        self.assertEqual(self.revalidar('/api/imoveis/destaques/', destaques).status_code, 200)
+
+    def test_dono_alterado_muda_o_etag(self):
+        url = f'/api/imoveis/{self.imovel.pk}/'
+        detalhe = self.client.get(url)
+        self.dono.email = 'novo@exemplo.com'
+        self.dono.save()
+        caches['respostas'].clear()
+        revalidada = self.revalidar(url, detalhe)
+        self.assertEqual(revalidada.status_code, 200)
+        self.assertEqual(revalidada.data['dono']['email'], 'novo@exemplo.com')
+
+        # Só last_login (login) não muda nada do que o imóvel mostra
+        detalhe = revalidada
+        self.dono.last_login = timezone.now()
+        self.dono.save(update_fields=['last_login'])
+        self.assertEqual(self.revalidar(url, detalhe).status_code, 304)
+
+    def test_detalhe_304_conta_visualizacao(self):
+        contador.buffer.retirar()
+        detalhe = self.client.get(f'/api/imoveis/{self.imovel.pk}/')
+        self.assertEqual(self.revalidar(f'/api/imoveis/{self.imovel.pk}/', detalhe).status_code, 304)
+        self.assertEqual(contador.buffer.retirar(), {self.imovel.pk: 2})
+
+    def test_if_modified_since(self):
+        resposta = self.client.get(f'/api/imoveis/{self.imovel.pk}/')
+        revalidada = self.client.get(
+            f'/api/imoveis/{self.imovel.pk}/', HTTP_IF_MODIFIED_SINCE=resposta['Last-Modified']
+        )
+        self.assertEqual(revalidada.status_code, 304)
+
+    def test_detalhe_inexistente_continua_404(self):
+        self.assertEqual(self.client.get('/api/imoveis/999999/').status_code, 404)
+        self.assertEqual(self.client.get('/api/imoveis/abc/').status_code, 404)
+
+
+class GeradorCatalogoTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        configuracao = override_settings(MEDIA_ROOT=self.media)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+
+    def test_gera_catalogo_completo_em_poucas_consultas(self):
+        with CaptureQueriesContext(connection) as consultas:
+            totais = GeradorCatalogo(semente=7, quantidade_fotos=2).gerar(200, 20, lote=100)
+
+        self.assertEqual(Imovel.objects.count(), 200)
+        self.assertEqual(Perfil.objects.count(), 20)
+        self.assertEqual(ImagemImovel.objects.count(), totais['imagens'])
+        # Lotes, não uma consulta por linha
+        self.assertLess(len(consultas), 40)
+
+        imovel = Imovel.objects.select_related('dono__perfil').first()
+        self.assertEqual(imovel.dono.perfil.tipo, 'LOCADOR')
+        self.assertEqual(imovel.whatsapp_link, imovel.get_whatsapp_link())
+        self.assertIn('card', imovel.variantes)
+        self.assertTrue(self.client.login(username=imovel.dono.username, password='sintetico-123'))
+        # O índice de busca foi reconstruído
+        resposta = APIClient().get('/api/imoveis/', {'search': imovel.titulo.split('#')[0]})
+        self.assertGreater(resposta.data['count'], 0)
+
+    def test_mesma_semente_gera_os_mesmos_dados(self):
+        GeradorCatalogo(semente=3, prefixo='a', quantidade_fotos=0).gerar(50, 5)
+        GeradorCatalogo(semente=3, prefixo='b', quantidade_fotos=0).gerar(50, 5)
+
+        def catalogo(prefixo):
+            return list(
+                Imovel.objects.filter(dono__username__startswith=prefixo)
+                .order_by('pk').values_list('titulo', 'preco', 'bairro', 'tipo', 'ativo')
+            )
+        self.assertEqual(catalogo('a_'), catalogo('b_'))
+
+    def test_recusa_prefixo_repetido(self):
+        GeradorCatalogo(quantidade_fotos=0).gerar(5, 2)
+        with self.assertRaises(ValueError):
+            GeradorCatalogo(quantidade_fotos=0).gerar(5, 2)
+
+
+class InstrumentacaoTests(TestCase):
+    def setUp(self):
+        metricas.zerar()
+        caches['respostas'].clear()
+        self.dono = User.objects.create_user('dono', password='senha-segura-123', is_staff=True)
+        criar_imovel(self.dono)
+        self.client = APIClient()
+
+    def test_server_timing(self):
+        resposta = self.client.get('/api/imoveis/')
+        timing = resposta['Server-Timing']
+        consultas = int(re.search(r'db;dur=[\d.]+;desc="(\d+) consultas"', timing).group(1))
+        self.assertGreater(consultas, 0)
+        for etapa in ('ser;dur=', 'render;dur=', 'total;dur='):
+            self.assertIn(etapa, timing)
+        self.assertIn('Timing-Allow-Origin', resposta)
+
+    def test_metricas_em_formato_prometheus(self):
+        self.client.get('/api/imoveis/')
+        texto = self.client.get('/api/_metrics').content.decode()
+
+        self.assertIn('# TYPE imoveis_http_requisicoes_total counter', texto)
+        self.assertIn('imoveis_http_requisicoes_total{metodo="GET",rota="imovel-list",status="200"} 1', texto)
+        self.assertIn('# TYPE imoveis_http_duracao_segundos histogram', texto)
+        self.assertIn('imoveis_http_duracao_segundos_bucket{le="+Inf",rota="imovel-list"} 1', texto)
+        self.assertIn('imoveis_http_duracao_segundos_count{rota="imovel-list"} 1', texto)
+        buckets = re.findall(r'_bucket\{le="([^"]+)",rota="imovel-list"\} (\d+)', texto)
+        contagens = [int(total) for _, total in buckets]
+        self.assertEqual(contagens, sorted(contagens))
+
+    @override_settings(IMOVEIS_METRICAS_IPS=[])
+    def test_metricas_restritas(self):
+        self.assertEqual(self.client.get('/api/_metrics').status_code, 403)
+        self.client.force_login(self.dono)
+        self.assertEqual(self.client.get('/api/_metrics').status_code, 200)
+
+    def test_metricas_atras_de_proxy(self):
+        # Proxy não configurado: o REMOTE_ADDR local é o do proxy, não libera
+        self.assertEqual(self.client.get(
+            '/api/_metrics', REMOTE_ADDR='127.0.0.1', HTTP_X_FORWARDED_FOR='203.0.113.9',
+        ).status_code, 403)
+        with override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'NUM_PROXIES': 1},
+                               IMOVEIS_METRICAS_IPS=['10.0.0.5']):
+            for encaminhado, esperado in (('10.0.0.5', 200), ('203.0.113.9', 403),
+                                          # Só vale o endereço que o proxy acrescentou
+                                          ('10.0.0.5, 203.0.113.9', 403)):
+                resposta = self.client.get('/api/_metrics', REMOTE_ADDR='127.0.0.1',
+                                           HTTP_X_FORWARDED_FOR=encaminhado)
+                self.assertEqual(resposta.status_code, esperado, encaminhado)
+
+    @override_settings(IMOVEIS_METRICAS_IPS=[], IMOVEIS_METRICAS_TOKEN='segredo-do-coletor')
+    def test_metricas_com_token(self):
+        for cabecalho, esperado in (('Bearer segredo-do-coletor', 200), ('Bearer outro', 403), ('', 403)):
+            resposta = self.client.get('/api/_metrics', HTTP_AUTHORIZATION=cabecalho)
+            self.assertEqual(resposta.status_code, esperado, cabecalho)
+
+    def test_detecta_n_mais_1(self):
+        def view_com_n_mais_1(request):
+            for imovel in Imovel.objects.all()[:1]:
+                for _ in range(12):
+                    User.objects.filter(pk=imovel.dono_id).exists()
+            return HttpResponse('ok')
+
+        middleware = InstrumentacaoMiddleware(view_com_n_mais_1)
+        with self.assertLogs('imoveis.instrumentacao', 'WARNING') as logs:
+            resposta = middleware(RequestFactory().get('/teste/'))
+        self.assertIn('12 consultas iguais', logs.output[0])
+        self.assertIn('desc="13 consultas"', resposta['Server-Timing'])
+        self.assertEqual(metricas.obter('n_mais_1_detectados', rota='nao_encontrada'), 1)
+
+
+class ContagemConsultasTests(TestCase):
+    """Quantidade exata de consultas SQL de cada endpoint, sem cache de respostas"""
+
+    def setUp(self):
+        caches['respostas'].clear()
+        cache.clear()
+        self.dono = User.objects.create_user('dono', password='senha-segura-123')
+        for i in range(5):
+            imovel = criar_imovel(self.dono, titulo=f'Casa {i}')
+            for ordem in range(3):
+                ImagemImovel.objects.create(imovel=imovel, imagem=f'imoveis/galeria/{i}_{ordem}.jpg', ordem=ordem)
+        self.imovel = imovel
+        self.token = Token.objects.create(user=self.dono)
+        self.client = APIClient()
+        self.addCleanup(contador.buffer.retirar)
+
+    def get(self, url, consultas, **parametros):
+        caches['respostas'].clear()
+        with self.assertNumQueries(consultas):
+            resposta = self.client.get(url, parametros)
+        self.assertEqual(resposta.status_code, 200)
+        return resposta
+
+    def test_listagem(self):
+        # validadores do ETag + COUNT da paginação + imóveis com dono (JOIN)
+        self.get('/api/imoveis/', 3)
+        self.get('/api/imoveis/', 3, tipo='casa', ordering='preco')
+
+    def test_detalhe_traz_perfil_e_imagens_sem_n_mais_1(self):
+        # validadores + imóvel com dono e perfil (JOIN) + imagens
+        resposta = self.get(f'/api/imoveis/{self.imovel.pk}/', 3)
+        self.assertEqual(resposta.data['dono']['perfil']['tipo'], 'LOCATARIO')
+        self.assertEqual(len(resposta.data['imagens']), 3)
+
+    def test_destaques(self):
+        self.get('/api/imoveis/destaques/', 2)
+
+    def test_meus_imoveis_nao_busca_imagens(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        # token com usuário e perfil + imóveis
+        resposta = self.get('/api/imoveis/meus_imoveis/', 2)
+        self.assertEqual(len(resposta.data), 5)
+
+    def test_fotos_com_url_completa_em_todas_as_leituras(self):
+        # Home e Dashboard usam a URL como vem (sem prefixar o host)
+        Imovel.objects.filter(pk=self.imovel.pk).update(foto_principal='imoveis/x.jpg')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        esperada = 'http://testserver/media/imoveis/x.jpg'
+        for url in ('/api/imoveis/', f'/api/imoveis/{self.imovel.pk}/',
+                    '/api/imoveis/destaques/', '/api/imoveis/meus_imoveis/'):
+            caches['respostas'].clear()
+            dados = self.client.get(url).data
+            itens = dados['results'] if 'results' in dados else dados if isinstance(dados, list) else [dados]
+            fotos = {item['id']: item['foto_principal'] for item in itens}
+            self.assertEqual(fotos[self.imovel.pk], esperada, url)
+
+    def test_me_e_perfil_com_token(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        resposta = self.get('/api/auth/me/', 1)
+        self.assertEqual(resposta.data['perfil']['tipo'], 'LOCATARIO')
+        # O token já está no cache de autenticação
+        self.get('/api/perfil/', 0)
+
+    def test_listagem_so_carrega_colunas_usadas(self):
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.get('/api/imoveis/')
+        sql = consultas.captured_queries[-1]['sql']
+        self.assertNotIn('"descricao"', sql)
+        self.assertNotIn('"password"', sql)
+
+
+class CamposEsparsosTests(TestCase):
+    """?fields= / ?omit= reduzem o JSON e as colunas lidas do banco"""
+
+    def setUp(self):
+        caches['respostas'].clear()
+        self.dono = User.objects.create_user('dono', password='senha-segura-123')
+        self.imovel = criar_imovel(self.dono, titulo='Casa ampla', descricao='Texto longo ' * 50)
+        ImagemImovel.objects.create(imovel=self.imovel, imagem='imoveis/galeria/a.jpg', ordem=0)
+        self.client = APIClient()
+        self.addCleanup(contador.buffer.retirar)
+
+    def test_fields_na_listagem(self):
+        completa = self.client.get('/api/imoveis/')
+        with CaptureQueriesContext(connection) as consultas:
+            resposta = self.client.get('/api/imoveis/', {'fields': 'id,titulo,preco'})
+        self.assertEqual(set(resposta.data['results'][0]), {'id', 'titulo', 'preco'})
+        self.assertLess(len(resposta.content), len(completa.content))
+        sql = consultas.captured_queries[-1]['sql']
+        self.assertNotIn('auth_user', sql)
+        self.assertNotIn('"bairro"', sql)
+        self.assertNotIn('"whatsapp_link"', sql)
+
+    def test_omit_no_detalhe_dispensa_imagens_e_dono(self):
+        with CaptureQueriesContext(connection) as consultas:
+            resposta = self.client.get(f'/api/imoveis/{self.imovel.pk}/', {'omit': 'imagens,dono,descricao'})
+        self.assertEqual(resposta.status_code, 200)
+        self.assertNotIn('imagens', resposta.data)
+        self.assertNotIn('dono', resposta.data)
+        self.assertIn('titulo', resposta.data)
+        sqls = ' '.join(consulta['sql'] for consulta in consultas.captured_queries)
+        self.assertNotIn('imoveis_imagemimovel', sqls)
+        self.assertNotIn('auth_user', sqls)
+        self.assertNotIn('"descricao"', sqls)
+
+    def test_detalhe_sem_visualizacoes_continua_contando(self):
+        resposta = self.client.get(f'/api/imoveis/{self.imovel.pk}/', {'fields': 'id,titulo'})
+        self.assertEqual(resposta.data, {'id': self.imovel.pk, 'titulo': 'Casa ampla'})
+        self.assertEqual(contador.pendentes(self.imovel.pk), 1)
+
+    def test_destaques_e_cache_separados_por_campos(self):
+        parcial = self.client.get('/api/imoveis/destaques/', {'fields': 'id'})
+        completa = self.client.get('/api/imoveis/destaques/')
+        self.assertEqual(parcial.data, [{'id': self.imovel.pk}])
+        self.assertIn('titulo', completa.data[0])
+        self.assertNotEqual(parcial['ETag'], completa['ETag'])
+
+    def test_campo_desconhecido(self):
+        resposta = self.client.get('/api/imoveis/', {'fields': 'id,senha'})
+        self.assertEqual(resposta.status_code, 400)
+        self.assertIn('senha', resposta.data['fields'][0])
+        resposta = self.client.get('/api/imoveis/', {'omit': 'xyz'})
+        self.assertEqual(resposta.status_code, 400)
+
+
+class JSONRapidoTests(TestCase):
+    """O renderer/parser com orjson tem que gerar/ler exatamente o mesmo que o padrão do DRF"""
+
+    def assertMesmosBytes(self, dados, media_type=None, contexto=None):
+        esperado = JSONRenderer().render(dados, media_type, contexto)
+        self.assertEqual(JSONRapidoRenderer().render(dados, media_type, contexto), esperado)
+
+    def test_tipos_especiais(self):
+        self.assertMesmosBytes({
+            'preco': Decimal('1250.50'),
+            'inteiro': Decimal('850'),
+            'criado_em': datetime.datetime(2025, 3, 1, 12, 30, 15, 123456, tzinfo=datetime.timezone.utc),
+            'sem_micro': datetime.datetime(2025, 3, 1, 12, 30, tzinfo=datetime.timezone.utc),
+            'bahia': timezone.localtime(timezone.now()),
+            'ingenuo': datetime.datetime(2025, 3, 1, 8, 0),
+            'data': datetime.date(2025, 3, 1),
+            'hora': datetime.time(8, 15, 30, 500),
+            'duracao': datetime.timedelta(hours=1, seconds=3),
+            'uuid': uuid.UUID(int=12345),
+            'traduzido': gettext_lazy('Casa'),
+            'texto': 'Ação — “aspas” \u2028 \u2029 \\ \n 🏠',
+            'numeros': [1, -2, 2.5, 0.1, 1234.5678, True, False, None],
+            3: 'chave inteira',
+            'aninhado': {'lista': ({'a': 1},), 'vazio': {}},
+        })
+
+    def test_respostas_da_api(self):
+        dono = User.objects.create_user('dono', password='senha-segura-123')
+        imovel = criar_imovel(dono, titulo='Apartamento “novo” — São João')
+        cliente = APIClient()
+        for url in ('/api/imoveis/', f'/api/imoveis/{imovel.pk}/', '/api/imoveis/destaques/',
+                    '/api/imoveis/estatisticas/'):
+            resposta = cliente.get(url)
+            self.assertEqual(resposta.content, JSONRenderer().render(resposta.data), url)
+
+    def test_casos_fora_do_orjson_usam_o_padrao(self):
+        self.assertMesmosBytes({'grande': 2 ** 70})
+        self.assertMesmosBytes({'pequenos': [1e-7, 0.00001, 1.5e-5, 0.0001], 'enormes': [1e16, 2.5e22]})
+        self.assertMesmosBytes({'preco': Decimal('0.00001')})
+        self.assertMesmosBytes({'a': [1, 2]}, 'application/json; indent=4')
+        self.assertMesmosBytes({'a': [1, 2]}, None, {'indent': 2})
+        self.assertEqual(JSONRapidoRenderer().render(None), b'')
+        with self.assertRaises(ValueError):
+            JSONRapidoRenderer().render({'hora': datetime.time(8, tzinfo=datetime.timezone.utc)})
+
+    def test_parser(self):
+        for corpo in (b'{"titulo": "S\xc3\xa3o Jo\xc3\xa3o", "preco": 850.5, "ids": [1, 2]}',
+                      b'{"grande": 1180591620717411303424}', b'[]'):
+            self.assertEqual(JSONRapidoParser().parse(BytesIO(corpo)), JSONParser().parse(BytesIO(corpo)))
+        for corpo in (b'{"a": ', b'{"a": NaN}'):
+            with self.assertRaises(ParseError) as padrao:
+                JSONParser().parse(BytesIO(corpo))
+            with self.assertRaises(ParseError) as rapido:
+                JSONRapidoParser().parse(BytesIO(corpo))
+            self.assertEqual(str(rapido.exception), str(padrao.exception))
+
+    def test_configurado_na_api(self):
+        dono = User.objects.create_user('dono', password='senha-segura-123')
+        cliente = APIClient()
+        cliente.force_authenticate(dono)
+        resposta = cliente.patch('/api/perfil/', {'first_name': 'José'}, format='json')
+        self.assertEqual(resposta.status_code, 200)
+        self.assertIsInstance(resposta.accepted_renderer, JSONRapidoRenderer)
+        self.assertEqual(resposta.json()['first_name'], 'José')
+
+
+class ExportacaoTests(TestCase):
+    def setUp(self):
+        self.dono = User.objects.create_user('dono', password='senha-segura-123')
+        outro = User.objects.create_user('outro', password='senha-segura-123')
+        criar_imovel(self.dono, titulo='Casa, com "aspas"\ne quebra')
+        criar_imovel(self.dono, titulo='Kitnet desativada', ativo=False)
+        criar_imovel(outro, titulo='Casa de outro dono')
+        self.client = APIClient()
+        self.client.force_authenticate(self.dono)
+
+    def baixar(self, **parametros):
+        resposta = self.client.get('/api/imoveis/meus_imoveis/exportar/', parametros)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertTrue(resposta.streaming)
+        return resposta, b''.join(resposta.streaming_content).decode('utf-8')
+
+    def test_csv(self):
+        resposta, corpo = self.baixar()
+        self.assertEqual(resposta['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('attachment; filename="meus-imoveis-', resposta['Content-Disposition'])
+        linhas = list(csv.DictReader(corpo.lstrip('\ufeff').splitlines(keepends=True)))
+        self.assertEqual([linha['titulo'] for linha in linhas], ['Casa, com "aspas"\ne quebra', 'Kitnet desativada'])
+        self.assertEqual(linhas[0]['preco'], '800.00')
+        self.assertEqual(linhas[1]['ativo'], 'False')
+        self.assertEqual(linhas[0]['dono'], 'dono')
+        imovel = Imovel.objects.get(pk=linhas[0]['id'])
+        self.assertEqual(linhas[0]['bairro_display'], imovel.get_bairro_display())
+        self.assertEqual(linhas[0]['whatsapp_link'], imovel.whatsapp_link_atual)
+
+    def test_csv_nao_vira_formula_na_planilha(self):
+        Imovel.objects.filter(dono=self.dono).delete()
+        for titulo in ('=HYPERLINK("http://x")', '+1', '-2+3', '@SUM(A1)'):
+            criar_imovel(self.dono, titulo=titulo, descricao='=1+1')
+        _, corpo = self.baixar()
+        linhas = list(csv.DictReader(corpo.lstrip('\ufeff').splitlines(keepends=True)))
+        self.assertEqual([linha['titulo'] for linha in linhas],
+                         ["'=HYPERLINK(\"http://x\")", "'+1", "'-2+3", "'@SUM(A1)"])
+        self.assertEqual({linha['descricao'] for linha in linhas}, {"'=1+1"})
+        # O JSON Lines não é aberto em planilha: sai como está
+        _, corpo = self.baixar(formato='jsonl')
+        self.assertEqual(json.loads(corpo.splitlines()[0])['titulo'], '=HYPERLINK("http://x")')
+
+    def test_jsonl(self):
+        resposta, corpo = self.baixar(formato='jsonl')
+        self.assertEqual(resposta['Content-Type'], 'application/x-ndjson')
+        linhas = [json.loads(linha) for linha in corpo.splitlines()]
+        self.assertEqual(len(linhas), 2)
+        self.assertEqual(linhas[0]['preco'], '800.00')
+        self.assertIs(linhas[1]['ativo'], False)
+        self.assertEqual(linhas[0]['criado_em'], timezone.localtime(
+            Imovel.objects.get(pk=linhas[0]['id']).criado_em).isoformat())
+
+    def test_le_o_banco_so_durante_o_download_em_uma_consulta(self):
+        with CaptureQueriesContext(connection) as consultas:
+            resposta = self.client.get('/api/imoveis/meus_imoveis/exportar/')
+        self.assertEqual(len(consultas), 0)
+        with self.settings(IMOVEIS_EXPORTACAO_LOTE=1), CaptureQueriesContext(connection) as consultas:
+            b''.join(resposta.streaming_content)
+        self.assertEqual(len(consultas), 1)
+
+    def test_formato_invalido_e_sem_login(self):
+        self.assertEqual(self.client.get('/api/imoveis/meus_imoveis/exportar/', {'formato': 'xml'}).status_code, 400)
+        self.assertEqual(APIClient().get('/api/imoveis/meus_imoveis/exportar/').status_code, 403)
+
+    def test_acao_do_admin(self):
+        admin = User.objects.create_superuser('admin', 'admin@exemplo.com', 'senha-segura-123')
+        self.client.force_login(admin)
+        resposta = self.client.post('/admin/imoveis/imovel/', {
+            'action': 'exportar_jsonl',
+            '_selected_action': list(Imovel.objects.values_list('pk', flat=True)),
+        })
+        self.assertTrue(resposta.streaming)
+        corpo = b''.join(resposta.streaming_content).decode('utf-8')
+        self.assertEqual(len(corpo.splitlines()), 3)
+
+
+class ImportacaoTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        configuracao = override_settings(MEDIA_ROOT=self.media)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        caches['respostas'].clear()
+
+        self.dono = User.objects.create_user('imobiliaria', password='senha-segura-123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.dono)
+
+    def zip_fotos(self, *nomes, invalidas=()):
+        buffer = BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as arquivo:
+            for nome in nomes:
+                arquivo.writestr(nome, gerar_jpeg(tamanho=(64, 48)).read())
+            for nome in invalidas:
+                arquivo.writestr(nome, b'isto nao e uma imagem')
+        return SimpleUploadedFile('fotos.zip', buffer.getvalue(), content_type='application/zip')
+
+    def importar(self, nome, conteudo, **dados):
+        dados['arquivo'] = SimpleUploadedFile(nome, conteudo.encode('utf-8'))
+        return self.client.post('/api/imoveis/importar/', dados, format='multipart')
+
+    def test_csv_com_fotos_e_relatorio_por_linha(self):
+        csv_texto = (
+            'titulo;descricao;preco;bairro;tipo;telefone_contato;foto_principal;imagens\n'
+            'Casa no Centro;Ampla;950.00;centro;casa;(77) 98888-0000;fachada.jpg;sala.jpg|fotos/quarto.jpg\n'
+            'Sem preço;Ampla;;centro;casa;(77) 98888-0000;;\n'
+            'Kitnet;Mobiliada;500;lugar_nenhum;kitnet;(77) 98888-0001;;\n'
+            'Foto faltando;Ampla;700;centro;casa;(77) 98888-0002;nao_existe.jpg;\n'
+            'Foto quebrada;Ampla;700;centro;casa;(77) 98888-0003;fachada.jpg;ruim.jpg\n'
+            'Sem foto;Ampla;700;centro;casa;(77) 98888-0004;;\n'
+        )
+        resposta = self.importar('imoveis.csv', csv_texto,
+                                 imagens=self.zip_fotos('fachada.jpg', 'sala.jpg', 'fotos/quarto.jpg',
+                                                        invalidas=['ruim.jpg']))
+        self.assertEqual(resposta.status_code, 201)
+        self.assertEqual((resposta.data['criados'], resposta.data['erros']), (1, 5))
+        linhas = {linha['linha']: linha for linha in resposta.data['linhas']}
+        self.assertEqual(linhas[2]['status'], 'criado')
+        self.assertIn('preco', linhas[3]['erros'])
+        self.assertIn('bairro', linhas[4]['erros'])
+        self.assertIn('foto_principal', linhas[5]['erros'])
+        self.assertIn('imagens', linhas[6]['erros'])
+        # Como no cadastro pela API, a foto principal é obrigatória
+        self.assertEqual(list(linhas[7]['erros']), ['foto_principal'])
+
+        imovel = Imovel.objects.get(pk=linhas[2]['id'])
+        self.assertEqual(imovel.dono, self.dono)
+        self.assertTrue(default_storage.exists(imovel.foto_principal.name))
+        self.assertTrue(imovel.foto_principal.name.startswith('imoveis/'))
+        self.assertEqual(imovel.whatsapp_link, imovel.get_whatsapp_link())
+        self.assertEqual(list(imovel.imagens.values_list('ordem', flat=True)), [0, 1])
+        # Sem signals: o importador agenda as variantes e atualiza a busca
+        self.assertEqual(Tarefa.objects.filter(referencia=f'imovel:{imovel.pk}').count(), 3)
+        self.assertEqual(self.client.get('/api/imoveis/', {'search': 'centro'}).data['count'], 1)
+
+    def test_jsonl_em_lotes_com_poucas_consultas(self):
+        linhas = '\n'.join(json.dumps({
+            'titulo': f'Apartamento {i}', 'descricao': 'Novo', 'preco': 900 + i,
+            'bairro': 'aeroporto_i', 'tipo': 'apartamento', 'telefone_contato': '77988880000',
+            'ativo': i % 2 == 0, 'foto_principal': 'fachada.jpg',
+        }) for i in range(120)) + '\n{quebrado\n'
+        with self.settings(IMOVEIS_IMPORTACAO_LOTE=50), CaptureQueriesContext(connection) as consultas:
+            resposta = self.importar('imoveis.jsonl', linhas, imagens=self.zip_fotos('fachada.jpg'))
+        self.assertEqual((resposta.data['criados'], resposta.data['erros']), (120, 1))
+        self.assertEqual(resposta.data['linhas'][-1]['linha'], 121)
+        self.assertEqual(Imovel.objects.filter(dono=self.dono, ativo=False).count(), 60)
+        inserts = [c for c in consultas.captured_queries if c['sql'].startswith('INSERT INTO "imoveis_imovel"')]
+        self.assertEqual(len(inserts), 3)
+        self.assertLess(len(consultas), 30)
+
+    def test_simular_nao_grava(self):
+        resposta = self.importar('imoveis.csv', 'titulo,descricao,preco,bairro,tipo,telefone_contato,foto_principal\n'
+                                                'Casa,Ampla,800,centro,casa,77988880000,fachada.jpg\n',
+                                 imagens=self.zip_fotos('fachada.jpg'), simular='1')
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.data['linhas'], [{'linha': 2, 'status': 'valido'}])
+        self.assertFalse(Imovel.objects.exists())
+
+    def test_erros_de_arquivo(self):
+        self.assertEqual(self.client.post('/api/imoveis/importar/', {}, format='multipart').status_code, 400)
+        self.assertEqual(self.importar('imoveis.xlsx', 'x').status_code, 400)
+        resposta = self.importar('imoveis.csv', 'titulo\nCasa\n',
+                                 imagens=SimpleUploadedFile('fotos.zip', b'nao e zip'))
+        self.assertEqual(resposta.status_code, 400)
+        with self.settings(IMOVEIS_IMPORTACAO_MAX_LINHAS=1):
+            self.assertEqual(self.importar('imoveis.csv', 'titulo\nA\nB\n').status_code, 400)
+        self.assertEqual(APIClient().post('/api/imoveis/importar/', {}).status_code, 403)
+
+    def test_comando(self):
+        caminho = os.path.join(self.media, 'imoveis.jsonl')
+        with open(caminho, 'w', encoding='utf-8') as arquivo:
+            arquivo.write(json.dumps({'titulo': 'Quarto', 'descricao': 'Simples', 'preco': '350',
+                                      'bairro': 'vermelhao', 'tipo': 'quarto',
+                                      'telefone_contato': '77988880000',
+                                      'foto_principal': 'quarto.jpg'}) + '\n')
+        fotos = os.path.join(self.media, 'fotos.zip')
+        with open(fotos, 'wb') as arquivo:
+            arquivo.write(self.zip_fotos('quarto.jpg').read())
+        saida = StringIO()
+        call_command('importar_imoveis', caminho, dono='imobiliaria', imagens=fotos, stdout=saida)
+        self.assertIn('1 imóvel(is) criado(s)', saida.getvalue())
+        self.assertTrue(Imovel.objects.filter(titulo='Quarto', dono=self.dono).exists())
+
+
+class LoteTests(TestCase):
+    def setUp(self):
+        caches['respostas'].clear()
+        self.dono = User.objects.create_user('dono', password='senha-segura-123')
+        self.imoveis = [criar_imovel(self.dono, titulo=f'Casa {i}') for i in range(4)]
+        for imovel in self.imoveis:
+            for ordem in range(2):
+                ImagemImovel.objects.create(imovel=imovel, imagem=f'imoveis/galeria/{imovel.pk}_{ordem}.jpg', ordem=ordem)
+        self.inativo = criar_imovel(self.dono, titulo='Inativo', ativo=False)
+        self.client = APIClient()
+        contador.buffer.retirar()
+        self.addCleanup(contador.buffer.retirar)
+
+    def ids(self, *imoveis):
+        return ','.join(str(imovel.pk) for imovel in imoveis)
+
+    def visualizacoes(self, imovel):
+        imovel.refresh_from_db()
+        return imovel.visualizacoes + contador.pendentes(imovel.pk)
+
+    def test_ordem_pedida_e_consultas_constantes(self):
+        a, b, c, d = self.imoveis
+        pedido = f'{self.ids(c, a)},999999,{self.inativo.pk},{self.ids(d, c)}'
+        # validadores + visualizações + imóveis com dono e perfil + imagens
+        with self.assertNumQueries(4):
+            resposta = self.client.get('/api/imoveis/lote/', {'ids': pedido})
+        self.assertEqual([item['id'] for item in resposta.data], [c.pk, a.pk, d.pk])
+        self.assertEqual(len(resposta.data[0]['imagens']), 2)
+        self.assertIn('perfil', resposta.data[0]['dono'])
+
+        caches['respostas'].clear()
+        with self.assertNumQueries(4):
+            self.client.get('/api/imoveis/lote/', {'ids': self.ids(*self.imoveis)})
+
+    def test_conta_visualizacoes_a_nao_ser_com_contar_0(self):
+        a, b = self.imoveis[:2]
+        resposta = self.client.get('/api/imoveis/lote/', {'ids': self.ids(a, b)})
+        self.assertEqual([item['visualizacoes'] for item in resposta.data], [1, 1])
+        # Segunda vez vem do cache de respostas e continua contando
+        resposta = self.client.get('/api/imoveis/lote/', {'ids': self.ids(a, b)})
+        self.assertEqual(resposta['X-Cache'], 'HIT')
+        self.assertEqual([item['visualizacoes'] for item in resposta.data], [2, 2])
+
+        resposta = self.client.get('/api/imoveis/lote/', {'ids': self.ids(a, b), 'contar': '0'})
+        self.assertEqual([item['visualizacoes'] for item in resposta.data], [2, 2])
+        self.assertEqual(self.visualizacoes(a), 2)
+
+    def test_campos_esparsos(self):
+        resposta = self.client.get('/api/imoveis/lote/', {'ids': self.ids(*self.imoveis[:2]), 'fields': 'id,titulo'})
+        self.assertEqual(resposta.data, [{'id': imovel.pk, 'titulo': imovel.titulo} for imovel in self.imoveis[:2]])
+        self.assertEqual(self.visualizacoes(self.imoveis[0]), 1)
+
+    def test_resposta_em_cache_que_nao_bate_com_o_banco(self):
+        a, b = self.imoveis[:2]
+        self.client.get('/api/imoveis/lote/', {'ids': self.ids(a, b)})
+        self.client.get('/api/imoveis/lote/', {'ids': self.ids(a, b), 'fields': 'titulo,visualizacoes'})
+        # update() não dispara signals: as respostas em cache ficam com os dois
+        Imovel.objects.filter(pk=b.pk).update(ativo=False)
+
+        resposta = self.client.get('/api/imoveis/lote/', {'ids': self.ids(a, b)})
+        self.assertEqual(resposta['X-Cache'], 'HIT')
+        contagens = {item['id']: item['visualizacoes'] for item in resposta.data}
+        self.assertEqual(contagens[a.pk], 3)
+        self.assertEqual(contagens[a.pk], self.visualizacoes(a))
+
+        # Sem o id nos itens não dá para casar pelo pk: a lista é montada de novo
+        resposta = self.client.get('/api/imoveis/lote/', {'ids': self.ids(a, b), 'fields': 'titulo,visualizacoes'})
+        self.assertEqual(resposta.data, [{'titulo': a.titulo, 'visualizacoes': 4}])
+
+    def test_ids_invalidos(self):
+        for ids in ('', 'a,b', ','.join(map(str, range(1, 102)))):
+            self.assertEqual(self.client.get('/api/imoveis/lote/', {'ids': ids}).status_code, 400, ids)
+
+
+@override_settings(IMOVEIS_SINCRONIZACAO_ATRASO=0)
+class SincronizacaoTests(TestCase):
+    def setUp(self):
+        self.dono = User.objects.create_user('dono', password='senha-segura-123')
+        self.client = APIClient()
+
+    def sincronizar(self, cursor=None, **params):
+        if cursor:
+            params['desde'] = cursor
+        resposta = self.client.get('/api/imoveis/sincronizar/', params)
+        self.assertEqual(resposta.status_code, 200, resposta.data)
+        return resposta.data
+
+    def test_criados_alterados_desativados_e_removidos(self):
+        a = criar_imovel(self.dono, titulo='A')
+        b = criar_imovel(self.dono, titulo='B')
+        c = criar_imovel(self.dono, titulo='C')
+        dados = self.sincronizar()
+        self.assertEqual([item['id'] for item in dados['alterados']], [a.pk, b.pk, c.pk])
+        self.assertIn('imagens', dados['alterados'][0])
+        self.assertFalse(dados['mais'])
+
+        # Nada mudou: mesma posição, listas vazias
+        vazio = self.sincronizar(dados['proximo'])
+        self.assertEqual((vazio['alterados'], vazio['desativados'], vazio['removidos']), ([], [], []))
+        antes, depois = ler_cursor(dados['proximo']), ler_cursor(vazio['proximo'])
+        self.assertEqual([depois[fonte] for fonte in FONTES], [antes[fonte] for fonte in FONTES])
+
+        a.titulo = 'A reformada'
+        a.save()
+        b.ativo = False
+        b.save()
+        removido = c.pk
+        c.delete()
+        dados = self.sincronizar(dados['proximo'])
+        self.assertEqual([item['titulo'] for item in dados['alterados']], ['A reformada'])
+        self.assertEqual(dados['desativados'], [b.pk])
+        self.assertEqual(dados['removidos'], [removido])
+
+    def test_remocao_em_cascata_deixa_registro(self):
+        outro = User.objects.create_user('outro', password='senha-segura-123')
+        ids = [criar_imovel(outro).pk for _ in range(2)]
+        cursor = self.sincronizar()['proximo']
+        outro.delete()
+        self.assertEqual(sorted(self.sincronizar(cursor)['removidos']), ids)
+
+    def test_desativacao_pelo_admin_aparece(self):
+        imovel = criar_imovel(self.dono)
+        cursor = self.sincronizar()['proximo']
+        admin = User.objects.create_superuser('admin', password='senha-segura-123')
+        self.client.force_login(admin)
+        self.client.post('/admin/imoveis/imovel/', {
+            'action': 'desativar_imoveis', '_selected_action': [imovel.pk],
+        })
+        self.client.logout()
+        self.assertEqual(self.sincronizar(cursor)['desativados'], [imovel.pk])
+
+    def test_paginas_pelo_cursor(self):
+        ids = [criar_imovel(self.dono, titulo=f'Casa {i}').pk for i in range(5)]
+        recebidos, cursor, voltas = [], None, 0
+        while True:
+            dados = self.sincronizar(cursor, limite=2)
+            recebidos += [item['id'] for item in dados['alterados']]
+            cursor, voltas = dados['proximo'], voltas + 1
+            if not dados['mais']:
+                break
+        self.assertEqual(recebidos, ids)
+        self.assertEqual(voltas, 3)
+
+    def test_mesmo_instante_nao_perde_linhas(self):
+        ids = [criar_imovel(self.dono).pk for _ in range(3)]
+        Imovel.objects.update(atualizado_em=timezone.now() - datetime.timedelta(minutes=1))
+        primeira = self.sincronizar(limite=2)
+        segunda = self.sincronizar(primeira['proximo'], limite=2)
+        recebidos = [item['id'] for item in primeira['alterados'] + segunda['alterados']]
+        self.assertEqual(recebidos, ids)
+
+    @override_settings(IMOVEIS_SINCRONIZACAO_ATRASO=60)
+    def test_atraso_segura_mudancas_recentes(self):
+        criar_imovel(self.dono)
+        dados = self.sincronizar()
+        self.assertEqual(dados['alterados'], [])
+        self.assertFalse(dados['mais'])
+
+    def test_consultas_nao_dependem_do_tamanho(self):
+        for i in range(3):
+            imovel = criar_imovel(self.dono, titulo=f'Casa {i}')
+            ImagemImovel.objects.create(imovel=imovel, imagem=f'imoveis/galeria/{i}.jpg')
+        # imóveis com dono e perfil + imagens + registros de remoção
+        with self.assertNumQueries(3):
+            self.sincronizar()
+        for i in range(10):
+            criar_imovel(self.dono, titulo=f'Outra {i}')
+        with self.assertNumQueries(3):
+            self.sincronizar()
+
+    def test_fields(self):
+        criar_imovel(self.dono)
+        dados = self.sincronizar(fields='id,titulo')
+        self.assertEqual(set(dados['alterados'][0]), {'id', 'titulo'})
+
+    def test_cursor_e_limite_invalidos(self):
+        for params in ({'desde': 'nao-e-cursor'}, {'desde': 'e30x'}, {'limite': 'dez'}):
+            resposta = self.client.get('/api/imoveis/sincronizar/', params)
+            self.assertEqual(resposta.status_code, 400)
+
+    def test_remocoes_antigas_sao_apagadas(self):
+        antigo, recente = criar_imovel(self.dono).pk, criar_imovel(self.dono).pk
+        Imovel.objects.filter(pk__in=[antigo, recente]).delete()
+        ImovelRemovido.objects.filter(imovel_id=antigo).update(
+            removido_em=timezone.now() - datetime.timedelta(days=31))
+        saida = StringIO()
+        call_command('limpar_remocoes', stdout=saida)
+        self.assertIn('1 registro', saida.getvalue())
+        self.assertEqual(list(ImovelRemovido.objects.values_list('imovel_id', flat=True)), [recente])
+
+    def test_cursor_mais_antigo_que_a_retencao_pede_ressincronizacao(self):
+        criar_imovel(self.dono)
+        cursor = self.sincronizar()['proximo']
+        posicoes = ler_cursor(cursor)
+        posicoes['visto_ate'] -= datetime.timedelta(days=31)
+        resposta = self.client.get('/api/imoveis/sincronizar/', {'desde': gravar_cursor(posicoes)})
+        self.assertEqual(resposta.status_code, 410)
+        self.assertTrue(resposta.data['ressincronizar'])
+        # Cursor sem visto_ate (de antes da retenção) também
+        posicoes['visto_ate'] = None
+        resposta = self.client.get('/api/imoveis/sincronizar/', {'desde': gravar_cursor(posicoes)})
+        self.assertEqual(resposta.status_code, 410)
+        # Quem sincroniza dentro da janela segue normalmente
+        self.sincronizar(cursor)
+
+    def test_visto_ate_so_avanca_no_fim_das_paginas(self):
+        for i in range(3):
+            criar_imovel(self.dono, titulo=f'Casa {i}')
+        paginas, cursor = [], None
+        while not paginas or paginas[-1]['mais']:
+            paginas.append(self.sincronizar(cursor, limite=1))
+            cursor = paginas[-1]['proximo']
+        vistos = [ler_cursor(pagina['proximo'])['visto_ate'] for pagina in paginas]
+        # No meio das páginas fica o início da volta; no fim, o momento da última
+        self.assertEqual(len(vistos), 3)
+        self.assertEqual(vistos[0], vistos[1])
+        self.assertGreater(vistos[2], vistos[1])
+
+class TokenCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        cache_tokens.limpar()
+        self.addCleanup(cache_tokens.limpar)
+        self.usuario = User.objects.create_user('ana', password='senha-segura-123', first_name='Ana')
+        self.token = Token.objects.create(user=self.usuario)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def me(self, consultas=None):
+        if consultas is None:
+            return self.client.get('/api/auth/me/')
+        with self.assertNumQueries(consultas):
+            return self.client.get('/api/auth/me/')
+
+    def test_segundo_request_nao_consulta_o_banco(self):
+        metricas.zerar()
+        self.me(1)
+        resposta = self.me(0)
+        self.assertEqual(resposta.data['perfil']['tipo'], 'LOCATARIO')
+        self.assertEqual(metricas.obter('token_cache', resultado='hit'), 1)
+        self.assertEqual(metricas.obter('token_cache_consultas_evitadas'), 1)
+        self.assertEqual(taxa_acerto_tokens(), 0.5)
+        self.assertIn('imoveis_token_cache_total{resultado="hit"} 1',
+                      self.client.get('/api/_metrics', REMOTE_ADDR='127.0.0.1').content.decode())
+
+    def test_logout_invalida_na_hora(self):
+        self.me()
+        self.assertEqual(self.client.post('/api/auth/logout/').status_code, 200)
+        self.assertEqual(self.me().status_code, 403)
+
+    def test_usuario_desativado_ou_alterado(self):
+        self.me()
+        self.usuario.first_name = 'Ana Maria'
+        self.usuario.save()
+        self.assertEqual(self.me(1).data['first_name'], 'Ana Maria')
+
+        self.usuario.perfil.tipo = 'LOCADOR'
+        self.usuario.perfil.save()
+        self.assertEqual(self.me().data['perfil']['tipo'], 'LOCADOR')
+
+        self.usuario.is_active = False
+        self.usuario.save()
+        self.assertEqual(self.me().status_code, 403)
+
+    def test_marca_de_outro_processo_revoga(self):
+        self.me()
+        # Alteração em outro processo: só a marca no cache compartilhado chega aqui
+        cache.set(f'imoveis:token:usuario:{self.usuario.pk}', time.time(), 60)
+        self.me(1)
+        self.me(0)
+
+    def test_request_altera_copia_e_nao_o_cache(self):
+        self.me()
+        resposta = self.client.patch('/api/perfil/', {'first_name': 'Outra'}, format='json')
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(self.me().data['first_name'], 'Outra')
+        usuario, _, _ = cache_tokens.obter(self.token.key)
+        self.assertEqual(usuario.first_name, 'Outra')
+
+    def test_lru_e_ttl(self):
+        lru = CacheTokens(tamanho=2, ttl=60)
+        for chave in 'abc':
+            lru.guardar(chave, self.usuario, None, time.time())
+        self.assertIsNone(lru.obter('a'))
+        self.assertIsNotNone(lru.obter('b'))
+        lru.guardar('d', self.usuario, None, time.time())
+        self.assertIsNone(lru.obter('c'))
+        lru.guardar('e', self.usuario, None, time.time() - 61)
+        self.assertIsNone(lru.obter('e'))
+        lru.remover_usuario(self.usuario.pk)
+        self.assertEqual(len(lru), 0)
+
+
+@override_settings(IMOVEIS_SENHA_ITERACOES=1000)
+class LoginRapidoTests(TestCase):
+    def setUp(self):
+        cache_tokens.limpar()
+        self.client = APIClient()
+        self.usuario = User.objects.create_user('ana', password='senha-segura-123')
+
+    def login(self, senha='senha-segura-123'):
+        return self.client.post('/api/auth/login/', {'username': 'ana', 'password': senha}, format='json')
+
+    def test_login_numa_consulta(self):
+        Token.objects.create(user=self.usuario)
+        # usuário com perfil e token (JOIN)
+        with self.assertNumQueries(1):
+            resposta = self.login()
+        self.assertEqual(resposta.data['token'], self.usuario.auth_token.key)
+        self.assertEqual(resposta.data['user']['perfil']['tipo'], 'LOCATARIO')
+        # Sem token ainda: cria um, e o login seguinte devolve o mesmo
+        Token.objects.all().delete()
+        chave = self.login().data['token']
+        self.assertEqual(self.login().data['token'], chave)
+        self.assertEqual(self.login('errada').status_code, 401)
+
+    def test_senha_regravada_com_o_custo_novo_no_login(self):
+        with override_settings(IMOVEIS_SENHA_ITERACOES=2000):
+            self.assertEqual(self.login().status_code, 200)
+        self.usuario.refresh_from_db()
+        self.assertTrue(self.usuario.password.startswith('pbkdf2_sha256$2000$'))
+
+        # Hash de outro algoritmo ainda aceito e migrado
+        self.usuario.password = make_password('senha-segura-123', hasher='pbkdf2_sha1')
+        self.usuario.save()
+        self.assertEqual(self.login().status_code, 200)
+        self.usuario.refresh_from_db()
+        self.assertTrue(self.usuario.password.startswith('pbkdf2_sha256$1000$'))
+
+    def test_hash_mais_forte_nao_e_regravado_mais_fraco(self):
+        # A classe roda com 1000 iterações; este hash tem 5000
+        hasher = PBKDF2PasswordHasher()
+        forte = hasher.encode('senha-segura-123', hasher.salt(), iterations=5000)
+        self.usuario.password = forte
+        self.usuario.save()
+        self.assertEqual(self.login().status_code, 200)
+        self.usuario.refresh_from_db()
+        self.assertEqual(self.usuario.password, forte)
+
+    def test_padrao_do_django(self):
+        with override_settings(IMOVEIS_SENHA_ITERACOES=None):
+            self.assertEqual(senhas.PBKDF2PasswordHasher().iterations, PBKDF2PasswordHasher.iterations)
+
+    @override_settings(IMOVEIS_SENHA_CONCORRENCIA=1, IMOVEIS_SENHA_ESPERA=0)
+    def test_fora_da_api_espera_a_vaga_em_vez_de_falhar(self):
+        metricas.zerar()
+        vagas = senhas._semaforo()
+        vagas.acquire()
+        threading.Timer(0.2, vagas.release).start()
+        # Como no admin ou no changepassword: sem HashOcupado
+        self.usuario.set_password('outra-senha-456')
+        self.assertTrue(self.usuario.check_password('outra-senha-456'))
+        self.assertEqual(metricas.obter('senhas_hash_recusados'), 0)
+
+    @override_settings(IMOVEIS_SENHA_CONCORRENCIA=1, IMOVEIS_SENHA_ESPERA=0)
+    def test_sem_vaga_para_hash_responde_503(self):
+        metricas.zerar()
+        vagas = senhas._semaforo()
+        vagas.acquire()
+        try:
+            resposta = self.login()
+        finally:
+            vagas.release()
+        self.assertEqual(resposta.status_code, 503)
+        self.assertEqual(resposta['Retry-After'], '1')
+        self.assertEqual(metricas.obter('senhas_hash_recusados'), 1)
+        self.assertEqual(self.login().status_code, 200)
+        self.assertEqual(metricas.obter('senhas_hash'), 1)
+
+    def test_registro_numa_transacao_com_o_minimo_de_comandos(self):
+        dados = {
+            'username': 'bruno', 'email': 'Bruno@Exemplo.COM', 'password': 'senha-segura-123',
+            'password2': 'senha-segura-123', 'tipo': 'LOCADOR', 'telefone': '(77) 98888-0000',
+        }
+        with CaptureQueriesContext(connection) as consultas:
+            resposta = self.client.post('/api/auth/register/', dados, format='json')
+        self.assertEqual(resposta.status_code, 201, resposta.data)
+        comandos = [consulta['sql'].split()[0] for consulta in consultas.captured_queries]
+        # username único + usuário, perfil e token (entre SAVEPOINT e RELEASE)
+        self.assertEqual([comando for comando in comandos if comando not in ('SAVEPOINT', 'RELEASE')],
+                         ['SELECT', 'INSERT', 'INSERT', 'INSERT'])
+
+        usuario = User.objects.select_related('perfil').get(username='bruno')
+        self.assertEqual(usuario.email, 'Bruno@exemplo.com')
+        self.assertEqual((usuario.perfil.tipo, usuario.perfil.telefone), ('LOCADOR', '(77) 98888-0000'))
+        self.assertEqual(resposta.data['token'], usuario.auth_token.key)
+        self.assertEqual(resposta.data['user']['perfil']['tipo'], 'LOCADOR')
+        self.assertTrue(usuario.check_password('senha-segura-123'))
+
+
+@override_settings(IMOVEIS_SENHA_ITERACOES=1000)
+class PerfilEscritasTests(TestCase):
+    """Salvar o usuário só escreve no perfil quando um campo dele mudou"""
+
+    def setUp(self):
+        cache_tokens.limpar()
+        self.usuario = User.objects.create_user('ana', password='senha-segura-123')
+        self.token = Token.objects.create(user=self.usuario)
+        self.client = APIClient()
+
+    def comandos(self, funcao):
+        with CaptureQueriesContext(connection) as consultas:
+            resultado = funcao()
+        return resultado, [consulta['sql'].split()[0] for consulta in consultas.captured_queries
+                           if not consulta['sql'].startswith(('SAVEPOINT', 'RELEASE'))]
+
+    def test_last_login_nao_escreve_no_perfil(self):
+        usuario = User.objects.select_related('perfil').get(pk=self.usuario.pk)
+        usuario.last_login = timezone.now()
+        with self.assertNumQueries(1):
+            usuario.save(update_fields=['last_login'])
+        # Sem o perfil carregado, também não o busca
+        usuario = User.objects.get(pk=self.usuario.pk)
+        with self.assertNumQueries(1):
+            usuario.save()
+
+    def test_login(self):
+        login = lambda: self.client.post(
+            '/api/auth/login/', {'username': 'ana', 'password': 'senha-segura-123'}, format='json')
+        resposta, comandos = self.comandos(login)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(comandos, ['SELECT'])
+        # Senha regravada com o custo novo: só o UPDATE do usuário
+        with override_settings(IMOVEIS_SENHA_ITERACOES=2000):
+            resposta, comandos = self.comandos(login)
+        self.assertEqual(comandos, ['SELECT', 'UPDATE'])
+
+    def test_registro(self):
+        dados = {'username': 'bruno', 'password': 'senha-segura-123', 'password2': 'senha-segura-123',
+                 'tipo': 'LOCADOR'}
+        resposta, comandos = self.comandos(lambda: self.client.post('/api/auth/register/', dados, format='json'))
+        self.assertEqual(resposta.status_code, 201)
+        self.assertEqual(comandos, ['SELECT', 'INSERT', 'INSERT', 'INSERT'])
+
+    def test_atualizar_perfil_pela_api(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        atualizar = lambda: self.client.patch('/api/perfil/', {'first_name': 'Ana'}, format='json')
+        # token com usuário e perfil + UPDATE do usuário + atualizado_em dos imóveis dele
+        resposta, comandos = self.comandos(atualizar)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(comandos, ['SELECT', 'UPDATE', 'UPDATE'])
+        self.assertEqual(resposta.data['first_name'], 'Ana')
+
+    def test_perfil_alterado_grava_so_o_campo(self):
+        usuario = User.objects.select_related('perfil').get(pk=self.usuario.pk)
+        usuario.perfil.telefone = '(77) 97777-0000'
+        with CaptureQueriesContext(connection) as consultas:
+            usuario.save()
+        sql = next(consulta['sql'] for consulta in consultas.captured_queries
+                   if consulta['sql'].startswith('UPDATE "imoveis_perfil"'))
+        self.assertIn('UPDATE "imoveis_perfil" SET "telefone"', sql)
+        self.assertNotIn('"tipo"', sql)
+        self.assertEqual(Perfil.objects.get(user=self.usuario).telefone, '(77) 97777-0000')
+        self.assertEqual(usuario.perfil.campos_alterados(), set())
+
+
+def com_taxas(**taxas):
+    return override_settings(
+        IMOVEIS_LIMITES_ATIVOS=True,
+        REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': taxas},
+    )
+
+
+class LimitesTests(TestCase):
+    def setUp(self):
+        obter_armazenamento().limpar()
+        self.addCleanup(obter_armazenamento().limpar)
+        self.client = APIClient()
+
+    def test_balde(self):
+        self.assertEqual(ler_taxa('300/min'), (300, 5.0))
+        self.assertIsNone(ler_taxa(None))
+        fichas, atualizado = None, 0.0
+        for _ in range(3):
+            fichas, espera, _ = gastar(fichas, atualizado, 3, 1.0, 0.0)
+            self.assertEqual(espera, 0)
+        fichas, espera, cheio_em = gastar(fichas, 0.0, 3, 1.0, 0.0)
+        self.assertEqual((fichas, espera, cheio_em), (0, 1.0, 3.0))
+        # Meio segundo depois ainda falta meia ficha; um segundo depois passa
+        self.assertEqual(gastar(fichas, 0.0, 3, 1.0, 0.5)[1], 0.5)
+        self.assertEqual(gastar(fichas, 0.0, 3, 1.0, 1.0)[1], 0)
+
+    def test_compactacao_descarta_baldes_cheios(self):
+        armazenamento = ArmazenamentoMemoria()
+        armazenamento.consumir('a', 10, 1000.0)
+        armazenamento.consumir('b', 10, 0.001)
+        armazenamento._compactar(time.monotonic() + 1)
+        self.assertEqual(len(armazenamento), 1)
+        self.assertEqual(armazenamento.consumir('a', 1, 0.001), 0)
+
+    def test_sqlite_compartilhado_entre_processos(self):
+        pasta = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, pasta, ignore_errors=True)
+        caminho = os.path.join(pasta, 'limites.sqlite3')
+        # Duas instâncias fazem o papel de dois processos
+        primeiro, segundo = ArmazenamentoSQLite(caminho), ArmazenamentoSQLite(caminho)
+        self.assertEqual(primeiro.consumir('ip', 2, 0.01), 0)
+        self.assertEqual(segundo.consumir('ip', 2, 0.01), 0)
+        self.assertGreater(primeiro.consumir('ip', 2, 0.01), 0)
+        self.assertEqual(len(segundo), 1)
+
+    @com_taxas(anonimo='3/min', usuario='5/min')
+    def test_anonimo_por_ip_e_usuario_por_token(self):
+        metricas.zerar()
+        for _ in range(3):
+            self.assertEqual(self.client.get('/api/imoveis/estatisticas/').status_code, 200)
+        resposta = self.client.get('/api/imoveis/estatisticas/')
+        self.assertEqual(resposta.status_code, 429)
+        self.assertEqual(resposta['Retry-After'], '20')
+        self.assertEqual(metricas.obter('limites_recusados', escopo='anonimo'), 1)
+        # Outro IP tem o próprio balde
+        self.assertEqual(self.client.get('/api/imoveis/estatisticas/', REMOTE_ADDR='10.0.0.2').status_code, 200)
+
+        # Autenticado, do mesmo IP: vale o balde do usuário
+        usuario = User.objects.create_user('ana', password='senha-segura-123')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=usuario).key}')
+        codigos = [self.client.get('/api/imoveis/estatisticas/').status_code for _ in range(6)]
+        self.assertEqual(codigos, [200] * 5 + [429])
+
+    @override_settings(IMOVEIS_SENHA_ITERACOES=1000)
+    @com_taxas(login='2/min')
+    def test_login_recusado_antes_do_hash(self):
+        User.objects.create_user('ana', password='senha-segura-123')
+        metricas.zerar()
+        dados = {'username': 'ana', 'password': 'errada'}
+        codigos = [self.client.post('/api/auth/login/', dados, format='json').status_code for _ in range(3)]
+        self.assertEqual(codigos, [401, 401, 429])
+        self.assertEqual(metricas.obter('senhas_hash'), 2)
+        resposta = self.client.post('/api/auth/register/', {}, format='json')
+        self.assertEqual(resposta.status_code, 429)
+
+    @com_taxas()
+    def test_sem_taxa_nao_limita(self):
+        for _ in range(5):
+            self.assertEqual(self.client.get('/api/imoveis/estatisticas/').status_code, 200)
+
+
+class APIAssincronaTests(TestCase):
+    def setUp(self):
+        caches['respostas'].clear()
+        cache.clear()
+        self.dono = User.objects.create_user('dono', password='senha-segura-123')
+        self.imovel = criar_imovel(self.dono, preco='1200.00')
+        for i in range(12):
+            criar_imovel(self.dono, titulo=f'Apartamento {i}', tipo='apartamento', preco=f'{500 + i}.00')
+        self.token = Token.objects.create(user=self.dono).key
+        self.addCleanup(contador.buffer.retirar)
+
+    def assincrona(self):
+        return override_settings(ROOT_URLCONF='imoveis.tests')
+
+    def test_rotas_assincronas(self):
+        for url in ('/api/imoveis/', f'/api/imoveis/{self.imovel.pk}/',
+                    '/api/imoveis/destaques/', '/api/imoveis/estatisticas/'):
+            self.assertIsInstance(resolve(url, urlconf='imoveis.tests').func, api_async.VisaoAssincrona)
+        # pk que não é número e as demais ações continuam no router
+        self.assertNotIsInstance(resolve('/api/imoveis/abc/', urlconf='imoveis.tests').func,
+                                 api_async.VisaoAssincrona)
+        self.assertNotIsInstance(resolve('/api/imoveis/lote/', urlconf='imoveis.tests').func,
+                                 api_async.VisaoAssincrona)
+
+    async def test_mesmas_respostas_que_a_versao_sincrona(self):
+        urls = [
+            '/api/imoveis/?tipo=apartamento&ordering=preco',
+            '/api/imoveis/?page=2&fields=id,titulo,preco',
+            '/api/imoveis/?search=apartamento',
+            '/api/imoveis/?page=9',
+            '/api/imoveis/?preco_min=abc',
+            '/api/imoveis/destaques/',
+            '/api/imoveis/estatisticas/',
+            '/api/imoveis/999999/',
+            f'/api/imoveis/{self.imovel.pk}/?omit=visualizacoes',
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                await sync_to_async(caches['respostas'].clear)()
+                await sync_to_async(cache.clear)()
+                sincrona = await sync_to_async(APIClient().get)(url)
+                await sync_to_async(caches['respostas'].clear)()
+                await sync_to_async(cache.clear)()
+                with self.assincrona():
+                    assincrona = await AsyncClient().get(url)
+                self.assertEqual(assincrona.status_code, sincrona.status_code)
+                self.assertEqual(assincrona.content, sincrona.content)
+                for cabecalho in ('Content-Type', 'ETag', 'Last-Modified', 'X-Cache', 'Allow', 'Vary'):
+                    self.assertEqual(assincrona.get(cabecalho), sincrona.get(cabecalho), cabecalho)
+
+    async def test_cache_e_get_condicional(self):
+        with self.assincrona():
+            cliente = AsyncClient()
+            primeira = await cliente.get('/api/imoveis/', {'tipo': 'apartamento'})
+            segunda = await cliente.get('/api/imoveis/', {'tipo': 'apartamento'})
+            revalidada = await cliente.get('/api/imoveis/', {'tipo': 'apartamento'},
+                                           headers={'If-None-Match': primeira['ETag']})
+        self.assertEqual((primeira['X-Cache'], segunda['X-Cache']), ('MISS', 'HIT'))
+        self.assertEqual(primeira.content, segunda.content)
+        self.assertEqual(json.loads(primeira.content)['count'], 12)
+        self.assertEqual(revalidada.status_code, 304)
+        self.assertEqual(revalidada.content, b'')
+
+    async def test_detalhe_conta_visualizacoes(self):
+        url = f'/api/imoveis/{self.imovel.pk}/'
+        with self.assincrona():
+            cliente = AsyncClient()
+            primeira = await cliente.get(url)
+            segunda = await cliente.get(url)
+            revalidada = await cliente.get(url, headers={'If-None-Match': segunda['ETag']})
+        self.assertEqual(json.loads(primeira.content)['visualizacoes'], 1)
+        self.assertEqual(segunda['X-Cache'], 'HIT')
+        self.assertEqual(json.loads(segunda.content)['visualizacoes'], 2)
+        self.assertEqual(revalidada.status_code, 304)
+        self.assertEqual(contador.pendentes(self.imovel.pk), 3)
+
+    async def test_escritas_cursor_e_api_navegavel_ficam_com_a_view_sincrona(self):
+        with self.assincrona():
+            alterado = await AsyncClient().patch(
+                f'/api/imoveis/{self.imovel.pk}/', {'titulo': 'Casa reformada'},
+                content_type='application/json', headers={'Authorization': f'Token {self.token}'},
+            )
+            cursor = await AsyncClient().get('/api/imoveis/', {'paginacao': 'cursor'})
+            navegavel = await AsyncClient().get('/api/imoveis/', headers={'Accept': 'text/html'})
+            anonimo = await AsyncClient().delete(f'/api/imoveis/{self.imovel.pk}/')
+        self.assertEqual(alterado.status_code, 200, alterado.content)
+        self.assertEqual(json.loads(alterado.content)['titulo'], 'Casa reformada')
+        self.assertIsNone(json.loads(cursor.content)['count'])
+        self.assertIn('cursor=', json.loads(cursor.content)['next'])
+        self.assertEqual(navegavel.status_code, 200)
+        self.assertTrue(navegavel['Content-Type'].startswith('text/html'))
+        self.assertIn(anonimo.status_code, (401, 403))
+
+    async def test_autenticacao_e_limites(self):
+        with self.assincrona():
+            autenticado = await AsyncClient().get('/api/imoveis/', headers={'Authorization': f'Token {self.token}'})
+            invalido = await AsyncClient().get('/api/imoveis/', headers={'Authorization': 'Token invalido'})
+            with com_taxas(anonimo='2/min'):
+                await sync_to_async(obter_armazenamento().limpar)()
+                self.addCleanup(obter_armazenamento().limpar)
+                cliente = AsyncClient()
+                codigos = [(await cliente.get('/api/imoveis/estatisticas/')).status_code for _ in range(3)]
+                recusada = await cliente.get('/api/imoveis/estatisticas/')
+        self.assertEqual(autenticado.status_code, 200)
+        # Como na view síncrona (a SessionAuthentication vem antes e não pede desafio)
+        self.assertEqual(invalido.status_code, 403)
+        self.assertEqual(codigos, [200, 200, 429])
+        self.assertIn('Retry-After', recusada)
+
+    async def test_instrumentacao(self):
+        with self.assincrona():
+            resposta = await AsyncClient().get('/api/imoveis/destaques/')
+        self.assertRegex(resposta['Server-Timing'], r'db;dur=[\d.]+;desc="[1-9]\d* consultas"')
+        self.assertIn('render;dur=', resposta['Server-Timing'])
+        self.assertEqual(metricas.obter('http_requisicoes', rota='imovel-destaques', metodo='GET', status='200'), 1)
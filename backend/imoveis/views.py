@@ -1,6 +1,66 @@
+from secrets import compare_digest
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
 from django.shortcuts import redirect
+from django.views.static import serve
+from rest_framework.settings import api_settings
+
+from . import metricas
+from .instrumentacao import formato_prometheus
 
 # Redirecionar tudo para o frontend React
 def redirect_to_react(request):
     """Redireciona para o frontend React em localhost:5173"""
     return redirect('http://localhost:5173')
+
+
+def servir_media(request, path, document_root=None):
+    """Serve arquivos de media (desenvolvimento) contando os bytes entregues"""
+    response = serve(request, path, document_root=document_root)
+    tipo = 'variante' if '/variantes/' in f'/{path}' else 'original'
+    metricas.incrementar(
+        'media_bytes_servidos', int(response.get('Content-Length', 0)), tipo=tipo
+    )
+    return response
+
+
+def _ip_cliente(request):
+    """
+    IP de quem fez o request, ou None se não dá para saber. Atrás de proxy
+    reverso o REMOTE_ADDR é o do proxy: vale então o endereço que o último
+    dos REST_FRAMEWORK['NUM_PROXIES'] proxies pôs no X-Forwarded-For. Com
+    X-Forwarded-For e sem NUM_PROXIES o request passou por um proxy que não
+    foi configurado, e nenhum dos dois endereços é confiável.
+    """
+    encaminhado = request.META.get('HTTP_X_FORWARDED_FOR')
+    if not encaminhado:
+        return request.META.get('REMOTE_ADDR')
+    proxies = api_settings.NUM_PROXIES
+    if not proxies:
+        return None
+    enderecos = [endereco.strip() for endereco in encaminhado.split(',')]
+    return enderecos[-min(proxies, len(enderecos))]
+
+
+def _token_valido(request):
+    token = getattr(settings, 'IMOVEIS_METRICAS_TOKEN', '')
+    if not token:
+        return False
+    return compare_digest(request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}')
+
+
+def exportar_metricas(request):
+    """
+    Métricas do processo no formato texto do Prometheus.
+    Liberado para staff, para quem manda ``Authorization: Bearer`` com o
+    IMOVEIS_METRICAS_TOKEN e para os IPs de IMOVEIS_METRICAS_IPS (o coletor).
+    """
+    permitido = (
+        request.user.is_staff
+        or _token_valido(request)
+        or _ip_cliente(request) in getattr(settings, 'IMOVEIS_METRICAS_IPS', [])
+    )
+    if not permitido:
+        return HttpResponseForbidden('Acesso restrito.')
+    return HttpResponse(formato_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,211 @@
+"""
+Contador de visualizações com buffer e gravação agrupada.
+
+Cada GET de detalhe apenas registra o acesso no buffer; de tempos em tempos
+os acessos acumulados são descarregados no banco com UPDATEs do tipo
+``visualizacoes = visualizacoes + n``, agrupando os imóveis que receberam
+a mesma quantidade de acessos em um único comando.
+"""
+import atexit
+import threading
+import time
+from collections import Counter, defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.db.models import F
+
+
+# Limite de ids por "IN (...)" para não estourar o limite de parâmetros do SQLite
+TAMANHO_LOTE = 500
+
+
+class BufferMemoria:
+    """Buffer local ao processo (padrão)"""
+    compartilhado = False
+
+    def __init__(self):
+        self._pendentes = Counter()
+        self._lock = threading.Lock()
+
+    def adicionar(self, imovel_id, quantidade):
+        with self._lock:
+            self._pendentes[imovel_id] += quantidade
+            return self._pendentes[imovel_id]
+
+    def pendentes(self, imovel_id):
+        with self._lock:
+            return self._pendentes.get(imovel_id, 0)
+
+    def retirar(self):
+        """Remove e retorna tudo que está pendente"""
+        with self._lock:
+            pendentes, self._pendentes = self._pendentes, Counter()
+        return pendentes
+
+    def devolver(self, pendentes):
+        with self._lock:
+            self._pendentes.update(pendentes)
+
+
+class BufferCache:
+    """
+    Buffer compartilhado entre processos, guardado no cache do Django.
+
+    Só faz sentido com um backend de cache compartilhado (arquivo, Redis,
+    Memcached). Os contadores usam ``incr``/``decr``, que são atômicos nesses
+    backends; o índice de ids pendentes é refeito a cada acesso, então uma
+    entrada perdida por concorrência volta no próximo acesso ao imóvel.
+    """
+    PREFIXO = 'visualizacoes'
+
+    def __init__(self, alias='default'):
+        self.alias = alias
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    @property
+    def compartilhado(self):
+        """Outro processo enxerga este buffer? (locmem e dummy são do próprio processo)"""
+        return not isinstance(self.cache, (LocMemCache, DummyCache))
+
+    def _chave(self, imovel_id):
+        return f'{self.PREFIXO}:{imovel_id}'
+
+    def adicionar(self, imovel_id, quantidade):
+        chave = self._chave(imovel_id)
+        self.cache.add(chave, 0, timeout=None)
+        total = self.cache.incr(chave, quantidade)
+
+        indice = self.cache.get(f'{self.PREFIXO}:indice', set())
+        if imovel_id not in indice:
+            indice.add(imovel_id)
+            self.cache.set(f'{self.PREFIXO}:indice', indice, timeout=None)
+        return total
+
+    def pendentes(self, imovel_id):
+        return self.cache.get(self._chave(imovel_id), 0)
+
+    def retirar(self):
+        indice = self.cache.get(f'{self.PREFIXO}:indice', set())
+        if not indice:
+            return Counter()
+        self.cache.delete(f'{self.PREFIXO}:indice')
+
+        valores = self.cache.get_many([self._chave(i) for i in indice])
+        pendentes = Counter()
+        for imovel_id in indice:
+            quantidade = valores.get(self._chave(imovel_id), 0)
+            if quantidade:
+                # decr em vez de delete preserva acessos que chegaram no meio do flush
+                self.cache.decr(self._chave(imovel_id), quantidade)
+                pendentes[imovel_id] = quantidade
+        return pendentes
+
+    def devolver(self, pendentes):
+        for imovel_id, quantidade in pendentes.items():
+            self.adicionar(imovel_id, quantidade)
+
+
+class ContadorVisualizacoes:
+    """
+    Acumula visualizações e grava no banco em lote.
+
+    O flush acontece no próprio request quando o intervalo configurado em
+    ``IMOVEIS_VISUALIZACOES_INTERVALO`` (segundos) já passou desde o último;
+    com intervalo 0 cada acesso é gravado imediatamente.
+    """
+
+    def __init__(self, buffer=None, intervalo=None):
+        self.buffer = buffer or BufferMemoria()
+        self._intervalo = intervalo
+        self._ultimo_flush = time.monotonic()
+        self._lock_flush = threading.Lock()
+
+    @property
+    def intervalo(self):
+        if self._intervalo is not None:
+            return self._intervalo
+        return getattr(settings, 'IMOVEIS_VISUALIZACOES_INTERVALO', 5)
+
+    def registrar(self, imovel_id, quantidade=1):
+        """
+        Registra visualizações de um imóvel.
+
+        Retorna quantas visualizações do imóvel estavam pendentes (ainda não
+        gravadas) logo após o registro, para que a resposta possa exibir o
+        total atualizado.
+        """
+        pendentes = self.buffer.adicionar(imovel_id, quantidade)
+        if time.monotonic() - self._ultimo_flush >= self.intervalo:
+            self.flush()
+        return pendentes
+
+    async def aregistrar(self, imovel_id, quantidade=1):
+        """registrar para views assíncronas: o flush, quando vence, roda numa thread"""
+        pendentes = self.buffer.adicionar(imovel_id, quantidade)
+        if time.monotonic() - self._ultimo_flush >= self.intervalo:
+            await sync_to_async(self.flush)()
+        return pendentes
+
+    def pendentes(self, imovel_id):
+        return self.buffer.pendentes(imovel_id)
+
+    def flush(self):
+        """Grava no banco tudo que está no buffer. Retorna o total gravado."""
+        from .models import Imovel
+
+        # Evita dois flushes simultâneos no mesmo processo
+        if not self._lock_flush.acquire(blocking=False):
+            return 0
+        try:
+            self._ultimo_flush = time.monotonic()
+            pendentes = self.buffer.retirar()
+            if not pendentes:
+                return 0
+
+            por_quantidade = defaultdict(list)
+            for imovel_id, quantidade in pendentes.items():
+                por_quantidade[quantidade].append(imovel_id)
+
+            try:
+                with transaction.atomic():
+                    for quantidade, ids in por_quantidade.items():
+                        for inicio in range(0, len(ids), TAMANHO_LOTE):
+                            Imovel.objects.filter(
+                                pk__in=ids[inicio:inicio + TAMANHO_LOTE]
+                            ).update(visualizacoes=F('visualizacoes') + quantidade)
+            except Exception:
+                # Nada se perde: os acessos voltam para o próximo flush
+                self.buffer.devolver(pendentes)
+                raise
+
+            return sum(pendentes.values())
+        finally:
+            self._lock_flush.release()
+
+
+def _criar_contador():
+    if getattr(settings, 'IMOVEIS_VISUALIZACOES_BUFFER', 'memoria') == 'cache':
+        buffer = BufferCache(getattr(settings, 'IMOVEIS_VISUALIZACOES_CACHE', 'default'))
+    else:
+        buffer = BufferMemoria()
+    return ContadorVisualizacoes(buffer)
+
+
+contador = _criar_contador()
+
+
+@atexit.register
+def _flush_ao_sair():
+    """Não perde os acessos pendentes quando o processo termina"""
+    try:
+        contador.flush()
+    except Exception:
+        pass
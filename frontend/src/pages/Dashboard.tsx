@@ -74,7 +74,7 @@ const Dashboard: React.FC = () => {
               {meusImoveis.map((imovel) => (
                 <div key={imovel.id} className="card">
                   <img
-                    src={`http://127.0.0.1:8000${imovel.foto_principal}`}
+                    src={imovel.foto_variantes?.card?.webp ?? imovel.foto_principal}
                     alt={imovel.titulo}
                   />
                   <div className="card-content">
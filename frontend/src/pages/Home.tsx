@@ -56,7 +56,9 @@ const Home: React.FC = () => {
                   <span className="badge-tipo">{imovel.tipo_display}</span>
                   <img
                     // Se não tiver foto, usa um placeholder cinza ou imagem padrão
-                    src={imovel.foto_principal ? `http://127.0.0.1:8000${imovel.foto_principal}` : 'https://via.placeholder.com/400x300?text=Sem+Foto'}
+                    // Prefere a variante "card" (leve) à foto original
+                    // A API devolve as URLs completas (com o host)
+                    src={imovel.foto_principal ? (imovel.foto_variantes?.card?.webp ?? imovel.foto_principal) : 'https://via.placeholder.com/400x300?text=Sem+Foto'}
                     alt={imovel.titulo}
                     className="card-img"
                   />
@@ -20,6 +20,9 @@ export const imovelService = {
       if (filtros.search) params.append('search', filtros.search);
       if (filtros.ordering) params.append('ordering', filtros.ordering);
       if (filtros.page) params.append('page', filtros.page.toString());
+      if (filtros.paginacao) params.append('paginacao', filtros.paginacao);
+      if (filtros.cursor) params.append('cursor', filtros.cursor);
+      if (filtros.contagem) params.append('contagem', filtros.contagem);
     }
     
     const response = await api.get(`/imoveis/?${params.toString()}`);
@@ -32,6 +35,29 @@ export const imovelService = {
     return response.data;
   },
 
+  // Buscar vários imóveis de uma vez, na ordem dos ids (favoritos, comparação)
+  async buscarVarios(ids: number[], contarVisualizacao = true): Promise<Imovel[]> {
+    const params = new URLSearchParams({ ids: ids.join(',') });
+    if (!contarVisualizacao) params.append('contar', '0');
+    const response = await api.get(`/imoveis/lote/?${params.toString()}`);
+    return response.data;
+  },
+
+  // O que mudou desde o último cursor (sem cursor: catálogo inteiro).
+  // Cursor antigo demais responde 410: descartar a cópia local e recomeçar sem cursor
+  async sincronizar(desde?: string): Promise<{
+    alterados: Imovel[];
+    desativados: number[];
+    removidos: number[];
+    proximo: string;
+    mais: boolean;
+  }> {
+    const params = new URLSearchParams();
+    if (desde) params.append('desde', desde);
+    const response = await api.get(`/imoveis/sincronizar/?${params.toString()}`);
+    return response.data;
+  },
+
   // Buscar imóveis em destaque
   async destaques(): Promise<ImovelListItem[]> {
     const response = await api.get('/imoveis/destaques/');
@@ -14,11 +14,22 @@ export interface User {
   perfil: Perfil;
 }
 
+// Versão redimensionada de uma foto (card, galeria ou full)
+export interface VarianteFoto {
+  largura: number;
+  altura: number;
+  webp: string;
+  jpeg: string;
+}
+
+export type VariantesFoto = Partial<Record<'card' | 'galeria' | 'full', VarianteFoto>> | null;
+
 export interface ImagemImovel {
   id: number;
   imagem: string;
   descricao: string;
   ordem: number;
+  variantes: VariantesFoto;
 }
 
 export interface Imovel {
@@ -32,6 +43,7 @@ export interface Imovel {
   tipo_display: string;
   telefone_contato: string;
   foto_principal: string;
+  foto_variantes: VariantesFoto;
   ativo: boolean;
   visualizacoes: number;
   criado_em: string;
@@ -50,6 +62,7 @@ export interface ImovelListItem {
   tipo: string;
   tipo_display: string;
   foto_principal: string;
+  foto_variantes: VariantesFoto;
   ativo: boolean;
   visualizacoes: number;
   criado_em: string;
@@ -91,7 +104,8 @@ export interface AuthResponse {
 }
 
 export interface PaginatedResponse<T> {
-  count: number;
+  // null na paginação por cursor quando a contagem não é pedida
+  count: number | null;
   next: string | null;
   previous: string | null;
   results: T[];
@@ -105,6 +119,10 @@ export interface FiltrosImoveis {
   search?: string;
   ordering?: string;
   page?: number;
+  // Paginação por cursor (keyset): use o link `next` da resposta
+  paginacao?: 'cursor';
+  cursor?: string;
+  contagem?: 'exata' | 'aproximada';
 }
 
 export const BAIRROS = [